@@ -0,0 +1,114 @@
+"""Compares throughput of the regular window pipeline and CascadeScanner on different kinds of content.
+
+Each scenario is ten minutes of audio holding a DTMF sample every two minutes, on top of
+
+- idle: low level noise, like a squelched radio channel between calls
+- mixed: alternating speech-like and music-like passages at typical program levels, separated by pauses
+- program: speech-like and music-like content without pauses, like a broadcast stream
+
+The first stage of the cascade only skips frames quieter than the level printed first. How
+much it helps hence depends on the share of such frames, which is printed per scenario. Run as
+
+    python etc/benchmarks/cascade.py
+"""
+
+import os
+import time
+import numpy as np
+from scipy import signal
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect.cascade import CascadeScanner
+from tonedetect import helpers
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir, os.path.pardir))
+SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+DURATION = 600
+
+def make_pipeline(sample_rate):
+    freqs = DTMF_TONES.all_tone_frequencies()
+    wnd = Window.tuned(sample_rate, freqs, power_of_2=True, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(freqs)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1)
+    return wnd, d_f, d_t, d_s
+
+def dbfs(rms):
+    return 20 * np.log10(rms)
+
+def speech(rs, n, sr, level):
+    """Low-passed noise modulated by syllables of about 200ms, at the given RMS level."""
+    b, a = signal.butter(2, [150, 3000], btype="bandpass", fs=sr)
+    noise = signal.lfilter(b, a, rs.normal(0, 1, n))
+    t = np.arange(n) / sr
+    envelope = np.abs(np.sin(np.pi * 2.5 * t)) * (rs.uniform(0, 1, n // sr + 1)[(t).astype(int)] > 0.2)
+    x = noise * envelope
+    return x * level / np.sqrt(np.mean(np.square(x)))
+
+def music(rs, n, sr, level):
+    """Chords of harmonic tones changing every half second, at the given RMS level."""
+    roots = [220., 246.9, 261.6, 293.7, 329.6]
+    x = np.zeros(n)
+    step = sr // 2
+    t = np.arange(step) / sr
+    for i in range(0, n, step):
+        root = roots[rs.randint(len(roots))]
+        chord = sum(np.sin(2 * np.pi * root * r * h * t) / h for r in (1., 1.25, 1.5) for h in (1, 2, 3))
+        x[i:i+step] = chord[:n - i]
+    return x * level / np.sqrt(np.mean(np.square(x)))
+
+def scenario(name, rs, sr):
+    n = DURATION * sr
+    data = rs.normal(0, 0.005, n)
+    if name == "mixed":
+        # 20s of speech, 20s of music and 20s of pause per minute
+        for t in range(0, DURATION, 60):
+            a = t * sr
+            data[a:a + 20 * sr] += speech(rs, 20 * sr, sr, 0.1)
+            data[a + 20 * sr:a + 40 * sr] += music(rs, 20 * sr, sr, 0.2)
+    elif name == "program":
+        for t in range(0, DURATION, 60):
+            a = t * sr
+            data[a:a + 30 * sr] += speech(rs, 30 * sr, sr, 0.1)
+            data[a + 30 * sr:a + 60 * sr] += music(rs, 30 * sr, sr, 0.2)
+    return data
+
+def run(data, sr, chunk_size=4096):
+    wnd, d_f, d_t, d_s = make_pipeline(sr)
+    began = time.perf_counter()
+    nregular = 0
+    for i in range(0, len(data), chunk_size):
+        for w in wnd.update(data[i:i+chunk_size]):
+            seq, tspan = d_s.update(w, d_t.update(w, d_f.update(w)))
+            nregular += seq is not None
+    regular = time.perf_counter() - began
+
+    scanner = CascadeScanner(*make_pipeline(sr))
+    began = time.perf_counter()
+    ncascade = 0
+    for i in range(0, len(data), chunk_size):
+        ncascade += len(scanner.scan(data[i:i+chunk_size]))
+    cascade = time.perf_counter() - began
+    analyzed = scanner.nanalyzed / (scanner.nanalyzed + scanner.nskipped)
+    return regular, nregular, cascade, ncascade, analyzed
+
+def main():
+    sr, sample = helpers.read_audio(SAMPLE)
+    scanner = CascadeScanner(*make_pipeline(sr))
+    # RMS of a frame at which the bound of the first stage reaches min_tone_amp
+    threshold = scanner.d_t.min_tone_amp / (scanner._bound * np.sqrt(scanner.wnd.nsamples))
+    print("Frames below {:.1f} dBFS RMS are skipped".format(dbfs(threshold)))
+
+    rs = np.random.RandomState(0)
+    for name in ("idle", "mixed", "program"):
+        data = scenario(name, rs, sr)
+        for t in range(0, DURATION, 120):
+            data[t * sr:t * sr + len(sample)] += sample
+        regular, nregular, cascade, ncascade, analyzed = run(data, sr)
+        print("{:8s} regular {:6.2f}s {} sequences, cascade {:6.2f}s {} sequences, {:5.1f}% analyzed, speedup {:.1f}x".format(
+            name, regular, nregular, cascade, ncascade, 100 * analyzed, regular / cascade))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Times the FrequencyDetector engines over window sizes and numbers of target frequencies.
+
+Prints measured times next to the engine chosen by FrequencyDetector.costs, showing where
+the automatic selection crosses over between engines. Run as
+
+    python etc/benchmarks/frequency_engines.py
+"""
+
+import timeit
+import numpy as np
+from tonedetect.window import Window
+from tonedetect.detectors import FrequencyDetector
+
+SAMPLE_RATE = 8000
+
+def bench(ntotal, nfreqs, span):
+    """Returns microseconds per window for every engine and the automatically selected engine."""
+    fres = SAMPLE_RATE / ntotal
+    lo = ntotal // 16
+    span = min(span, ntotal // 2 - lo - 1)
+    freqs = np.linspace(lo, lo + span, nfreqs) * fres
+    data = np.random.RandomState(0).uniform(-1, 1, ntotal)
+    times = {}
+    for method in FrequencyDetector.METHODS + ('auto',):
+        wnd = Window(ntotal, SAMPLE_RATE, wndtype=Window.Type.hanning)
+        w = next(wnd.update(data))
+        fd = FrequencyDetector(freqs, method=method)
+        fd.update(w)
+        nruns = max(10, 2000000 // ntotal)
+        times[method] = min(timeit.repeat(lambda: fd.update(w), number=nruns, repeat=3)) / nruns * 1e6
+        if method == 'auto':
+            times['auto'] = fd.engine
+    return times
+
+def main():
+    print("{:>7} {:>6} {:>6} | {:>9} {:>9} {:>9} | {:>6} {:>6}".format("N", "freqs", "span", "rfft us", "dft us", "zoom us", "best", "auto"))
+    for ntotal in [256, 1024, 4096, 16384, 65536]:
+        for nfreqs, span in [(2, 20), (8, 100), (20, 200), (50, ntotal // 8)]:
+            t = bench(ntotal, nfreqs, span)
+            span = min(span, ntotal // 2 - ntotal // 16 - 1)
+            best = min(FrequencyDetector.METHODS, key=lambda m: t[m])
+            print("{:7d} {:6d} {:6d} | {:9.1f} {:9.1f} {:9.1f} | {:>6} {:>6}".format(
+                ntotal, nfreqs, span, t['rfft'], t['dft'], t['zoom'], best, t['auto']))
+
+if __name__ == "__main__":
+    main()
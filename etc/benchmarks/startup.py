@@ -0,0 +1,46 @@
+"""Measures the time a per-file harvester invocation takes to start and process a short input.
+
+Prints the median wall clock time of the harvester reading one second of audio from stdin,
+next to the time python needs to merely import NumPy, and the slowest imports reported by
+python -X importtime. tests/test_startup.py holds the difference to a budget. Run as
+
+    python etc/benchmarks/startup.py
+"""
+
+import os
+import sys
+import time
+import subprocess
+import numpy as np
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir, os.path.pardir))
+HARVEST = ["-m", "tonedetect.bin.harvester", "stdin", "--sample-rate", "8000"]
+
+def run(args, stdin=None, repeat=11):
+    """Returns the median wall clock time in seconds and the stderr of the last run."""
+    times = []
+    for i in range(repeat):
+        began = time.perf_counter()
+        p = subprocess.run([sys.executable] + args, input=stdin, cwd=PROJ_PATH, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        times.append(time.perf_counter() - began)
+    return sorted(times)[repeat // 2], p.stderr.decode()
+
+def main():
+    pcm = (np.sin(np.arange(8000) * 2 * np.pi * 697 / 8000) * 1000).astype(np.int16).tobytes()
+    baseline, _ = run(["-c", "import numpy"])
+    harvest, _ = run(HARVEST, stdin=pcm)
+    print("python and numpy {:.1f}ms, harvester {:.1f}ms, difference {:.1f}ms".format(
+        baseline * 1000, harvest * 1000, (harvest - baseline) * 1000))
+
+    _, log = run(["-X", "importtime"] + HARVEST, stdin=pcm, repeat=1)
+    imports = []
+    for line in log.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if line.startswith("import time:") and fields[1].strip().isdigit():
+            imports.append((int(fields[1]), fields[2].rstrip()))
+    print("Slowest imports (cumulative ms):")
+    for us, name in sorted(imports, reverse=True)[:10]:
+        print("{:8.1f} {}".format(us / 1000, name))
+
+if __name__ == "__main__":
+    main()
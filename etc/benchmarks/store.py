@@ -0,0 +1,29 @@
+"""Measures throughput of DetectionStore.
+
+Queues sequences and tones as fast as possible and reports the rate of the detection loop
+adding them as well as the rate at which they end up in the database. Run as
+
+    python etc/benchmarks/store.py
+"""
+
+import os
+import time
+import tempfile
+from tonedetect.timespan import Timespan
+from tonedetect.store import DetectionStore
+
+def main(n=200000):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DetectionStore(os.path.join(tmp, "detections.db"))
+        tspan = Timespan(1., 2.)
+        began = time.perf_counter()
+        for i in range(n // 2):
+            store.add_sequence("0123456789", tspan, stream="bench", file="bench.wav")
+            store.add_tones(["5"], [1.5], [0.3], stream="bench", file="bench.wav")
+        queued = time.perf_counter() - began
+        store.close()
+        stored = time.perf_counter() - began
+    print("Queued {} detections at {:.0f}/s, stored at {:.0f}/s".format(n, n / queued, n / stored))
+
+if __name__ == "__main__":
+    main()
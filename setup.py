@@ -15,6 +15,10 @@ tests_requires = [
     'pytest'
 ]
 
+extras_require = {
+    'jit': ['numba']
+}
+
 setup(name='tonedetect',
       version=__version__,
       description='Capture tone sequences from real-time audio streams in Python',
@@ -27,5 +31,6 @@ setup(name='tonedetect',
       zip_safe=False,
       setup_requires=['pytest-runner'],
       tests_require=tests_requires,
-      install_requires=install_requires
+      install_requires=install_requires,
+      extras_require=extras_require
 )
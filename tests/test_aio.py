@@ -0,0 +1,83 @@
+import os
+import stat
+import asyncio
+import itertools
+import concurrent.futures
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect import aio
+from tonedetect import helpers
+from tonedetect import sources
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+FREQS = DTMF_TONES.all_tone_frequencies()
+
+def make_pipeline(sr):
+    wnd = Window.tuned(sr, FREQS, power_of_2=True, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(FREQS)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1)
+    return wnd, d_f, d_t, d_s
+
+def detect_sync(sr, data):
+    wnd, d_f, d_t, d_s = make_pipeline(sr)
+    parts = itertools.chain(sources.InMemorySource(data, sr, chunk_size=1000).generate_parts(), sources.SilenceSource(1, sr).generate_parts())
+    results = []
+    for w in wnd.update(parts):
+        seq, tspan = d_s.update(w, d_t.update(w, d_f.update(w)))
+        if seq:
+            results.append(("".join(str(e) for e in seq), tspan.start, tspan.end))
+    return results
+
+async def collect(parts, sr, **kwargs):
+    return [("".join(str(e) for e in seq), tspan.start, tspan.end)
+            async for channel, seq, tspan in aio.detect(parts, *make_pipeline(sr), **kwargs)]
+
+def test_detect_matches_blocking_pipeline():
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    expected = detect_sync(sr, data)
+    assert "".join(e[0] for e in expected) == "0123456789#*ABCD"
+
+    parts = sources.InMemorySource(data, sr, chunk_size=1000).generate_parts()
+    assert asyncio.run(collect(parts, sr, flush=1)) == expected
+
+    async def concurrent_streams():
+        # Several streams share one loop and executor
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            tasks = [collect(sources.InMemorySource(data, sr, chunk_size=1000).generate_parts(), sr, flush=1, executor=executor) for i in range(3)]
+            return await asyncio.gather(*tasks)
+    assert asyncio.run(concurrent_streams()) == [expected] * 3
+
+def test_stream_source_decodes_partial_frames():
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    pcm = (data * 32767).astype(np.int16).tobytes()
+
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(pcm)
+        reader.feed_eof()
+        # Odd chunk size splits samples across reads
+        src = aio.AsyncStreamSource(reader, sample_rate=sr, chunk_size=1001)
+        return await collect(src.generate_parts(), sr, flush=1)
+
+    assert "".join(e[0] for e in asyncio.run(run())) == "0123456789#*ABCD"
+
+def test_ffmpeg_source_runs_subprocess(tmpdir):
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    pcm = str(tmpdir.join("audio.pcm"))
+    with open(pcm, "wb") as f:
+        f.write((data * 32767).astype(np.int16).tobytes())
+
+    # Stands in for FFMPEG by writing already decoded samples
+    stub = str(tmpdir.join("ffmpeg"))
+    with open(stub, "w") as f:
+        f.write("#!/bin/sh\ncat '{}'\n".format(pcm))
+    os.chmod(stub, os.stat(stub).st_mode | stat.S_IEXEC)
+
+    src = aio.AsyncFFMPEGSource("input.wav", ffmpeg_binary=stub, sample_rate=sr)
+    assert "".join(e[0] for e in asyncio.run(collect(src.generate_parts(), sr))) == "0123456789#*ABCD"
+    assert src.samples_processed == len(data)
@@ -0,0 +1,46 @@
+import os
+import tracemalloc
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect import generators
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+def test_steady_state_allocations_per_window():
+    sr = 8000
+    freqs = DTMF_TONES.all_tone_frequencies()
+    wnd = Window.tuned(sr, freqs, power_of_2=True, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(freqs)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_presence=0.04, min_pause=0.04)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=100)
+
+    # Alternating tone and silence keeps every branch of the state machines busy.
+    tone = generators.generate_signal(sr, 0.2, [697, 1209], [0.5, 0.5])
+    data = np.tile(np.concatenate((tone, np.zeros(len(tone)))), 20)
+
+    def process():
+        nwindows = 0
+        for w in wnd.update(data):
+            d_s.update(w, d_t.update(w, d_f.update(w)))
+            nwindows += 1
+        return nwindows
+
+    process() # Warm up buffers
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        nwindows = process()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert nwindows > 100
+    # Nothing is retained per window, except for the pending sequence which is capped by the test signal.
+    assert after - before < 4096
+    # Transient allocations are bounded by a few spectra, independent of the number of windows.
+    assert peak - before < 8 * wnd.ntotal * np.dtype(np.complex128).itemsize
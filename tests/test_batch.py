@@ -0,0 +1,62 @@
+import os
+import re
+import pytest
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect.batch import BatchScanner
+from tonedetect import kernels
+from tonedetect import helpers
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE_DIR = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+def sample_files():
+    for dirname, dirnames, filenames in os.walk(TEST_SAMPLE_DIR):
+        for filename in sorted(filenames):
+            if filename.endswith(".wav"):
+                yield os.path.join(dirname, filename)
+
+def make_scanner(sample_rate, use_kernels, max_sequence_length=None):
+    freqs = DTMF_TONES.all_tone_frequencies()
+    wnd = Window.tuned(sample_rate, freqs, power_of_2=True, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(freqs)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1, max_sequence_length=max_sequence_length)
+    return BatchScanner(wnd, d_f, d_t, d_s, batch_size=64, use_kernels=use_kernels)
+
+def scan(scanner, data, chunk_size):
+    data = np.concatenate((data, np.zeros(scanner.wnd.sample_rate)))
+    results = []
+    for i in range(0, len(data), chunk_size):
+        results.extend(scanner.scan(data[i:i+chunk_size]))
+    return [("".join(str(e) for e in seq), tspan.start, tspan.end) for seq, tspan in results]
+
+@pytest.mark.skipif(not kernels.HAS_NUMBA, reason="Numba not installed")
+@pytest.mark.parametrize("path", list(sample_files()))
+def test_compiled_scan_matches_window_pipeline(path):
+    sr, data = helpers.read_audio(path)
+    expected = scan(make_scanner(sr, False), data, 1000)
+    assert len(expected) > 0
+    assert scan(make_scanner(sr, True), data, 1000) == expected
+    assert scan(make_scanner(sr, True), data, 7919) == expected
+
+    expected = scan(make_scanner(sr, False, max_sequence_length=3), data, 1000)
+    assert scan(make_scanner(sr, True, max_sequence_length=3), data, 1000) == expected
+
+@pytest.mark.skipif(not kernels.HAS_NUMBA, reason="Numba not installed")
+def test_compiled_window_updates_match_python():
+    sr, data = helpers.read_audio(next(sample_files()))
+    expected = scan(make_scanner(sr, False), data, 1000)
+    scanner = make_scanner(sr, False)
+    scanner.d_t.use_kernels = True
+    assert scan(scanner, data, 1000) == expected
+
+def test_goertzel_matches_rfft():
+    x = np.random.RandomState(0).uniform(-1, 1, 100)
+    bins = np.array([3, 10, 17])
+    out = np.zeros(3)
+    kernels.goertzel(x, bins, 128, out)
+    np.testing.assert_allclose(out, np.abs(np.fft.rfft(x, 128))[bins])
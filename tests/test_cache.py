@@ -0,0 +1,109 @@
+import os
+import sys
+import shutil
+import subprocess
+import itertools
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect.cache import AmplitudeCache
+from tonedetect import helpers
+from tonedetect import sources
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--min7db.wav")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+FREQS = DTMF_TONES.all_tone_frequencies()
+
+def make_detectors(min_tone_amp):
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=min_tone_amp, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1)
+    return d_t, d_s
+
+def detect(windows, d_t, d_s):
+    results = []
+    for w, amps in windows:
+        seq, tspan = d_s.update(w, d_t.update(w, amps))
+        if seq:
+            results.append(("".join(str(e) for e in seq), tspan.start, tspan.end))
+    return results
+
+def analyze(sr, data, wnd, d_f, writer=None):
+    src = sources.InMemorySource(data, sr, chunk_size=1000)
+    silence = sources.SilenceSource(1, sr)
+    for w in wnd.update(itertools.chain(src.generate_parts(), silence.generate_parts())):
+        amps = d_f.update(w)
+        if writer:
+            writer.add(amps)
+        yield w, amps
+
+def test_replay_matches_full_analysis(tmpdir):
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    wnd = Window.tuned(sr, FREQS, power_of_2=True, wndtype=Window.Type.hanning)
+
+    cache = AmplitudeCache(TEST_SAMPLE, wnd, FREQS, directory=str(tmpdir))
+    assert not cache.complete
+    writer = cache.writer()
+    first = detect(analyze(sr, data, wnd, detectors.FrequencyDetector(FREQS), writer), *make_detectors(0.1))
+    writer.close()
+    assert cache.complete
+    assert cache.load().shape == (writer.nframes, len(FREQS))
+
+    for min_tone_amp in [0.1, 0.05, 0.2]:
+        wnd = Window.tuned(sr, FREQS, power_of_2=True, wndtype=Window.Type.hanning)
+        expected = detect(analyze(sr, data, wnd, detectors.FrequencyDetector(FREQS)), *make_detectors(min_tone_amp))
+        assert detect(cache.replay(), *make_detectors(min_tone_amp)) == expected
+    assert detect(cache.replay(flush=1.), *make_detectors(0.1)) == first
+
+def test_key_depends_on_window_layout():
+    a = AmplitudeCache.compute_key(TEST_SAMPLE, Window(200, 8000), FREQS)
+    b = AmplitudeCache.compute_key(TEST_SAMPLE, Window(200, 8000, nhop=50), FREQS)
+    c = AmplitudeCache.compute_key(TEST_SAMPLE, Window(200, 8000, wndtype=Window.Type.hanning), FREQS)
+    assert len(set([a, b, c])) == 3
+    assert a == AmplitudeCache.compute_key(TEST_SAMPLE, Window(200, 8000), FREQS)
+
+def test_source_hash_is_reused_while_file_is_unchanged(tmpdir):
+    source = str(tmpdir.join("sample.wav"))
+    shutil.copy(TEST_SAMPLE, source)
+    index = str(tmpdir.join("sample.wav.sha1.json"))
+    digest = AmplitudeCache.source_hash(TEST_SAMPLE)
+
+    # Files modified just now are hashed on every call
+    assert AmplitudeCache.source_hash(source, index=index) == digest
+    assert not os.path.exists(index)
+
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns - 10**10))
+    assert AmplitudeCache.source_hash(source, index=index) == digest
+    assert os.path.exists(index)
+    # An unchanged stamp means the content is not read again
+    with open(source, "r+b") as f:
+        f.write(b"\0")
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns - 10**10))
+    assert AmplitudeCache.source_hash(source, index=index) == digest
+    # Changed stamps lead to hashing again
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns - 2 * 10**10))
+    assert AmplitudeCache.source_hash(source, index=index) != digest
+
+def test_harvester_replays_with_audio_capture(tmp_path):
+    source = str(tmp_path / "sample.wav")
+    shutil.copy(TEST_SAMPLE, source)
+    sr, data = helpers.read_audio(source)
+    wnd = Window.tuned(sr, FREQS, power_of_2=True, wndtype=Window.Type.hanning)
+    writer = AmplitudeCache(source, wnd, FREQS).writer()
+    for w, amps in analyze(sr, data, wnd, detectors.FrequencyDetector(FREQS), writer):
+        pass
+    writer.close()
+
+    # A complete cache is replayed without running FFMPEG.
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text("#!/bin/sh\nexit 1\n")
+    ffmpeg.chmod(0o755)
+    proc = subprocess.run([sys.executable, "-m", "tonedetect.bin.harvester", "ffmpeg", "--source", source, "--ffmpeg", str(ffmpeg),
+                           "--sample-rate", str(sr), "--amplitude-cache", "--capture-audio", "--capture-audio-dir", str(tmp_path)],
+                          cwd=PROJ_PATH, capture_output=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr.decode()
+    assert b"Replaying cached amplitudes" in proc.stderr
+    assert b"assigned #" in proc.stderr
+    assert [f.name for f in tmp_path.glob("*.wav")] == ["sample.wav"]
@@ -0,0 +1,75 @@
+import os
+import pytest
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect.cascade import CascadeScanner
+from tonedetect import helpers
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE_DIR = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+FREQS = DTMF_TONES.all_tone_frequencies()
+
+def sample_files():
+    for dirname, dirnames, filenames in os.walk(TEST_SAMPLE_DIR):
+        for filename in sorted(filenames):
+            if filename.endswith(".wav"):
+                yield os.path.join(dirname, filename)
+
+def make_pipeline(sample_rate, nchannels=1):
+    wnd = Window.tuned(sample_rate, FREQS, power_of_2=True, nchannels=nchannels, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(FREQS)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04, nchannels=nchannels)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1, nchannels=nchannels)
+    return wnd, d_f, d_t, d_s
+
+def scan_windows(sample_rate, data, nchannels=1):
+    wnd, d_f, d_t, d_s = make_pipeline(sample_rate, nchannels)
+    results = []
+    for w in wnd.update(data):
+        if nchannels == 1:
+            seq, tspan = d_s.update(w, d_t.update(w, d_f.update(w)))
+            if seq:
+                results.append((seq, tspan))
+        else:
+            results.extend(d_s.update(w, d_t.update(w, d_f.update(w))))
+    return results, d_t.get_state()
+
+def scan_cascade(sample_rate, data, chunk_size, nchannels=1, margin=1):
+    scanner = CascadeScanner(*make_pipeline(sample_rate, nchannels), margin=margin)
+    results = []
+    for i in range(0, data.shape[-1], chunk_size):
+        results.extend(scanner.scan(data[..., i:i+chunk_size]))
+    return results, scanner
+
+def as_tuples(results):
+    out = []
+    for r in results:
+        *channel, seq, tspan = r
+        out.append(tuple(channel) + ("".join(str(e) for e in seq), tspan.start, tspan.end))
+    return out
+
+@pytest.mark.parametrize("path", list(sample_files()))
+def test_cascade_matches_window_pipeline(path):
+    sr, data = helpers.read_audio(path)
+    # Idle audio around the samples, as in mostly silent feeds
+    data = np.concatenate((np.zeros(3 * sr), data, np.random.RandomState(0).normal(0, 0.005, 5 * sr)))
+    expected, state = scan_windows(sr, data)
+    assert len(expected) > 0
+
+    for chunk_size, margin in [(1000, 1), (7919, 0)]:
+        results, scanner = scan_cascade(sr, data, chunk_size, margin=margin)
+        assert as_tuples(results) == as_tuples(expected)
+        for k, v in scanner.d_t.get_state().items():
+            np.testing.assert_array_equal(v, state[k])
+        assert scanner.nskipped > scanner.nanalyzed
+
+def test_cascade_multichannel():
+    sr, data = helpers.read_audio(next(sample_files()))
+    data = np.vstack((np.concatenate((data, np.zeros(sr))), np.concatenate((np.zeros(sr), data))))
+    expected, state = scan_windows(sr, data, nchannels=2)
+    results, scanner = scan_cascade(sr, data, 1000, nchannels=2)
+    assert as_tuples(results) == as_tuples(expected)
+    assert {r[0] for r in results} == {0, 1}
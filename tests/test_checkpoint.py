@@ -0,0 +1,75 @@
+import os
+import pickle
+import itertools
+import pytest
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect.checkpoint import Checkpoint
+from tonedetect import helpers
+from tonedetect import sources
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "100by100at8000Hz", "0123456789PpsPABCD.wav")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+def make_pipeline(sample_rate, data):
+    freqs = DTMF_TONES.all_tone_frequencies()
+    src = sources.InMemorySource(data, sample_rate, chunk_size=1000)
+    wnd = Window.tuned(sample_rate, freqs, power_of_2=True, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(freqs)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1)
+    return src, wnd, d_f, d_t, d_s
+
+def run(src, wnd, d_f, d_t, d_s, checkpoint=None, stop_after=None):
+    detections = []
+    silence = sources.SilenceSource(1, src.sample_rate)
+    for i, chunk in enumerate(itertools.chain(src.generate_parts(), silence.generate_parts())):
+        if stop_after is not None and i == stop_after:
+            # Simulate a crash: everything after the last checkpoint is lost.
+            return detections
+        for w in wnd.update(chunk):
+            seq, tspan = d_s.update(w, d_t.update(w, d_f.update(w)))
+            if seq:
+                detections.append(("".join(str(e) for e in seq), tspan.start, tspan.end))
+        if checkpoint:
+            checkpoint.update(src.samples_processed / src.sample_rate)
+    return detections
+
+def test_resumed_run_matches_uninterrupted_run(tmpdir):
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    expected = run(*make_pipeline(sr, data))
+    assert len(expected) > 1
+
+    filename = str(tmpdir.join("state.ckpt"))
+
+    src, wnd, d_f, d_t, d_s = make_pipeline(sr, data)
+    components = {'source': src, 'window': wnd, 'tones': d_t, 'sequences': d_s}
+    before = run(src, wnd, d_f, d_t, d_s, checkpoint=Checkpoint(filename, interval=0.3, components=components), stop_after=40)
+    assert os.path.isfile(filename)
+
+    src, wnd, d_f, d_t, d_s = make_pipeline(sr, data)
+    components = {'source': src, 'window': wnd, 'tones': d_t, 'sequences': d_s}
+    assert Checkpoint(filename, components=components).restore()
+    assert src.samples_processed > 0
+    after = run(src, wnd, d_f, d_t, d_s)
+
+    # Detections completed between the last checkpoint and the crash are reported again after resuming.
+    assert len(after) > 0
+    assert after == expected[len(expected) - len(after):]
+    assert [d for d in before if d not in after] + after == expected
+
+def test_restore_without_checkpoint(tmpdir):
+    c = Checkpoint(str(tmpdir.join("missing.ckpt")), components={'window': Window(4, 10)})
+    assert not c.restore()
+
+def test_restore_rejects_other_versions(tmpdir):
+    filename = str(tmpdir.join("state.pkl"))
+    # Layout of the first version, before ToneDetector state became array based
+    with open(filename, "wb") as f:
+        pickle.dump({'version': 1, 'components': {'tones': [{'on': (0, 0), 'off': (0, 0), 'reported': False}]}}, f)
+    cp = Checkpoint(filename, components={'tones': detectors.ToneDetector(DTMF_TONES)})
+    with pytest.raises(ValueError, match="version 1"):
+        cp.restore()
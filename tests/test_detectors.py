@@ -1,9 +1,11 @@
 from tonedetect import generators
 
-from tonedetect.window import Window
+from tonedetect.window import Window, Frame
 from tonedetect.detectors import FrequencyDetector
 from tonedetect import detectors
+from tonedetect.tones import Tones
 import numpy as np
+from tonedetect.timespan import Timespan
 
 
 def test_frequency_detector_rectangle():
@@ -34,7 +36,77 @@ def test_frequency_detector_hanning():
     result = fd.update(w)
     assert np.all([a >= 0.1 for a in result])
 
-        
-        
+def test_sequence_detector_flushes_long_sequences():
+    class Frame:
+        pass
 
+    d = detectors.ToneSequenceDetector(max_tone_interval=1., min_sequence_length=1, max_sequence_length=3)
+    frame = Frame()
+    results = []
+    for i in range(8):
+        frame.timespan = Timespan(i / 10, i / 10 + 0.05)
+        seq, tspan = d.update(frame, [i])
+        if seq:
+            results.append((seq, tspan.start))
+    assert results == [([0, 1, 2], 0.), ([3, 4, 5], 0.3)]
+    assert d.sequence == [6, 7]
 
+def test_frequency_detector_engines_agree():
+    sf = 8000
+    freqs = [697., 770., 852., 941., 1209., 1336.]
+    s = generators.generate_signal(sf, 1, freqs[:3], [0.3, 0.5, 0.7])
+    s = np.vstack((s, s[::-1]))
+
+    results = {}
+    for method in FrequencyDetector.METHODS:
+        wnd = Window(400, sf, npads=112, nchannels=2, wndtype=Window.Type.hanning)
+        fd = FrequencyDetector(freqs, method=method)
+        results[method] = [fd.update(w).copy() for w in wnd.update(s)]
+        assert fd.engine == method
+    np.testing.assert_allclose(results['dft'], results['rfft'], atol=1e-9)
+    np.testing.assert_allclose(results['zoom'], results['rfft'], atol=1e-9)
+
+def test_frequency_detector_selects_engine():
+    costs = FrequencyDetector.costs(256, np.arange(8))
+    assert min(costs, key=costs.get) == 'rfft'
+    costs = FrequencyDetector.costs(65536, np.array([100, 120]))
+    assert min(costs, key=costs.get) == 'dft'
+
+    # Automatic selection is opt-in
+    w = next(Window(65536, 65536).update(np.zeros(65536)))
+    fd = FrequencyDetector([10., 20.])
+    fd.update(w)
+    assert fd.engine == 'rfft' and fd.fft_values is not None
+    fd = FrequencyDetector([10., 20.], method='auto')
+    fd.update(w)
+    assert fd.engine == 'dft' and fd.fft_values is None
+
+def test_tone_data_views_state():
+    tones = Tones()
+    tones.add_tone([100., 200.], sym='x')
+    tones.add_tone([300.], sym='y')
+    d = detectors.ToneDetector(tones, min_presence=0., min_pause=0.)
+
+    frame = Frame(Timespan(1., 2.))
+    amps = np.zeros(3)
+    amps[[d.freqs.index(100.), d.freqs.index(200.)]] = 1.
+    d.update(frame, amps)
+    x, y = d.tone_data
+    assert (x.sym, x.ids, y.ids) == ('x', [d.freqs.index(100.), d.freqs.index(200.)], [d.freqs.index(300.)])
+    assert x.reported and not y.reported
+    assert (x.on.start, x.on.end) == (1., 2.)
+    y.reported = True
+    x.on = Timespan(0.5, 2.)
+    assert d.reported[0, 1] and d.on_start[0, 0] == 0.5
+
+def test_tone_detector_accepts_amplitude_sequences():
+    tones = Tones()
+    tones.add_tone([100.], sym='x')
+    tones.add_tone([200.], sym='y')
+    d = detectors.ToneDetector(tones, min_presence=0., min_pause=0.)
+
+    frame = Frame(Timespan(1., 2.))
+    amps = [0., 0.]
+    amps[d.freqs.index(100.)] = 1.
+    assert list(d.update(frame, amps)) == ['x']
+    assert d.update(frame, [0.] * 2) == []
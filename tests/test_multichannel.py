@@ -0,0 +1,76 @@
+import os
+import itertools
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect import helpers
+from tonedetect import sources
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE_DIR = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+def run(sample_rate, data, channel_api=False):
+    """Run pipeline on channels x samples data and return detections tagged with channels."""
+    nchannels = 1 if data.ndim == 1 else data.shape[0]
+    freqs = DTMF_TONES.all_tone_frequencies()
+    wnd = Window.tuned(sample_rate, freqs, power_of_2=True, nchannels=nchannels, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(freqs)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04, nchannels=nchannels)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1, nchannels=nchannels)
+
+    src = sources.InMemorySource(data, sample_rate, chunk_size=1000)
+    silence = sources.SilenceSource(1, sample_rate, channels=nchannels)
+
+    results = []
+    for w in wnd.update(itertools.chain(src.generate_parts(), silence.generate_parts())):
+        if channel_api:
+            detections = d_s.update_channels(w, d_t.update_channels(w, d_f.update(w)))
+            assert len(d_t.channel_onsets) == nchannels
+        elif nchannels == 1:
+            tones = d_t.update(w, d_f.update(w))
+            seq, tspan = d_s.update(w, tones)
+            detections = [(0, seq, tspan)] if seq else []
+        else:
+            detections = d_s.update(w, d_t.update(w, d_f.update(w)))
+        for c, seq, tspan in detections:
+            results.append((c, "".join(str(e) for e in seq), tspan.start, tspan.end))
+    return results
+
+def test_channels_are_analyzed_independently():
+    sr = 8000
+    files = ["100by100at8000Hz/0123456789psABCD.wav", "100by100at8000Hz/AAAABBBB.wav", "50by50at8000HzRadioOverlay/0123456789psABCD--min7db.wav"]
+    channels = [helpers.read_audio(os.path.join(TEST_SAMPLE_DIR, f))[1] for f in files]
+    n = max(len(c) for c in channels)
+    data = np.zeros((len(channels) + 1, n))
+    for i, c in enumerate(channels):
+        data[i, :len(c)] = c
+    # Last channel stays silent
+
+    expected = []
+    for i in range(data.shape[0]):
+        expected.extend((i, seq, start, end) for c, seq, start, end in run(sr, data[i]))
+
+    result = run(sr, data)
+    assert sorted(result) == sorted(expected)
+    assert set(c for c, seq, start, end in result) == set(range(len(channels)))
+
+def test_decode_deinterleaves_partial_frames():
+    src = sources.BaseSource(8000, channels=3)
+    raw = np.arange(-6, 6, dtype=np.int16).tobytes()
+
+    a = src.decode(raw[:8], np.int16)
+    b = src.decode(raw[8:], np.int16)
+    assert a.shape == (3, 1)
+    assert b.shape == (3, 3)
+    audio = np.hstack((a, b)) * 32768
+    np.testing.assert_allclose(audio, [[-6, -3, 0, 3], [-5, -2, 1, 4], [-4, -1, 2, 5]])
+    assert src.samples_processed == 4
+
+def test_channel_api_is_independent_of_number_of_channels():
+    sr, a = helpers.read_audio(os.path.join(TEST_SAMPLE_DIR, "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav"))
+    for data in (a, np.stack((a, np.roll(a, 4000)))):
+        expected = run(sr, data)
+        assert len(expected) == len(data.reshape(-1, len(a)))
+        assert run(sr, data, channel_api=True) == expected
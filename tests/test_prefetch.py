@@ -0,0 +1,76 @@
+import time
+import pytest
+import numpy as np
+from tonedetect import sources
+from tonedetect.window import Window
+from tonedetect.bin.buffer import AudioBuffer
+
+class SlowSource(sources.BaseSource):
+    """Yields numbered parts, taking delay seconds to produce each."""
+
+    def __init__(self, nparts, delay, fail=False):
+        super().__init__(1000)
+        self.nparts = nparts
+        self.delay = delay
+        self.fail = fail
+
+    def generate_parts(self):
+        for i in range(self.start_sample // 10, self.nparts):
+            time.sleep(self.delay)
+            self.bytes_processed += 20
+            yield np.full(10, i, dtype=np.float_)
+        if self.fail:
+            raise IOError("Input failed")
+
+def test_prefetch_overlaps_reading_and_analysis():
+    src = sources.PrefetchSource(SlowSource(20, 0.), depth=4)
+    parts = []
+    for part in src.generate_parts():
+        parts.append(part.copy())
+        time.sleep(0.005)
+
+    np.testing.assert_array_equal(np.concatenate(parts), np.repeat(np.arange(20), 10))
+    # The reader ran ahead while parts were analyzed, until it ran out of buffers.
+    assert src.max_queue_depth >= 2
+    assert src.reader_stall_time > 0
+    assert src.samples_processed == 200
+    assert src.bytes_processed == 400
+    assert src.dropped_chunks == 0
+    assert src.max_queue_depth <= 4
+
+def test_prefetch_drops_parts_when_full():
+    src = sources.PrefetchSource(SlowSource(50, 0.), depth=2, drop_when_full=True)
+    wnd = Window(10, 1000, nhop=10)
+    values = []
+    for part in src.generate_parts():
+        for w in wnd.update(part):
+            values.append(w.samples[0])
+            # Dropped parts are replaced by silence, so frames keep the time of the input.
+            if w.samples[0] > 0:
+                assert w.timespan.start == w.samples[0] / 100
+        time.sleep(0.01)
+    assert src.dropped_chunks > 0
+    assert len(values) == 50
+    assert values.count(0.) == src.dropped_chunks + 1
+    assert src.dropped_samples == 10 * src.dropped_chunks
+    assert src.samples_processed == 500
+    assert "dropped" in src.metrics()
+
+def test_prefetch_forwards_errors_and_state():
+    src = sources.PrefetchSource(SlowSource(5, 0., fail=True), depth=2)
+    with pytest.raises(IOError):
+        list(src.generate_parts())
+
+    src = sources.PrefetchSource(SlowSource(5, 0.), depth=2)
+    src.set_state({'samples_processed': 30, 'bytes_processed': 60})
+    parts = [p[0] for p in src.generate_parts()]
+    assert parts == [3, 4]
+    assert src.get_state()['samples_processed'] == 50
+
+def test_captured_audio_is_not_overwritten_by_later_parts():
+    data = np.stack((np.arange(2000), np.arange(2000) + 40000)).astype(np.float_)
+    src = sources.PrefetchSource(sources.InMemorySource(data, 1000, chunk_size=100), depth=2)
+    buf = AudioBuffer(1000, 5)
+    for part in src.generate_parts():
+        buf.add(part)
+    np.testing.assert_array_equal(buf.get(), data.T)
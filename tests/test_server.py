@@ -0,0 +1,143 @@
+import os
+import io
+import json
+import socket
+import asyncio
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.server import DetectionServer, RTP_HEADER
+from tonedetect import helpers
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE_DIR = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+def load(filename):
+    sr, data = helpers.read_audio(os.path.join(TEST_SAMPLE_DIR, filename))
+    return sr, (data * 32767).astype(np.int16)
+
+def make_server(sr, output, **kwargs):
+    return DetectionServer(DTMF_TONES, sr, output,
+        detector_args={'min_tone_amp': 0.1, 'max_inter_tone_amp': 0.1, 'min_presence': 0.04, 'min_pause': 0.04},
+        sequence_args={'max_tone_interval': 0.5, 'min_sequence_length': 1}, **kwargs)
+
+async def send_tcp(address, pcm, chunk_size):
+    reader, writer = await asyncio.open_connection(*address)
+    data = pcm.tobytes()
+    for i in range(0, len(data), chunk_size):
+        writer.write(data[i:i+chunk_size])
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+async def drained(server, nstreams):
+    while server.nstreams < nstreams or server.streams:
+        await asyncio.sleep(0.05)
+
+def test_tcp_streams_are_detected_independently():
+    sr, pcm = load("0123456789psABCD--0db.wav")
+    output = io.StringIO()
+
+    async def run():
+        server = make_server(sr, output, max_buffer=0.5)
+        await server.start(tcp_port=0)
+        # More clients than fit into queues at once, sending odd sized chunks
+        await asyncio.gather(*[send_tcp(server.addresses['tcp'], pcm, 1001 + i) for i in range(20)])
+        # Clients are done once their data is buffered by the kernel. Wait for the server to read and process all of it.
+        await asyncio.wait_for(drained(server, 20), timeout=30)
+        await server.stop()
+        return server
+
+    server = asyncio.run(run())
+    lines = [json.loads(l) for l in output.getvalue().splitlines()]
+    assert server.nstreams == 20
+    assert len(server.streams) == 0
+    assert sorted(l['stream'] for l in lines) == sorted("tcp:{}".format(i) for i in range(1, 21))
+    assert all(l['sequence'] == "0123456789#*ABCD" for l in lines)
+
+def test_udp_rtp_streams():
+    sr, pcm = load("0123456789psABCD--0db.wav")
+    output = io.StringIO()
+    payload = pcm.astype(">i2").tobytes()
+    packet_size = 320
+
+    async def run():
+        server = make_server(sr, output)
+        await server.start(udp_port=0)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for i, offset in enumerate(range(0, len(payload), packet_size)):
+            for ssrc in (7, 8):
+                # Stream 8 loses a packet
+                if ssrc == 8 and i == 3:
+                    continue
+                header = RTP_HEADER.pack(0x80, 11, i % 65536, offset // 2, ssrc)
+                sock.sendto(header + payload[offset:offset + packet_size], server.addresses['udp'])
+            if i % 20 == 0:
+                await asyncio.sleep(0.001)
+        sock.close()
+        await asyncio.sleep(0.2)
+        lost = server.streams["udp:8"].packets_lost
+        await server.stop()
+        return lost
+
+    assert asyncio.run(run()) == 1
+    lines = [json.loads(l) for l in output.getvalue().splitlines()]
+    assert sorted(l['stream'] for l in lines) == ["udp:7", "udp:8"]
+    assert all(l['sequence'] == "0123456789#*ABCD" for l in lines)
+    # Lost packets are replaced by silence, so both streams keep the same time base
+    assert lines[0]['start'] == lines[1]['start']
+
+def test_udp_queue_bound():
+    output = io.StringIO()
+
+    def packet(seq):
+        return RTP_HEADER.pack(0x80, 11, seq, seq * 160, 9) + np.zeros(160, dtype=">i2").tobytes()
+
+    async def run():
+        server = make_server(8000, output, max_buffer=0.1)
+        for seq in range(6):
+            server.receive_datagram(packet(seq))
+        stream = server.streams["udp:9"]
+        # The queue holds 800 samples, so the sixth packet is dropped but not counted as lost afterwards.
+        assert stream.npending == 800
+        server.process()
+        server.receive_datagram(packet(6))
+        assert (stream.packets_dropped, stream.packets_lost) == (1, 0)
+
+        # Silence replacing lost packets is limited to the queue bound.
+        server.receive_datagram(packet(2000))
+        assert stream.packets_lost == 1993
+        assert stream.npending == 800 + 160
+
+    asyncio.run(run())
+
+def test_stop_closes_connections_with_full_queues():
+    async def run():
+        server = make_server(8000, io.StringIO(), max_buffer=0.1)
+        await server.start(tcp_port=0)
+        reader, writer = await asyncio.open_connection(*server.addresses['tcp'])
+        writer.write(np.zeros(80000, dtype=np.int16).tobytes())
+        while not any(s.full for s in server.streams.values()):
+            await asyncio.sleep(0.001)
+        await asyncio.wait_for(server.stop(), timeout=10)
+        # The connection is closed instead of waiting for a queue nobody drains anymore.
+        assert await asyncio.wait_for(reader.read(), timeout=10) == b""
+        writer.close()
+        return server
+
+    assert not asyncio.run(run()).streams
+
+def test_stop_ends_handlers_of_idle_connections():
+    async def run():
+        server = make_server(8000, io.StringIO())
+        await server.start(tcp_port=0)
+        reader, writer = await asyncio.open_connection(*server.addresses['tcp'])
+        while not server.streams:
+            await asyncio.sleep(0.001)
+        await asyncio.wait_for(server.stop(), timeout=10)
+        # Connections of idle clients are closed once stop returns.
+        assert await asyncio.wait_for(reader.read(), timeout=1) == b""
+        writer.close()
+        return server
+
+    assert not asyncio.run(run()).streams
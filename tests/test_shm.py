@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import subprocess
+import multiprocessing
+import pytest
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect.shm import SharedRingWriter, SharedRingSource
+from tonedetect import helpers
+from tonedetect import sources
+from tonedetect import detectors
+from tonedetect.bin.buffer import AudioBuffer
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+def detect(source):
+    freqs = DTMF_TONES.all_tone_frequencies()
+    wnd = Window.tuned(source.sample_rate, freqs, power_of_2=True, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(freqs)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1)
+    detected = []
+    for w in wnd.update(source.generate_parts()):
+        seq, tspan = d_s.update(w, d_t.update(w, d_f.update(w)))
+        if seq:
+            detected.append(("".join(str(e) for e in seq), tspan.start))
+    return detected
+
+def read_in_process(name, results):
+    src = SharedRingSource(name, from_start=True)
+    results.put((detect(src), src.overruns))
+    src.close()
+
+def test_readers_in_other_processes():
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    data = np.concatenate((data, np.zeros(sr)))
+    expected = detect(sources.InMemorySource(data, sr))
+
+    with SharedRingWriter(capacity=4 * sr, sample_rate=sr) as writer:
+        ctx = multiprocessing.get_context("fork")
+        results = ctx.Queue()
+        readers = [ctx.Process(target=read_in_process, args=(writer.name, results)) for i in range(2)]
+        for p in readers:
+            p.start()
+        # Feed in real time steps, faster than real time
+        for i in range(0, len(data), 800):
+            writer.write(data[i:i+800])
+            time.sleep(0.002)
+        writer.close()
+        outcomes = [results.get(timeout=30) for p in readers]
+        for p in readers:
+            p.join()
+    assert outcomes == [(expected, 0)] * 2
+
+def test_reader_detects_overruns():
+    with SharedRingWriter(capacity=1000, sample_rate=8000) as writer:
+        src = SharedRingSource(writer.name, chunk_size=300)
+        parts = src.generate_parts()
+        writer.write(np.arange(500))
+        part = next(parts)
+        np.testing.assert_array_equal(part, np.arange(300))
+        # Parts are views of the ring
+        assert not part.flags.owndata
+
+        writer.write(np.arange(500, 3000))
+        assert src.lag == 2700
+        part = next(parts)
+        # The yielded part was overwritten and further samples are skipped
+        assert src.overruns == 2
+        assert src.samples_lost == 300 + 1700
+        np.testing.assert_array_equal(part, np.arange(2000, 2300))
+        assert src.max_lag == 2700
+
+        strict = SharedRingSource(writer.name, from_start=True, raise_on_overrun=True)
+        strict_parts = strict.generate_parts()
+        next(strict_parts)
+        writer.write(np.zeros(2000))
+        with pytest.raises(BufferError):
+            next(strict_parts)
+        src.close()
+        strict.close()
+
+def test_harvester_rejects_conflicting_layout():
+    with SharedRingWriter(capacity=1000, sample_rate=8000) as writer:
+        cmd = [sys.executable, "-m", "tonedetect.bin.harvester", "shm", "--name", writer.name]
+        proc = subprocess.run(cmd + ["--sample-rate", "44100"], cwd=PROJ_PATH, capture_output=True, timeout=60)
+        assert proc.returncode == 1
+        assert b"--sample-rate 44100 conflicts" in proc.stderr
+        # Matching values are accepted
+        writer.close()
+        proc = subprocess.run(cmd + ["--sample-rate", "8000", "--channels", "1"], cwd=PROJ_PATH, capture_output=True, timeout=60)
+        assert proc.returncode == 0
+
+def test_captured_audio_is_not_overwritten_by_writer():
+    data = np.stack((np.arange(2000), np.arange(2000) + 40000)).astype(np.float_)
+    buf = AudioBuffer(1000, 5)
+    with SharedRingWriter(capacity=200, sample_rate=1000, channels=2) as writer:
+        src = SharedRingSource(writer.name, chunk_size=100)
+        parts = src.generate_parts()
+        for i in range(0, 2000, 100):
+            # Each write reuses the slot of the part buffered before the last one.
+            writer.write(data[:, i:i+100])
+            buf.add(next(parts))
+        assert src.overruns == 0
+        np.testing.assert_array_equal(buf.get(), data.T)
+        src.close()
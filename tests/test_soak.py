@@ -0,0 +1,9 @@
+import pytest
+from tonedetect.bin import soak
+
+def test_soak_memory_stays_flat():
+    samples = soak.soak(1800, report_interval=300)
+    assert samples[-1][0] >= 1800
+    assert samples[-1][2] > 0
+    # Compare against the first report after warm up
+    assert samples[-1][1] - samples[1][1] < 2 * 2**20
@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import shutil
+import functools
+import multiprocessing
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect import helpers
+from tonedetect.sources import WAVSource
+from tonedetect.spool import Spool, Worker
+from tonedetect.bin.worker import scan_file
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+def logged_scan(filename, log):
+    # Appends of a single short line are atomic, so concurrent workers can share the log.
+    with open(log, "a") as f:
+        f.write(filename + "\n")
+    return scan_file(filename, DTMF_TONES,
+                     {'min_tone_amp': 0.1, 'max_inter_tone_amp': 0.1, 'min_presence': 0.04, 'min_pause': 0.04},
+                     {'max_tone_interval': 1., 'min_sequence_length': 2})
+
+def run_worker(root, log):
+    Worker(Spool(root), functools.partial(logged_scan, log=log), poll_interval=0.01).run(exit_when_empty=True)
+
+def test_local_workers_process_every_file_once(tmp_path):
+    spool = Spool(str(tmp_path / "spool"))
+    files = []
+    for i in range(8):
+        f = str(tmp_path / "{}.wav".format(i))
+        shutil.copy(TEST_SAMPLE, f)
+        files.append(f)
+        assert spool.enqueue(f) is not None
+    # Known files are not enqueued twice
+    assert spool.enqueue(files[0]) is None
+
+    log = str(tmp_path / "log")
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=run_worker, args=(spool.root, log)) for i in range(3)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+
+    assert spool.counts() == {'queue': 0, 'running': 0, 'done': 8, 'failed': 0}
+    with open(log) as f:
+        assert sorted(f.read().split()) == files
+    for job_id in spool.jobs("done"):
+        with open(spool.path("done", job_id)) as f:
+            result = json.load(f)
+        assert result['attempts'] == 1
+        assert [r['sequence'] for r in result['result']] == ["0123456789#*ABCD"]
+
+def test_expired_leases_are_requeued(tmp_path):
+    spool = Spool(str(tmp_path), lease=0.1, max_attempts=2)
+    job_id = spool.enqueue(TEST_SAMPLE)
+
+    job = spool.claim("crashed")
+    assert job.id == job_id and job.attempts == 1
+    assert spool.claim("other") is None
+    assert spool.requeue_expired() == 0
+    time.sleep(0.2)
+    assert spool.requeue_expired() == 1
+    assert spool.jobs("queue") == [job_id]
+
+    again = spool.claim("other")
+    assert again.attempts == 2
+    # The stalled first worker neither renews nor completes the new claim
+    assert not spool.owns(job) and spool.owns(again)
+    assert not spool.renew(job)
+    assert not spool.complete(job, {'worker': 'crashed'})
+    spool.fail(job, "stalled")
+    assert spool.jobs("running") == [job_id]
+    assert spool.renew(again)
+
+    # Out of attempts after the second claim expires, and the job ends up in failed only
+    assert spool.requeue_expired(now=time.time() + 1) == 1
+    assert not spool.complete(again, {'worker': 'other'})
+    assert spool.counts() == {'queue': 0, 'running': 0, 'done': 0, 'failed': 1}
+
+def test_interrupted_commit_is_recovered(tmp_path):
+    spool = Spool(str(tmp_path), lease=0.1)
+    job_id = spool.enqueue(TEST_SAMPLE)
+    job = spool.claim("crashed")
+    # A worker dying while storing its result leaves the job behind as commit
+    os.rename(spool._claimed(job), spool._claimed(job, ".commit"))
+    assert spool.jobs("running") == [job_id]
+    assert spool.requeue_expired() == 0
+    assert spool.requeue_expired(now=time.time() + 1) == 1
+    assert spool.claim("other").attempts == 2
+
+def test_failing_jobs(tmp_path):
+    spool = Spool(str(tmp_path), max_attempts=2)
+    spool.enqueue(str(tmp_path / "missing.wav"))
+    worker = Worker(spool, lambda f: scan_file(f, DTMF_TONES, {}, {}), poll_interval=0.01)
+    worker.run(exit_when_empty=True)
+    assert worker.nfailed == 2
+    assert spool.counts() == {'queue': 0, 'running': 0, 'done': 0, 'failed': 1}
+    with open(spool.path("failed", spool.jobs("failed")[0])) as f:
+        desc = json.load(f)
+    assert desc['attempts'] == 2 and "missing.wav" in desc['error']
+
+def test_wav_source_matches_read_audio():
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    src = WAVSource(TEST_SAMPLE, chunk_size=1000)
+    assert src.sample_rate == sr
+    np.testing.assert_allclose(np.concatenate(list(src.generate_parts())), data)
+    src.start_sample = 5000
+    np.testing.assert_allclose(np.concatenate(list(src.generate_parts())), data[5000:])
+
+def test_batch_scan_matches_window_pipeline():
+    args = ({'min_tone_amp': 0.1, 'max_inter_tone_amp': 0.1, 'min_presence': 0.04, 'min_pause': 0.04},
+            {'max_tone_interval': 1., 'min_sequence_length': 2})
+    expected = scan_file(TEST_SAMPLE, DTMF_TONES, *args)
+    assert [d['sequence'] for d in expected] == ["0123456789#*ABCD"]
+    assert scan_file(TEST_SAMPLE, DTMF_TONES, *args, batch=True) == expected
@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import signal
+import sqlite3
+import subprocess
+import pytest
+import numpy as np
+from tonedetect import helpers
+from tonedetect.timespan import Timespan
+from tonedetect.store import DetectionStore, query, connect
+from tonedetect.bin.query import parse_time
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav")
+
+def test_store_and_query(tmp_path):
+    db = str(tmp_path / "detections.db")
+    now = time.time()
+    with DetectionStore(db, batch_size=100, flush_interval=0.01) as store:
+        for i in range(1000):
+            store.add_sequence([str(i % 10), '#'], Timespan(i, i + 0.5), stream="s{}".format(i % 2), detected=now - i)
+        store.add_tones(['1', 'A'], [1.5, 1.7], [0.3, 0.4], channel=1, file="f.wav", detected=now)
+        store.add_tones([], [], [])
+
+    assert (store.nsequences, store.ntones) == (1000, 2)
+    rows = query(db, match="3#", since=now - 100)
+    assert [r['start'] for r in rows] == [3, 13, 23, 33, 43, 53, 63, 73, 83, 93]
+    assert rows[0]['end'] == 3.5 and rows[0]['stream'] == "s1"
+    assert len(query(db, contains="#", stream="s0", limit=5)) == 5
+    assert len(query(db, until=now - 990)) == 10
+
+    tones = query(db, table="tones", match="A")
+    assert len(tones) == 1
+    assert tones[0]['channel'] == 1 and tones[0]['file'] == "f.wav" and tones[0]['amplitude'] == 0.4
+
+    # Lookups by sequence and detection time are indexed
+    plan = " ".join(str(r) for r in connect(db).execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM sequences WHERE sequence = ? AND detected >= ?", ("3#", now)))
+    assert "USING INDEX sequences_sequence" in plan
+    assert connect(db).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_store_reports_write_errors(tmp_path):
+    db = str(tmp_path / "detections.db")
+    store = DetectionStore(db, flush_interval=0.01)
+    # Break the schema behind the writer's back
+    con = sqlite3.connect(db)
+    con.execute("DROP TABLE sequences")
+    con.commit()
+    con.close()
+    store.add_sequence(['1'], Timespan(0, 1))
+    with pytest.raises(sqlite3.Error):
+        store.close()
+
+def test_parse_time():
+    assert parse_time("7d", now=1e6) == 1e6 - 7 * 86400
+    assert parse_time("1.5h", now=1e6) == 1e6 - 5400
+    assert parse_time("2020-01-02T03:04:05") == time.mktime((2020, 1, 2, 3, 4, 5, 0, 0, -1))
+
+def test_query_does_not_create_databases(tmp_path):
+    db = str(tmp_path / "typo.db")
+    with pytest.raises(FileNotFoundError):
+        query(db)
+    assert not os.path.exists(db)
+
+def test_harvester_stores_pending_rows_on_sigterm(tmp_path):
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    db = str(tmp_path / "detections.db")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "tonedetect.bin.harvester", "stdin", "--sample-rate", str(sr), "--store", db],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE, cwd=PROJ_PATH)
+    # Keep the input open like a live stream, with enough silence to complete the sequence.
+    proc.stdin.write((np.concatenate((data, np.zeros(2 * sr))) * 32767).astype("<i2").tobytes())
+    proc.stdin.flush()
+    for line in proc.stderr:
+        if b">>>" in line:
+            break
+    proc.send_signal(signal.SIGTERM)
+    proc.wait(timeout=30)
+    proc.stdin.close()
+    proc.stderr.close()
+    assert [r['sequence'] for r in query(db)] == ["0123456789#*ABCD"]
+    assert len(query(db, table="tones")) == 16
+
+def test_harvester_keeps_exit_status_when_store_fails(tmp_path):
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    db = str(tmp_path / "detections.db")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "tonedetect.bin.harvester", "stdin", "--sample-rate", str(sr), "--store", db],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE, cwd=PROJ_PATH)
+    # Break the schema once the harvester created it, so that storing the detection fails.
+    deadline = time.monotonic() + 30
+    while True:
+        assert time.monotonic() < deadline
+        if os.path.exists(db):
+            con = sqlite3.connect(db)
+            if con.execute("SELECT name FROM sqlite_master WHERE name = 'sequences'").fetchone():
+                break
+            con.close()
+        time.sleep(0.05)
+    con.execute("DROP TABLE sequences")
+    con.commit()
+    con.close()
+
+    proc.stdin.write((np.concatenate((data, np.zeros(2 * sr))) * 32767).astype("<i2").tobytes())
+    proc.stdin.flush()
+    for line in proc.stderr:
+        if b">>>" in line:
+            break
+    proc.send_signal(signal.SIGTERM)
+    stderr = proc.stderr.read()
+    proc.wait(timeout=30)
+    proc.stdin.close()
+    proc.stderr.close()
+    assert proc.returncode == 128 + signal.SIGTERM
+    assert b"Failed to close detection store" in stderr
@@ -0,0 +1,111 @@
+import os
+import sys
+import stat
+import itertools
+import pytest
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect import helpers
+from tonedetect import sources
+from tonedetect import detectors
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+# Stands in for FFMPEG: writes at most CHUNK samples of the raw input, starting at -ss or, when
+# the input is not seeked, where the previous run stopped. Fails unless the input is exhausted.
+STUB = """#!{python}
+import sys, os
+args = sys.argv[1:]
+src = args[args.index("-i") + 1]
+rate = int(args[args.index("-ar") + 1])
+data = open(src, "rb").read()
+runs = src + ".runs"
+run = int(open(runs).read()) if os.path.exists(runs) else 0
+open(runs, "w").write(str(run + 1))
+if "-ss" in args:
+    start = 2 * int(round(float(args[args.index("-ss") + 1]) * rate))
+else:
+    start = 2 * {chunk} * run
+end = min(start + 2 * {chunk}, len(data))
+sys.stdout.buffer.write(data[start:end])
+if end < len(data):
+    sys.stderr.write("connection reset at byte {{}}\\n".format(end))
+    sys.exit(1)
+"""
+
+def make_stub(tmp_path, chunk):
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    raw = tmp_path / "input.raw"
+    raw.write_bytes((data * 32767).astype("<i2").tobytes())
+    stub = tmp_path / "ffmpeg"
+    stub.write_text(STUB.format(python=sys.executable, chunk=chunk))
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    return str(stub), str(raw), sr, np.frombuffer(raw.read_bytes(), dtype="<i2") / 32768.
+
+def detect(sr, parts):
+    freqs = DTMF_TONES.all_tone_frequencies()
+    wnd = Window.tuned(sr, freqs, power_of_2=True, wndtype=Window.Type.hanning)
+    d_f = detectors.FrequencyDetector(freqs)
+    d_t = detectors.ToneDetector(DTMF_TONES, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04)
+    d_s = detectors.ToneSequenceDetector(max_tone_interval=0.5, min_sequence_length=1)
+    results = []
+    for w in wnd.update(itertools.chain(parts, sources.SilenceSource(1, sr).generate_parts())):
+        seq, tspan = d_s.update(w, d_t.update(w, d_f.update(w)))
+        if seq:
+            results.append(("".join(str(e) for e in seq), tspan.start, tspan.end))
+    return results
+
+def test_file_restarts_continue_seamlessly(tmp_path):
+    stub, raw, sr, data = make_stub(tmp_path, chunk=3000)
+    src = sources.SupervisedFFMPEGSource(raw, ffmpeg_binary=stub, sample_rate=sr, backoff=0.001, reset_after=0., max_restarts=1)
+    assert src.seekable and src.gap == 'continuous'
+    results = detect(sr, src.generate_parts())
+
+    # Window and detector state carry over restarts, so detections match uninterrupted input.
+    assert results == detect(sr, sources.InMemorySource(data, sr, chunk_size=1024).generate_parts())
+    assert results[0][0] == "0123456789#*ABCD"
+    assert src.restarts == len(data) // 3000
+    assert src.samples_processed == len(data)
+    assert src.gap_samples == 0
+    assert src.stderr[-1].startswith("connection reset")
+
+@pytest.mark.parametrize("gap", ['silence', 'downtime'])
+def test_stream_restarts_insert_gaps(tmp_path, gap):
+    stub, raw, sr, data = make_stub(tmp_path, chunk=2000)
+    src = sources.SupervisedFFMPEGSource(raw, ffmpeg_binary=stub, sample_rate=sr, seekable=False, gap=gap, gap_duration=0.25,
+                                         backoff=0.01, max_backoff=0.02, reset_after=0., max_restarts=2)
+    parts = list(src.generate_parts())
+    nruns = -(-len(data) // 2000)
+
+    # Streams ending are failures as well. Runs without samples count as consecutive failures.
+    assert src.restarts == nruns + 1
+    assert sum(len(p) for p in parts) == len(data) + src.gap_samples
+    np.testing.assert_allclose(np.concatenate(parts)[:2000], data[:2000])
+    if gap == 'silence':
+        assert src.gap_samples == src.restarts * int(0.25 * sr)
+    else:
+        # Silence for all but the final downtime, which is not followed by samples.
+        assert src.gap_samples >= (nruns - 1) * int(0.01 * sr)
+        assert src.downtime >= src.gap_samples / sr
+    assert "restarts {}".format(src.restarts) in src.metrics()
+
+def test_backoff_reset_counts_from_first_sample(tmp_path):
+    # Hangs before delivering a single chunk, which must not count as a healthy run.
+    stub = tmp_path / "ffmpeg"
+    stub.write_text("#!/bin/sh\nsleep 0.3\nhead -c 2000 /dev/zero\nexit 1\n")
+    stub.chmod(stub.stat().st_mode | stat.S_IEXEC)
+    src = sources.SupervisedFFMPEGSource("http://localhost/stream", ffmpeg_binary=str(stub), sample_rate=8000, gap='continuous',
+                                         backoff=0.01, reset_after=0.2, max_restarts=1)
+    parts = list(src.generate_parts())
+    assert src.restarts == 1
+    assert sum(len(p) for p in parts) == 2000
+
+def test_long_gaps_are_generated_in_parts(tmp_path):
+    stub, raw, sr, data = make_stub(tmp_path, chunk=2000)
+    src = sources.SupervisedFFMPEGSource(raw, ffmpeg_binary=stub, sample_rate=sr, channels=2)
+    parts = list(src._silence(3.5))
+    assert [p.shape for p in parts] == [(2, sr)] * 3 + [(2, sr // 2)]
+    assert src.gap_samples == int(3.5 * sr)
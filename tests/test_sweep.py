@@ -0,0 +1,86 @@
+import os
+import itertools
+import numpy as np
+from tonedetect.tones import Tones
+from tonedetect.window import Window
+from tonedetect import helpers
+from tonedetect import sources
+from tonedetect import detectors
+from tonedetect import sweep
+from tonedetect.timespan import Timespan
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav")
+DTMF_TONES = Tones.from_json_file(os.path.join(PROJ_PATH, "tonedetect", "bin", "dtmf.json"))
+
+def test_expected_from_filename():
+    assert sweep.expected_from_filename("a/0123456789PpsPABCD.wav") == "0123456789#*ABCD"
+    assert sweep.expected_from_filename("0123psABCD--min7db.wav") == "0123#*ABCD"
+    assert sweep.expected_from_filename("noise.wav") is None
+
+def test_sweep_matches_tone_detector():
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    freqs = DTMF_TONES.all_tone_frequencies()
+    wnd = Window.tuned(sr, freqs, power_of_2=True, wndtype=Window.Type.hanning)
+    parts = itertools.chain(sources.InMemorySource(data, sr).generate_parts(), sources.SilenceSource(1, sr).generate_parts())
+    amps, starts, ends = sweep.compute_amplitudes(wnd, detectors.FrequencyDetector(freqs), parts)
+
+    params = sweep.grid(min_tone_amp=[0.02, 0.1, 0.3], max_inter_tone_amp=[0.05, 0.2], min_presence=[0.02, 0.04], min_pause=[0.02, 0.08])
+    results = sweep.sweep(DTMF_TONES, amps, starts, ends, params, expected="0123456789#*ABCD")
+    assert len(results) == 24
+
+    class Frame:
+        pass
+
+    for r in results:
+        d_t = detectors.ToneDetector(DTMF_TONES, **{n: r[n] for n in sweep.TONE_PARAMETERS})
+        detected = []
+        frame = Frame()
+        for a, s, e in zip(amps, starts, ends):
+            frame.timespan = Timespan(s, e)
+            detected.extend(d_t.update(frame, a))
+        assert r['detected'] == "".join(str(e) for e in detected)
+        assert r['matches'] + r['misses'] == 16
+        assert r['matches'] + r['false_positives'] == len("".join(r['sequences']))
+
+    best = [r for r in results if r['min_tone_amp'] == 0.1 and r['max_inter_tone_amp'] == 0.2 and r['min_presence'] == 0.04]
+    assert all(r['accuracy'] == 1. and r['false_positives'] == 0 for r in best)
+    assert all(r['delay'] >= 0.04 for r in best)
+
+def test_sweep_matches_sequence_detector():
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    freqs = DTMF_TONES.all_tone_frequencies()
+    wnd = Window.tuned(sr, freqs, power_of_2=True, wndtype=Window.Type.hanning)
+    # Pauses between some tones split the sample into several sequences depending on the interval.
+    data = np.concatenate([np.concatenate((part, np.zeros(sr // 3 * i))) for i, part in enumerate(np.array_split(data, 4))])
+    parts = itertools.chain(sources.InMemorySource(data, sr).generate_parts(), sources.SilenceSource(2, sr).generate_parts())
+    amps, starts, ends = sweep.compute_amplitudes(wnd, detectors.FrequencyDetector(freqs), parts)
+
+    params = sweep.grid(min_tone_amp=[0.1, 0.3], min_presence=0.04, min_pause=0.04,
+                        max_tone_interval=[0.2, 0.5, 1.], min_sequence_length=[1, 5], max_sequence_length=[None, 3, 8])
+    results = sweep.sweep(DTMF_TONES, amps, starts, ends, params, expected="0123456789#*ABCD")
+    # Maximum sequence lengths below the minimum are left out
+    assert len(results) == 30
+    assert len(set(len(r['sequences']) for r in results)) > 3
+
+    class Frame:
+        pass
+
+    for r in results:
+        d_t = detectors.ToneDetector(DTMF_TONES, **{n: r[n] for n in sweep.TONE_PARAMETERS})
+        d_s = detectors.ToneSequenceDetector(**{n: r[n] for n in sweep.SEQUENCE_PARAMETERS})
+        sequences = []
+        frame = Frame()
+        for a, s, e in zip(amps, starts, ends):
+            frame.timespan = Timespan(s, e)
+            seq, tspan = d_s.update(frame, d_t.update(frame, a))
+            if seq:
+                sequences.append("".join(str(e) for e in seq))
+        assert r['sequences'] == sequences
+
+def test_sweep_defaults_match_detectors():
+    defaults = sweep.defaults()
+    assert defaults['min_presence'] == detectors.ToneDetector(DTMF_TONES).min_presence
+    assert defaults['max_sequence_length'] == detectors.ToneSequenceDetector().max_sequence_length
+    results = sweep.sweep(DTMF_TONES, np.zeros((1, 8)), np.zeros(1), np.ones(1), {})
+    assert {n: results[0][n] for n in sweep.PARAMETERS} == defaults
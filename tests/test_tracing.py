@@ -0,0 +1,62 @@
+import os
+import re
+import sys
+import time
+import subprocess
+import numpy as np
+from tonedetect import helpers
+from tonedetect.tracing import LatencyTracer
+
+PROJ_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+TEST_SAMPLE = os.path.join(PROJ_PATH, "etc", "samples", "dtmf_test", "50by50at8000HzRadioOverlay", "0123456789psABCD--0db.wav")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+def test_latency_from_onset_chunk():
+    clock = FakeClock()
+    t = LatencyTracer(100, clock=clock)
+
+    for i in range(10):
+        clock.now = i * 0.1
+        t.ingress(10)
+
+    clock.now = 1.25
+    # Onset at 0.35s arrived with the fourth chunk at 0.3s
+    assert abs(t.egress(0.35) - 0.95) < 1e-9
+    assert abs(t.egress(0.05, kind="tone") - 1.25) < 1e-9
+    assert t.percentiles("sequence") is not None
+    assert t.percentiles("other") is None
+    assert "tone latency over 1 detections" in t.summary()
+
+def test_latency_beyond_horizon():
+    clock = FakeClock()
+    t = LatencyTracer(100, horizon=1., clock=clock)
+    for i in range(100):
+        t.ingress(10)
+    assert len(t._ends) < 50
+    assert t.egress(0.5) is None
+    assert t.egress(9.5) is not None
+
+def test_harvester_measures_sequences_from_last_tone():
+    sr, data = helpers.read_audio(TEST_SAMPLE)
+    pcm = (np.concatenate((data, np.zeros(int(1.5 * sr)))) * 32767).astype("<i2")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "tonedetect.bin.harvester", "stdin", "--sample-rate", str(sr), "--trace-latency"],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE, cwd=PROJ_PATH)
+    # Paced like a live stream, so that latencies reflect stream time.
+    chunk = sr // 10
+    for i in range(0, len(pcm), chunk):
+        proc.stdin.write(pcm[i:i+chunk].tobytes())
+        proc.stdin.flush()
+        time.sleep(0.1)
+    _, err = proc.communicate(timeout=30)
+    summary = err.decode()
+    p50 = {k: float(v) for k, v in re.findall(r"(sequence|sequence span) latency over 1 detections p50 ([0-9.]+)s", summary)}
+    # The last tone 'D' starts at 1.4s, the sequence at 0.04s. Both wait for max_tone_interval.
+    assert 0.9 < p50['sequence'] < 1.7
+    assert 1. < p50['sequence span'] - p50['sequence'] < 1.7
@@ -71,3 +71,45 @@ def test_window_tunes_correctly():
     assert w.frequency_resolution == 10 # Only considering data samples
     assert w.fft_resolution == 1000 / 128
     assert w.temporal_resolution == 0.1
+
+def test_window_shifts_by_hop():
+    data = np.arange(0, 10, 1)
+    w = window.Window(4, 10, nhop=1)
+    assert w.latency == 0.5
+
+    gen = w.update(data)
+    np.testing.assert_allclose(next(gen).values, [0,1,2,3])
+    np.testing.assert_allclose(next(gen).values, [1,2,3,4])
+    tspan = next(gen).timespan
+    np.testing.assert_allclose((0.2, 0.6), (tspan.start, tspan.end))
+
+def test_window_tunes_for_latency():
+    # Default 50 percent overlap already meets the budget
+    w = window.Window.tuned(1000, [10, 20], max_latency=1)
+    assert w.nsamples == 200
+    assert w.nhop == 100
+
+    # Hop is reduced to meet the budget
+    w = window.Window.tuned(1000, [10, 20], max_latency=0.25)
+    assert w.nsamples == 200
+    assert w.nhop == 50
+    assert w.latency <= 0.25
+
+    # Data samples beyond the budget are replaced by padding
+    w = window.Window.tuned(1000, [10, 20], power_of_2=True, use_padding=False, max_latency=0.25)
+    assert w.nsamples == 200
+    assert w.ntotal == 256
+    assert w.latency <= 0.25
+
+    with pytest.raises(ValueError) as e:
+        window.Window.tuned(1000, [10, 20, 100], max_latency=0.1)
+    assert "10/20Hz" in str(e.value)
+    assert "20/100Hz" not in str(e.value)
+
+def test_window_timespan_stays_exact():
+    w = window.Window(200, 8000, nhop=110)
+    # About four months of 8kHz audio
+    w.set_state({'values': np.zeros(0), 'idx': 0, 'shifts': 10**9})
+    tspan = w.timespan
+    assert tspan.start == 110 * 10**9 / 8000
+    assert tspan.end - tspan.start == pytest.approx(0.025, abs=1e-8)
@@ -1,10 +1,66 @@
-__all__ = ['detectors', 'generators', 'helpers', 'sources', 'timespan', 'tones', 'window', 'version']
+__all__ = ['detectors', 'generators', 'helpers', 'sources', 'timespan', 'tones', 'window', 'checkpoint', 'kernels', 'batch', 'tracing', 'cache', 'sweep', 'aio', 'cascade', 'server', 'shm', 'pipeline', 'spool', 'store', 'version']
 
+import importlib
 
-from tonedetect import helpers
-from tonedetect.tones import Tones
-from tonedetect.sources import FFMPEGSource, STDINSource, SilenceSource, InMemorySource
-from tonedetect.window import Window
-from tonedetect.detectors import FrequencyDetector, ToneDetector, ToneSequenceDetector
+from tonedetect.version import __version__
 
-from tonedetect.version import __version__
\ No newline at end of file
+# Public names are imported lazily on first access, so that short-lived processes only pay
+# for the modules they actually use.
+_exports = {
+    'detectors': 'tonedetect.detectors',
+    'generators': 'tonedetect.generators',
+    'helpers': 'tonedetect.helpers',
+    'sources': 'tonedetect.sources',
+    'timespan': 'tonedetect.timespan',
+    'tones': 'tonedetect.tones',
+    'window': 'tonedetect.window',
+    'checkpoint': 'tonedetect.checkpoint',
+    'kernels': 'tonedetect.kernels',
+    'batch': 'tonedetect.batch',
+    'tracing': 'tonedetect.tracing',
+    'cache': 'tonedetect.cache',
+    'sweep': 'tonedetect.sweep',
+    'aio': 'tonedetect.aio',
+    'cascade': 'tonedetect.cascade',
+    'server': 'tonedetect.server',
+    'shm': 'tonedetect.shm',
+    'pipeline': 'tonedetect.pipeline',
+    'spool': 'tonedetect.spool',
+    'store': 'tonedetect.store',
+    'version': 'tonedetect.version',
+    'Tones': 'tonedetect.tones',
+    'FFMPEGSource': 'tonedetect.sources',
+    'SupervisedFFMPEGSource': 'tonedetect.sources',
+    'STDINSource': 'tonedetect.sources',
+    'SilenceSource': 'tonedetect.sources',
+    'InMemorySource': 'tonedetect.sources',
+    'PrefetchSource': 'tonedetect.sources',
+    'WAVSource': 'tonedetect.sources',
+    'Window': 'tonedetect.window',
+    'Frame': 'tonedetect.window',
+    'FrequencyDetector': 'tonedetect.detectors',
+    'ToneDetector': 'tonedetect.detectors',
+    'ToneSequenceDetector': 'tonedetect.detectors',
+    'Checkpoint': 'tonedetect.checkpoint',
+    'BatchScanner': 'tonedetect.batch',
+    'LatencyTracer': 'tonedetect.tracing',
+    'AmplitudeCache': 'tonedetect.cache',
+    'CascadeScanner': 'tonedetect.cascade',
+    'DetectionServer': 'tonedetect.server',
+    'SharedRingWriter': 'tonedetect.shm',
+    'SharedRingSource': 'tonedetect.shm',
+    'Spool': 'tonedetect.spool',
+    'DetectionStore': 'tonedetect.store',
+}
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError("module 'tonedetect' has no attribute '{}'".format(name))
+    module = importlib.import_module(module)
+    value = module if module.__name__ == 'tonedetect.' + name else getattr(module, name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_exports))
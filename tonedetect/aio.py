@@ -0,0 +1,127 @@
+import sys
+import asyncio
+import logging
+import numpy as np
+
+from tonedetect.sources import BaseSource, FFMPEGSource
+from tonedetect.pipeline import process_chunk, flush_samples
+
+logger = logging.getLogger(__name__)
+
+class AsyncStreamSource(BaseSource):
+    """Provides samples read from an asyncio.StreamReader, e.g. a socket or pipe.
+
+    Args:
+        reader (asyncio.StreamReader): Stream of raw interleaved samples
+
+    Kwargs:
+        sample_rate (float): Sample rate in Hz
+        chunk_size (int): Maximum number of bytes read at once
+        source_type (str): How binary data is interpreted
+        channels (int): Number of interleaved channels
+    """
+
+    def __init__(self, reader, sample_rate=44100, chunk_size=1024, source_type="int16", channels=1):
+        super().__init__(sample_rate, channels=channels)
+        self.reader = reader
+        self.chunk_size = chunk_size
+        self.source_type = source_type
+
+    @staticmethod
+    async def from_stdin(**kwargs):
+        """Returns a source reading standard input without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+        return AsyncStreamSource(reader, **kwargs)
+
+    async def generate_parts(self):
+        # Streams cannot be seeked, so samples before start_sample are read and dropped.
+        skip = self.start_sample * np.dtype(self.source_type).itemsize * self.channels
+        while skip > 0:
+            data = await self.reader.read(min(skip, self.chunk_size))
+            if not data:
+                return
+            skip -= len(data)
+
+        while True:
+            data = await self.reader.read(self.chunk_size)
+            if not data:
+                break
+            self.bytes_processed += len(data)
+            yield self.decode(data, self.source_type)
+
+class AsyncFFMPEGSource(FFMPEGSource):
+    """Decodes audio by FFMPEG running as asyncio subprocess. Accepts the same arguments as FFMPEGSource."""
+
+    async def generate_parts(self):
+        proc = await asyncio.create_subprocess_exec(*self.seek_command(), stdout=asyncio.subprocess.PIPE)
+        try:
+            while True:
+                data = await proc.stdout.read(self.chunk_size)
+                if not data:
+                    break
+                self.bytes_processed += len(data)
+                yield self.decode(data, "int16")
+            await proc.wait()
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+async def _aiter(parts):
+    if hasattr(parts, "__aiter__"):
+        async for part in parts:
+            yield part
+    else:
+        for part in parts:
+            yield part
+
+async def detect(parts, wnd, d_f, d_t, d_s, executor=None, flush=None):
+    """Run the detection pipeline on a stream of sample chunks and yield detected sequences.
+
+    Usage:
+        async for channel, seq, tspan in detect(source.generate_parts(), wnd, d_f, d_t, d_s):
+            ...
+
+    Windowing and detection of a chunk run without interruption. They run on the event loop
+    unless an executor is given, in which case every chunk is processed by the executor and
+    the loop stays responsive while it does. Chunks of one stream are processed in order, so
+    the window and detectors need not be thread-safe but must not be shared between streams.
+
+    Args:
+        parts: Async or regular iterable of sample chunks, e.g. generate_parts of a source
+        wnd (Window): Window to update
+        d_f (FrequencyDetector): Frequency detection
+        d_t (ToneDetector): Tone detection
+        d_s (ToneSequenceDetector): Sequence detection
+
+    Kwargs:
+        executor (concurrent.futures.Executor): When given, chunks are processed by this executor.
+                                                Use None to process chunks on the event loop.
+        flush (float): Duration in seconds of silence processed after parts end, which flushes
+                       pending sequences. Defaults to twice the maximum tone interval.
+
+    Yields:
+        (int, list, Timespan): Channel, detected sequence and its timespan.
+    """
+    loop = asyncio.get_running_loop()
+
+    def process(chunk):
+        return process_chunk(chunk, wnd, d_f, d_t, d_s)
+
+    async def run(chunk):
+        if executor is None:
+            events = process(chunk)
+            # Give other tasks the chance to run between chunks.
+            await asyncio.sleep(0)
+            return events
+        return await loop.run_in_executor(executor, process, chunk)
+
+    async for chunk in _aiter(parts):
+        for event in await run(chunk):
+            yield event
+
+    if flush is None or flush > 0:
+        for event in await run(flush_samples(wnd, d_s, flush)):
+            yield event
@@ -0,0 +1,109 @@
+import logging
+import numpy as np
+from tonedetect import kernels
+from tonedetect.timespan import Timespan
+
+logger = logging.getLogger(__name__)
+
+class BatchScanner:
+    """Offline scanning of sample arrays in batches of frames.
+
+    The scanner operates on the state of the given window and detectors, so that batch
+    scans and regular per-window updates can be mixed freely and produce the same results.
+    When Numba is available, frequency evaluation (Goertzel at the target bins) and the
+    tone/sequence state machines run as one compiled loop over all frames of a batch.
+    Otherwise the scanner falls back to the regular NumPy pipeline. Compiled scans support
+    single channel pipelines only. The worker scans files with this scanner when started
+    with --batch.
+
+    Args:
+        wnd (Window): Window to take frame layout and buffered samples from
+        d_f (FrequencyDetector): Frequency detection
+        d_t (ToneDetector): Tone detection
+        d_s (ToneSequenceDetector): Sequence detection
+
+    Kwargs:
+        batch_size (int): Maximum number of frames per compiled kernel invocation
+        use_kernels (bool): Whether or not to use compiled kernels. Defaults to kernels.HAS_NUMBA
+    """
+
+    def __init__(self, wnd, d_f, d_t, d_s, batch_size=4096, use_kernels=None):
+        self.wnd = wnd
+        self.d_f = d_f
+        self.d_t = d_t
+        self.d_s = d_s
+        self.batch_size = batch_size
+        self.use_kernels = (kernels.HAS_NUMBA if use_kernels is None else use_kernels) and wnd.nchannels == 1
+
+    def scan(self, samples):
+        """Process samples and return detected sequences.
+
+        Returns:
+            list: (sequence, Timespan) tuples for single channel pipelines, (channel, sequence, Timespan)
+                  tuples for multichannel pipelines. See scan_channels for a result independent of the
+                  number of channels.
+        """
+        results = self.scan_channels(samples)
+        return [(seq, tspan) for c, seq, tspan in results] if self.wnd.nchannels == 1 else results
+
+    def scan_channels(self, samples):
+        """Process samples and return (channel, sequence, Timespan) tuples of detected sequences."""
+        if not self.use_kernels:
+            return self._scan_windows(samples)
+        return [(0, seq, tspan) for seq, tspan in self._scan_kernels(np.asarray(samples, dtype=np.float_))]
+
+    def _scan_windows(self, samples):
+        results = []
+        for w in self.wnd.update(samples):
+            results.extend(self.d_s.update_channels(w, self.d_t.update_channels(w, self.d_f.update(w))))
+        return results
+
+    def _scan_kernels(self, samples):
+        wnd, d_t, d_s = self.wnd, self.d_t, self.d_s
+
+        state = wnd.get_state()
+        buf = np.concatenate((state['values'], samples))
+        nhop = wnd.nhop
+        nframes = 0 if len(buf) < wnd.nsamples else (len(buf) - wnd.nsamples) // nhop + 1
+
+        f, wndnorm = wnd.window_function
+        wndfnc = np.ascontiguousarray(f[:wnd.nsamples], dtype=np.float_)
+        norm = (2 / wnd.ntotal) * wndnorm
+        bins = self.d_f.bins(wnd.fft_resolution)
+
+        ntones = len(d_t.syms)
+        sym_ids = {s: i for i, s in enumerate(d_t.syms)}
+        pending = [sym_ids[s] for s in d_s.sequence]
+        acc = np.array([d_s.acc.start, d_s.acc.end])
+
+        results = []
+        shift = state['shifts']
+        for first in range(0, nframes, self.batch_size):
+            n = min(self.batch_size, nframes - first)
+            # At most every tone gets reported once per frame.
+            capacity = len(pending) + n * ntones
+            seq = np.zeros(capacity, dtype=np.intp)
+            seq[:len(pending)] = pending
+            out_ids = np.zeros(capacity, dtype=np.intp)
+            out_offsets = np.zeros(2 * n + 1, dtype=np.intp)
+            out_spans = np.zeros((2 * n, 2))
+
+            nout, seq_len = kernels.scan_frames(
+                buf[first * nhop:], n, wnd.nsamples, nhop, shift + first, wnd.sample_rate, wndfnc, norm, bins, wnd.ntotal,
+                d_t.ids, d_t.min_tone_amp, d_t.max_inter_tone_amp, d_t.min_presence, d_t.min_pause,
+                d_t.on_start[0], d_t.on_end[0], d_t.off_start[0], d_t.off_end[0], d_t.reported[0],
+                d_s.max_tone_interval, d_s.min_sequence_length, d_s.max_sequence_length or 0, seq, len(pending), acc,
+                out_ids, out_offsets, out_spans)
+
+            for i in range(nout):
+                seq_syms = [d_t.syms[j] for j in out_ids[out_offsets[i]:out_offsets[i + 1]]]
+                results.append((seq_syms, Timespan(out_spans[i, 0], out_spans[i, 1])))
+            pending = seq[:seq_len].tolist()
+
+        d_s.sequence = [d_t.syms[i] for i in pending]
+        d_s.acc = Timespan(acc[0], acc[1])
+
+        # Leave the window in the same state a per-window update would have.
+        rest = buf[nframes * nhop:]
+        wnd.set_state({'values': rest, 'idx': len(rest), 'shifts': shift + nframes})
+        return results
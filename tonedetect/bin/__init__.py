@@ -1 +1 @@
-__all__ = ['buffer', 'status', 'pretty', 'tonedetect_harvest']
\ No newline at end of file
+__all__ = ['buffer', 'status', 'pretty', 'sweep', 'soak', 'serve', 'decode', 'worker', 'query', 'tonedetect_harvest']
\ No newline at end of file
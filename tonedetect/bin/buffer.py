@@ -20,7 +20,13 @@ class AudioBuffer(RingBuffer):
         self.sample_rate = sample_rate    
         len = int(sample_rate * duration)
         super().__init__(len)
-    
+
+    def add(self, data):
+        # Multichannel chunks are buffered as frames of all channels. Frames are copied, since
+        # pooled and shared memory sources reuse the memory of the parts they yield.
+        data = np.asarray(data)
+        super().add(np.array(data.T) if data.ndim > 1 else data)
+
     def write_audio(self, directory, prefix):
         fp = path.join(directory, str(prefix) + ".wav")
         helpers.write_audio(fp, self.sample_rate, self.get())
@@ -0,0 +1,30 @@
+import time
+import logging
+
+import tonedetect as td
+from tonedetect.shm import SharedRingWriter
+
+LOGGER = logging.getLogger(__name__)
+
+def main(args):
+    """Decode a source once into a shared memory ring read by 'harvester shm' processes."""
+    if args.source == "-":
+        source = td.STDINSource(sample_rate=args.sample_rate, source_type=args.source_type, channels=args.channels)
+    else:
+        source = td.FFMPEGSource(args.source, ffmpeg_binary=args.ffmpeg, sample_rate=args.sample_rate, channels=args.channels)
+
+    writer = SharedRingWriter(name=args.name, capacity=int(args.capacity * args.sample_rate), sample_rate=args.sample_rate, channels=args.channels)
+    # Readers attach by name, so print it for scripts to pick up.
+    print(writer.name, flush=True)
+    LOGGER.info("Decoding into shared memory ring '{}' holding {:.1f}s".format(writer.name, args.capacity))
+    try:
+        if args.wait > 0:
+            # Give readers the chance to attach before samples are written.
+            time.sleep(args.wait)
+        writer.feed(source)
+        LOGGER.info("Decoded {} samples".format(writer.samples_written))
+        if args.linger > 0:
+            time.sleep(args.linger)
+    finally:
+        writer.close()
+        writer.unlink()
@@ -3,30 +3,72 @@
 import argparse
 import logging
 import sys
+import signal
 import itertools
 from os import path
 
+# Heavy modules are imported lazily through tonedetect or after parsing arguments, keeping startup fast.
 import tonedetect as td
 from tonedetect.bin.status import StatusPrinter, Status
-from tonedetect.bin.buffer import AudioBuffer, NoopAudioBuffer
 
 SCRIPT_DIR = path.dirname(path.realpath(__file__))
 LOGGER = logging.getLogger(__name__)
 
+def tone_detector_args(args):
+    """Returns ToneDetector keyword arguments of parsed detector options."""
+    return {
+        'min_tone_amp': args.min_tone_level,
+        'max_inter_tone_amp': args.max_tone_range,
+        'min_presence': args.min_tone_on,
+        'min_pause': args.min_tone_off
+    }
+
+def sequence_detector_args(args):
+    """Returns ToneSequenceDetector keyword arguments of parsed detector options."""
+    return {
+        'max_tone_interval': args.max_tone_interval,
+        'min_sequence_length': args.min_seq_length,
+        'max_sequence_length': args.max_seq_length
+    }
+
 def parse_args():
 
-    def add_common_args(parser):
+    def add_detector_args(parser, sweep=False):
+        # Sweeps take any number of values per option, defaulting to the single value used for detection.
+        def add(name, default, **kwargs):
+            if sweep:
+                kwargs['help'] += ". Takes several values to evaluate"
+                parser.add_argument(name, nargs="+", default=[default], **kwargs)
+            else:
+                parser.add_argument(name, default=default, **kwargs)
+
         parser.add_argument("--tones", help="Json file containing the tone description.", default=path.join(SCRIPT_DIR, "dtmf.json"))
+        add("--min-tone-level", 0.1, type=float, help="Minimum tone amplitude [0..1]")
+        add("--max-tone-range", 0.1, type=float, help="Maximum amplitude range between frequencies of a specific tone [0..1]")
+        add("--min-tone-on", 0.04, type=float, help="Minimum time for tones to be active before detected in seconds")
+        add("--min-tone-off", 0.04, type=float, help="Minimum time non-active time for a tone before detection stops in seconds")
+        add("--max-tone-interval", 1, type=float, help="Maximum time between two tones so that both tones belong to same sequence in seconds")
+        add("--min-seq-length", 2, type=int, help="Minimum length or tone sequences to be recognized")
+        add("--max-seq-length", 256, type=int, help="Maximum length of tone sequences. Longer sequences are split")
+
+    def add_common_args(parser):
         parser.add_argument("--sample-rate", type=int, help="Sample rate of input audio in Hertz", default=44100)
-        parser.add_argument("--min-tone-level", type=float, help="Minimum tone amplitude [0..1]", default=0.1)
-        parser.add_argument("--max-tone-range", type=float, help="Maximum amplitude range between frequencies of a specific tone [0..1]", default=0.1)
-        parser.add_argument("--min-tone-on", type=float, help="Minimum time for tones to be active before detected in seconds", default=0.04)
-        parser.add_argument("--min-tone-off", type=float, help="Minimum time non-active time for a tone before detection stops in seconds", default=0.04)
-        parser.add_argument("--max-tone-interval", type=float, help="Maximum time between two tones so that both tones belong to same sequence in seconds", default=1)
-        parser.add_argument("--min-seq-length", type=int, help="Minimum length or tone sequences to be recognized", default=2)
+        parser.add_argument("--channels", type=int, help="Number of audio channels to analyze independently", default=1)
+        add_detector_args(parser)
         parser.add_argument("--capture-audio", help="When a sequence is detected and this switch is enabled, recently captured audio samples are written to disk", action="store_true")
         parser.add_argument("--capture-audio-dir", help="Specifies the directory to write audio captures to",  default=".")
         parser.add_argument("--capture-audio-length", type=int, help="Capture audio buffer size in seconds",  default=10)
+        parser.add_argument("--max-latency", type=float, help="Latency budget of windowing in seconds. Reduces window hop size to meet it")
+        parser.add_argument("--cascade", help="Analyze only windows a cheap energy screen flags as possibly holding tones. Speeds up mostly idle input, i.e. quieter than about -25 dBFS, but hardly speech or music", action="store_true")
+        parser.add_argument("--compiled-kernels", help="Update tone states by kernels compiled with Numba. Delays startup, but speeds up long running streams", action="store_true")
+        parser.add_argument("--prefetch", type=int, help="Read this many chunks ahead on a background thread while analyzing", default=0)
+        parser.add_argument("--drop-when-full", help="With --prefetch, drop chunks instead of blocking the reader when analysis falls behind", action="store_true")
+        parser.add_argument("--trace-latency", help="Measure latency from audio ingress to detection. Sequences are measured from the onset of their last tone and, as sequence span, from their start", action="store_true")
+        parser.add_argument("--store", help="SQLite database to store detected sequences and tones in. With --cascade only sequences are stored")
+        parser.add_argument("--stream-name", help="Name detections are stored with. Defaults to the source")
+        parser.add_argument("--checkpoint", help="File to periodically store processing state in")
+        parser.add_argument("--checkpoint-interval", type=float, help="Stream time between two checkpoints in seconds", default=60)
+        parser.add_argument("--resume", help="Continue processing from the last checkpoint", action="store_true")
 
     parser = argparse.ArgumentParser(prog="harvester")
     subparsers = parser.add_subparsers(help="sub-command help", dest="subparser_name")
@@ -35,16 +77,96 @@ def parse_args():
     add_common_args(parser_ffmpeg)
     parser_ffmpeg.add_argument("--ffmpeg", help="Path to FFMPEG executable.", default="ffmpeg")
     parser_ffmpeg.add_argument("--source", help="The audio input. Can be a local file path or remote stream address.", required=True)
+    parser_ffmpeg.add_argument("--supervise", help="Restart FFMPEG with exponential backoff when it fails, keeping detection state", action="store_true")
+    parser_ffmpeg.add_argument("--gap", choices=["continuous", "silence", "downtime"], help="With --supervise, samples generated while FFMPEG is down. Defaults to continuous for local files and downtime for streams")
+    parser_ffmpeg.add_argument("--gap-duration", type=float, help="Duration of silence inserted by --gap silence in seconds", default=1)
+    parser_ffmpeg.add_argument("--max-restarts", type=int, help="With --supervise, give up after this many consecutive failures. Unlimited by default")
+    parser_ffmpeg.add_argument("--max-backoff", type=float, help="With --supervise, maximum delay of restarts in seconds", default=30)
+    parser_ffmpeg.add_argument("--amplitude-cache", help="Cache per-window amplitudes next to a local source file and reuse them in later runs", action="store_true")
 
     parser_stdin = subparsers.add_parser("stdin", help="Tone harvesting from standard input")
     parser_stdin.add_argument("--source-type", help="How binary data from stdin is interpreted", default="int16")
     add_common_args(parser_stdin)  
 
+    parser_shm = subparsers.add_parser("shm", help="Tone harvesting from a shared memory ring filled by 'harvester decode'")
+    add_common_args(parser_shm)
+    parser_shm.add_argument("--name", help="Name of the shared memory ring", required=True)
+    parser_shm.add_argument("--from-start", help="Start with the oldest samples in the ring instead of the most recent ones", action="store_true")
+    # Stream layout is given by the ring. Values passed explicitly are only checked against it.
+    parser_shm.set_defaults(sample_rate=None, channels=None)
+
+    parser_decode = subparsers.add_parser("decode", help="Decode a source once into a shared memory ring for several harvesters")
+    parser_decode.add_argument("--ffmpeg", help="Path to FFMPEG executable.", default="ffmpeg")
+    parser_decode.add_argument("--source", help="The audio input decoded by FFMPEG or - to read raw samples from standard input.", required=True)
+    parser_decode.add_argument("--source-type", help="How binary data from stdin is interpreted", default="int16")
+    parser_decode.add_argument("--sample-rate", type=int, help="Sample rate of decoded audio in Hertz", default=44100)
+    parser_decode.add_argument("--channels", type=int, help="Number of audio channels", default=1)
+    parser_decode.add_argument("--name", help="Name of the shared memory ring. Generated and printed when not given")
+    parser_decode.add_argument("--capacity", type=float, help="Duration of audio the ring holds in seconds", default=10)
+    parser_decode.add_argument("--wait", type=float, help="Time to wait for readers before decoding starts in seconds", default=0)
+    parser_decode.add_argument("--linger", type=float, help="Time to keep the ring available after decoding finished in seconds", default=0)
+
+    parser_sweep = subparsers.add_parser("sweep", help="Sweep tone detection parameters over labeled audio files")
+    parser_sweep.add_argument("--source", nargs="+", help="Wav files to evaluate. Expected sequences are taken from file names unless --expected is given.", required=True)
+    parser_sweep.add_argument("--expected", help="Expected sequence of symbols in all sources")
+    add_detector_args(parser_sweep, sweep=True)
+    parser_sweep.add_argument("--top", type=int, help="Number of best parameter sets to print", default=20)
+
+    parser_serve = subparsers.add_parser("serve", help="Tone harvesting from many concurrent TCP and UDP (RTP) audio streams")
+    parser_serve.add_argument("--sample-rate", type=int, help="Sample rate of all streams in Hertz", default=8000)
+    parser_serve.add_argument("--host", help="Address to listen on", default="127.0.0.1")
+    parser_serve.add_argument("--tcp-port", type=int, help="TCP port accepting raw 16 bit little endian PCM")
+    parser_serve.add_argument("--udp-port", type=int, help="UDP port accepting RTP framed 16 bit PCM")
+    parser_serve.add_argument("--max-buffer", type=float, help="Maximum duration of queued audio per stream in seconds", default=2)
+    parser_serve.add_argument("--batch-interval", type=float, help="Time between two processing batches in seconds", default=0.02)
+    add_detector_args(parser_serve)
+
+    parser_worker = subparsers.add_parser("worker", help="Process files enqueued in a spool directory shared by workers on several nodes")
+    parser_worker.add_argument("--spool", help="Spool directory", required=True)
+    parser_worker.add_argument("--ffmpeg", help="Path to FFMPEG executable used for files other than WAV.", default="ffmpeg")
+    parser_worker.add_argument("--sample-rate", type=int, help="Sample rate FFMPEG decodes to in Hertz", default=44100)
+    parser_worker.add_argument("--channels", type=int, help="Number of audio channels FFMPEG decodes to", default=1)
+    parser_worker.add_argument("--name", help="Worker name stored with leases and results. Defaults to host and process id")
+    parser_worker.add_argument("--lease", type=float, help="Time after which jobs of unresponsive workers are requeued in seconds", default=60)
+    parser_worker.add_argument("--max-attempts", type=int, help="Maximum number of times a file is processed before it is considered failed", default=3)
+    parser_worker.add_argument("--poll", type=float, help="Time to wait for new jobs when the queue is empty in seconds", default=5)
+    parser_worker.add_argument("--exit-when-empty", help="Exit once no jobs are queued or running", action="store_true")
+    parser_worker.add_argument("--batch", help="Scan files in batches of frames, using compiled kernels when Numba is installed", action="store_true")
+    add_detector_args(parser_worker)
+
+    parser_enqueue = subparsers.add_parser("enqueue", help="Add files to a spool directory processed by 'harvester worker'")
+    parser_enqueue.add_argument("--spool", help="Spool directory", required=True)
+    parser_enqueue.add_argument("files", nargs="+", help="Audio files to process")
+
+    parser_query = subparsers.add_parser("query", help="Query detections stored by --store")
+    parser_query.add_argument("--db", help="SQLite database written by --store", required=True)
+    parser_query.add_argument("--tones", help="Query single tones instead of sequences", action="store_true")
+    parser_query.add_argument("--match", help="Exact sequence or tone symbol")
+    parser_query.add_argument("--contains", help="Part of the sequence")
+    parser_query.add_argument("--stream", help="Stream name detections were stored with")
+    parser_query.add_argument("--file", help="File detections were made in")
+    parser_query.add_argument("--since", help="Earliest detection time as ISO date and time or as duration before now, e.g. 12h or 7d")
+    parser_query.add_argument("--until", help="Latest detection time as ISO date and time or as duration before now")
+    parser_query.add_argument("--limit", type=int, help="Maximum number of detections to print", default=100)
+    parser_query.add_argument("--json", help="Print detections as JSON lines", action="store_true")
+
+    parser_soak = subparsers.add_parser("soak", help="Push synthetic audio through the detection pipeline and report memory usage")
+    parser_soak.add_argument("--duration", type=float, help="Stream time to simulate in seconds", default=3*24*3600)
+    parser_soak.add_argument("--sample-rate", type=int, help="Sample rate of synthetic audio in Hertz", default=8000)
+    parser_soak.add_argument("--report-interval", type=float, help="Stream time between two memory reports in seconds", default=3600)
+    parser_soak.add_argument("--max-growth", type=float, help="Maximum tolerated RSS growth after warm up in MiB", default=8)
+
     args = parser.parse_args()
     if args.subparser_name is None:
         print("No subcommand given.")
         parser.print_usage()
         sys.exit(1)
+    if getattr(args, "resume", False) and args.checkpoint is None:
+        parser.error("--resume requires --checkpoint")
+    if getattr(args, "drop_when_full", False) and not args.prefetch:
+        parser.error("--drop-when-full requires --prefetch")
+    if getattr(args, "cascade", False) and (args.trace_latency or getattr(args, "amplitude_cache", False)):
+        parser.error("--cascade cannot be combined with --trace-latency or --amplitude-cache")
     return args
         
 
@@ -54,6 +176,43 @@ def main():
     
     args = parse_args()
 
+    if args.subparser_name == "sweep":
+        from tonedetect.bin import sweep
+        sweep.main(args)
+        return
+
+    if args.subparser_name == "query":
+        from tonedetect.bin import query
+        query.main(args)
+        return
+
+    if args.subparser_name == "decode":
+        from tonedetect.bin import decode
+        decode.main(args)
+        return
+
+    if args.subparser_name in ("worker", "enqueue"):
+        from tonedetect.bin import worker
+        if args.subparser_name == "worker":
+            worker.main(args)
+        else:
+            worker.enqueue(args)
+        return
+
+    if args.subparser_name == "serve":
+        if args.tcp_port is None and args.udp_port is None:
+            LOGGER.error("Either --tcp-port or --udp-port is required")
+            sys.exit(1)
+        from tonedetect.bin import serve
+        serve.main(args)
+        return
+
+    if args.subparser_name == "soak":
+        from tonedetect.bin import soak
+        sys.exit(soak.main(args))
+
+    from tonedetect.bin.buffer import AudioBuffer, NoopAudioBuffer
+
     # Load tones description    
     LOGGER.info("Loading tone description from '{}'".format(args.tones))
     tones = td.Tones.from_json_file(args.tones)
@@ -63,20 +222,34 @@ def main():
     data_source = None
     if args.subparser_name == "ffmpeg":
         LOGGER.info("Initializing FFMPEG source")
-        data_source = td.FFMPEGSource(args.source, ffmpeg_binary=args.ffmpeg, sample_rate=args.sample_rate)
+        if args.supervise:
+            data_source = td.SupervisedFFMPEGSource(
+                args.source, ffmpeg_binary=args.ffmpeg, sample_rate=args.sample_rate, channels=args.channels,
+                gap=args.gap, gap_duration=args.gap_duration, max_restarts=args.max_restarts, max_backoff=args.max_backoff)
+        else:
+            data_source = td.FFMPEGSource(args.source, ffmpeg_binary=args.ffmpeg, sample_rate=args.sample_rate, channels=args.channels)
     elif args.subparser_name == "stdin":
         LOGGER.info("Initializing STDIN source")
-        data_source = td.STDINSource(sample_rate=args.sample_rate, source_type=args.source_type)
+        data_source = td.STDINSource(sample_rate=args.sample_rate, source_type=args.source_type, channels=args.channels)
+    elif args.subparser_name == "shm":
+        LOGGER.info("Attaching to shared memory ring '{}'".format(args.name))
+        data_source = td.SharedRingSource(args.name, from_start=args.from_start)
+        # Stream layout is given by the writer.
+        for option, value, actual in (("--sample-rate", args.sample_rate, data_source.sample_rate), ("--channels", args.channels, data_source.channels)):
+            if value is not None and value != actual:
+                LOGGER.error("{} {} conflicts with the shared memory ring holding {}".format(option, value, actual))
+                sys.exit(1)
+        args.sample_rate = data_source.sample_rate
+        args.channels = data_source.channels
 
-    # Setup silence source. The silence source helps to flush detector states when the actual data stream becomes EOF.
-    # This usually happens with file based data. Using the silence helps to detect sequences that aren't complete at EOF.
-    silence_source = td.SilenceSource(args.max_tone_interval*2, args.sample_rate)
+    supervised = data_source if getattr(args, "supervise", False) else None
 
-    # The data generator will be concatenation of data and silence. 
-    data_gen = itertools.chain(data_source.generate_parts(), silence_source.generate_parts())
+    # Reading ahead on a background thread overlaps input with analysis
+    if args.prefetch > 0:
+        data_source = td.PrefetchSource(data_source, depth=args.prefetch, drop_when_full=args.drop_when_full)
 
     # Setup overlapping data window
-    wnd = td.Window.tuned(args.sample_rate, freqs, power_of_2=True, wndtype=td.Window.Type.hanning)
+    wnd = td.Window.tuned(args.sample_rate, freqs, power_of_2=True, max_latency=args.max_latency, nchannels=args.channels, wndtype=td.Window.Type.hanning)
     
     # Setup frequency detection for target frequencies
     d_f = td.FrequencyDetector(freqs)
@@ -87,15 +260,37 @@ def main():
         min_tone_amp=args.min_tone_level, 
         max_inter_tone_amp=args.max_tone_range, 
         min_presence=args.min_tone_on, 
-        min_pause=args.min_tone_off
+        min_pause=args.min_tone_off,
+        nchannels=args.channels,
+        use_kernels=args.compiled_kernels
     )
 
     # Setup sequence detection
     d_s = td.ToneSequenceDetector(
         max_tone_interval=args.max_tone_interval, 
-        min_sequence_length=args.min_seq_length
+        min_sequence_length=args.min_seq_length,
+        max_sequence_length=args.max_seq_length,
+        nchannels=args.channels
     )
 
+    # Setup checkpointing. When resuming, the source seeks to the last checkpointed position.
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = td.Checkpoint(
+            args.checkpoint, 
+            interval=args.checkpoint_interval, 
+            components={'source': data_source, 'window': wnd, 'tones': d_t, 'sequences': d_s}
+        )
+        if args.resume and not checkpoint.restore():
+            LOGGER.info("No checkpoint found at '{}', starting from scratch".format(args.checkpoint))
+
+    # Setup silence source. The silence source helps to flush detector states when the actual data stream becomes EOF.
+    # This usually happens with file based data. Using the silence helps to detect sequences that aren't complete at EOF.
+    silence_source = td.SilenceSource(args.max_tone_interval*2, args.sample_rate, channels=args.channels)
+
+    # The data generator will be concatenation of data and silence. 
+    data_gen = itertools.chain(data_source.generate_parts(), silence_source.generate_parts())
+
     # Pretty printing of status
     status = Status()
     printer = StatusPrinter(status)
@@ -109,24 +304,140 @@ def main():
     else:
         audio_buffer = NoopAudioBuffer()
 
-    for chunk in data_gen:
-        audio_buffer.add(chunk)
-
-        for w in wnd.update(chunk):
-            # For each full window first query the frequency detection module
-            cur_freqs = d_f.update(w) 
-            # Given the frequencies report all tones currently present
-            cur_tones = d_t.update(w, cur_freqs)
-            # Accumulate tones in sequences
-            seq, tspan = d_s.update(w, cur_tones)
-
-            if seq:
-                status.update_sequences(seq)
-                id = "{:03d}".format(len(status.sequences))
-                LOGGER.info(">>> '{}' around {:.2f}s-{:.2f}s assigned #{}".format("".join([str(e) for e in seq]), tspan.start, tspan.end, id))                
-                audio_buffer.write_audio(args.capture_audio_dir, id)
-    
-        status.update_bytes(data_source.bytes_processed)
+    # Latency tracing of chunk ingress and detection egress. Sequences are measured from the onset
+    # of their last tone, which excludes the time taken by earlier tones but includes the duration
+    # of the last one and the max_tone_interval waited for further tones. They are additionally
+    # measured from their start as 'sequence span'.
+    tracer = td.LatencyTracer(args.sample_rate) if args.trace_latency else None
+    last_onsets = [0.] * args.channels
+
+    # Detections are inserted into the database by a background thread.
+    store = None
+    if args.store:
+        from tonedetect.store import DetectionStore
+        store = DetectionStore(args.store)
+        store_file = args.source if args.subparser_name == "ffmpeg" and path.isfile(args.source) else None
+        store_stream = args.stream_name or {'ffmpeg': getattr(args, "source", None), 'stdin': "stdin", 'shm': "shm:{}".format(getattr(args, "name", ""))}[args.subparser_name]
+
+    def process(w, cur_freqs):
+        # Given the frequencies report all tones currently present per channel
+        cur_tones = d_t.update_channels(w, cur_freqs)
+        pending = [len(seq) for seq in d_s.sequences] if tracer else None
+        # Accumulate tones in sequences, tagging them with their channel
+        detections = d_s.update_channels(w, cur_tones)
+
+        if store:
+            for c in range(args.channels):
+                store.add_tones(cur_tones[c], d_t.channel_onsets[c], d_t.channel_amplitudes[c], channel=c, stream=store_stream, file=store_file)
+
+        if tracer:
+            for t in itertools.chain.from_iterable(d_t.channel_onsets):
+                tracer.egress(t, kind="tone")
+            for channel, seq, tspan in detections:
+                # Sequences are completed before the current tones are added, unless they reached
+                # their maximum length including them.
+                current = len(cur_tones[channel]) > 0 and len(seq) == pending[channel] + len(cur_tones[channel])
+                tracer.egress(d_t.channel_onsets[channel][-1] if current else last_onsets[channel])
+                tracer.egress(tspan.start, kind="sequence span")
+            for c in range(args.channels):
+                if cur_tones[c]:
+                    last_onsets[c] = d_t.channel_onsets[c][-1]
+
+        report(detections)
+
+    def report(detections):
+        for channel, seq, tspan in detections:
+            # Stored before being logged, so that every logged sequence is stored even when interrupted.
+            if store:
+                store.add_sequence(seq, tspan, channel=channel, stream=store_stream, file=store_file)
+            status.update_sequences(seq)
+            id = "{:03d}".format(status.nsequences)
+            where = "" if args.channels == 1 else " on channel {}".format(channel)
+            LOGGER.info(">>> '{}'{} around {:.2f}s-{:.2f}s assigned #{}".format("".join([str(e) for e in seq]), where, tspan.start, tspan.end, id))
+            audio_buffer.write_audio(args.capture_audio_dir, id)
+
+    # Cascade scanning skips the frequency analysis of windows that cannot hold tones.
+    cascade = td.CascadeScanner(wnd, d_f, d_t, d_s) if args.cascade else None
+
+    # Per-window amplitudes of local files can be cached, so that re-runs with different detection settings
+    # skip decoding and transforming the source.
+    cache = None
+    cache_writer = None
+    if getattr(args, "amplitude_cache", False):
+        if path.isfile(args.source):
+            cache = td.AmplitudeCache(args.source, wnd, freqs)
+        else:
+            LOGGER.warning("Amplitude cache requires a local file source, ignoring it")
+
+    # Stopping by SIGTERM unwinds like an interrupt, so that buffered results are not lost.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    consistent = False
+    try:
+        if cache and cache.complete:
+            LOGGER.info("Replaying cached amplitudes from '{}'".format(cache.data_path))
+            if args.capture_audio:
+                # Replays hold amplitudes only, there are no samples to capture.
+                LOGGER.warning("Audio capture is not available while replaying cached amplitudes")
+                audio_buffer = NoopAudioBuffer()
+            for w, cur_freqs in cache.replay(flush=silence_source.duration):
+                process(w, cur_freqs)
+            status.update_bytes(path.getsize(args.source))
+        else:
+            if cache and not args.resume:
+                cache_writer = cache.writer()
+
+            # Checkpoints are consistent between chunks only, see Checkpoint.
+            consistent = True
+            for chunk in data_gen:
+                consistent = False
+                audio_buffer.add(chunk)
+                if tracer:
+                    tracer.ingress(chunk.shape[-1])
+
+                if cascade:
+                    report(cascade.scan_channels(chunk))
+                else:
+                    for w in wnd.update(chunk):
+                        # For each full window first query the frequency detection module
+                        cur_freqs = d_f.update(w)
+                        if cache_writer:
+                            cache_writer.add(cur_freqs)
+                        process(w, cur_freqs)
+
+                status.update_bytes(data_source.bytes_processed)
+
+                if checkpoint:
+                    checkpoint.update(data_source.samples_processed / args.sample_rate)
+                consistent = True
+
+            if cache_writer:
+                cache_writer.close()
+                cache_writer = None
+    finally:
+        # Incomplete caches are dropped, while stored detections and the last position are kept.
+        if cache_writer:
+            cache_writer.discard()
+        if checkpoint and consistent:
+            checkpoint.save()
+        if store:
+            unwinding = sys.exc_info()[1] is not None
+            try:
+                store.close()
+            except Exception as e:
+                # Errors of the final flush must not hide the error being unwound.
+                if not unwinding:
+                    raise
+                LOGGER.error("Failed to close detection store '{}': {}".format(args.store, e))
+            else:
+                LOGGER.info("Stored {} sequences and {} tones in '{}'".format(store.nsequences, store.ntones, args.store))
+
+    if tracer:
+        LOGGER.info(tracer.summary())
+    if supervised:
+        LOGGER.info(supervised.metrics())
+    if args.prefetch > 0:
+        LOGGER.info(data_source.metrics())
     
 
 if __name__ == "__main__":
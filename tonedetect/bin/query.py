@@ -0,0 +1,33 @@
+import re
+import time
+import json
+from datetime import datetime
+
+from tonedetect.store import query
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+def parse_time(value, now=None):
+    """Returns seconds since the epoch of an ISO date and time or of a duration before now like '90m', '12h' or '7d'."""
+    m = re.fullmatch(r"(\d+(?:\.\d*)?)([smhdw])", value)
+    if m:
+        now = time.time() if now is None else now
+        return now - float(m.group(1)) * UNITS[m.group(2)]
+    return datetime.fromisoformat(value).timestamp()
+
+def main(args):
+    """Print stored detections matching the given criteria, most recent first."""
+    rows = query(
+        args.db, table="tones" if args.tones else "sequences", match=args.match, contains=args.contains,
+        stream=args.stream, file=args.file,
+        since=parse_time(args.since) if args.since else None,
+        until=parse_time(args.until) if args.until else None,
+        limit=args.limit)
+    for r in rows:
+        if args.json:
+            print(json.dumps(r))
+            continue
+        detected = datetime.fromtimestamp(r['detected']).isoformat(sep=" ", timespec="seconds")
+        what = r['sequence'] if 'sequence' in r else "{} ({:.2f})".format(r['symbol'], r['amplitude'])
+        where = r['file'] or r['stream'] or ""
+        print("{} '{}' at {:.2f}s ch{} {}".format(detected, what, r['start'], r['channel'], where))
@@ -0,0 +1,34 @@
+import sys
+import asyncio
+import logging
+
+import tonedetect as td
+from tonedetect.bin.harvester import tone_detector_args, sequence_detector_args
+from tonedetect.server import DetectionServer
+
+LOGGER = logging.getLogger(__name__)
+
+def main(args):
+    """Run a detection server until interrupted."""
+    tones = td.Tones.from_json_file(args.tones)
+    server = DetectionServer(
+        tones, args.sample_rate, sys.stdout,
+        detector_args=tone_detector_args(args),
+        sequence_args=sequence_detector_args(args),
+        max_buffer=args.max_buffer,
+        batch_interval=args.batch_interval
+    )
+
+    async def run():
+        await server.start(args.host, tcp_port=args.tcp_port, udp_port=args.udp_port)
+        LOGGER.info("Listening on {}".format(", ".join("{} {}:{}".format(k, *v) for k, v in server.addresses.items())))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    LOGGER.info("Served {} streams, detected {} sequences".format(server.nstreams, server.nsequences))
@@ -0,0 +1,104 @@
+import os
+import time
+import logging
+import numpy as np
+
+import tonedetect as td
+from tonedetect.bin.status import Status
+
+LOGGER = logging.getLogger(__name__)
+
+def rss_bytes():
+    """Returns the resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Peak instead of current resident size, still suited to detect growth.
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def synthetic_block(tones, sample_rate, duration=10., tone_length=0.05, ntones=12):
+    """Returns a block of audio holding a sequence of ntones tones followed by silence."""
+    nsamples = int(duration * sample_rate)
+    t = np.arange(int(tone_length * sample_rate)) / sample_rate
+    n = len(t)
+    block = np.zeros(nsamples)
+    for i in range(min(ntones, nsamples // (2 * n))):
+        e = tones.items[i % len(tones.items)]
+        block[2 * i * n:(2 * i + 1) * n] = sum(0.4 * np.sin(2 * np.pi * f * t) for f in e['f'])
+    return block
+
+def soak(duration, sample_rate=8000, chunk_size=4096, max_sequence_length=16, report_interval=3600., tones=None):
+    """Push synthetic audio of the given stream duration through the full detection pipeline.
+
+    The same preallocated blocks of audio are fed repeatedly, so any memory growth stems from
+    the pipeline itself. Out of every four blocks, one repeats a single tone with short pauses,
+    like a rapidly pressed key, which produces sequences limited by max_sequence_length only.
+    Another one holds a single tone for the whole block, far longer than max_tone_interval,
+    like a stuck key.
+
+    Returns:
+        list: (stream time, RSS in bytes, number of sequences) sampled every report_interval seconds of stream time.
+    """
+    tones = tones if tones is not None else td.Tones.from_json_file(os.path.join(os.path.dirname(__file__), "dtmf.json"))
+    freqs = tones.all_tone_frequencies()
+    wnd = td.Window.tuned(sample_rate, freqs, power_of_2=True, wndtype=td.Window.Type.hanning)
+    d_f = td.FrequencyDetector(freqs)
+    d_t = td.ToneDetector(tones, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.04, min_pause=0.04)
+    d_s = td.ToneSequenceDetector(max_tone_interval=1., min_sequence_length=1, max_sequence_length=max_sequence_length)
+    tracer = td.LatencyTracer(sample_rate, horizon=60.)
+    status = Status()
+
+    block = synthetic_block(tones, sample_rate)
+    repeated = np.tile(block[:int(0.1 * sample_rate)], len(block) // int(0.1 * sample_rate))
+    t = np.arange(len(block)) / sample_rate
+    stuck = sum(0.4 * np.sin(2 * np.pi * f * t) for f in tones.items[0]['f'])
+
+    samples = []
+    total = int(duration * sample_rate)
+    next_report = 0
+    nprocessed = 0
+    nblocks = 0
+    while nprocessed < total:
+        data = (block, block, repeated, stuck)[nblocks % 4]
+        nblocks += 1
+        for offset in range(0, len(data), chunk_size):
+            chunk = data[offset:offset + chunk_size]
+            tracer.ingress(len(chunk))
+            for w in wnd.update(chunk):
+                cur_tones = d_t.update(w, d_f.update(w))
+                for t in d_t.onsets:
+                    tracer.egress(t, kind="tone")
+                seq, tspan = d_s.update(w, cur_tones)
+                if seq:
+                    tracer.egress(tspan.start)
+                    status.update_sequences(seq)
+            nprocessed += len(chunk)
+            status.update_bytes(nprocessed * 2)
+
+            if nprocessed >= next_report:
+                samples.append((nprocessed / sample_rate, rss_bytes(), status.nsequences))
+                next_report += int(report_interval * sample_rate)
+    samples.append((nprocessed / sample_rate, rss_bytes(), status.nsequences))
+    return samples
+
+def main(args):
+    """Run a soak test and report resident memory over stream time."""
+    began = time.perf_counter()
+    samples = soak(args.duration, sample_rate=args.sample_rate, report_interval=args.report_interval)
+    elapsed = time.perf_counter() - began
+
+    print("{:>12} {:>10} {:>10}".format("stream [h]", "rss [MiB]", "sequences"))
+    for t, rss, nseq in samples:
+        print("{:12.2f} {:10.1f} {:10d}".format(t / 3600, rss / 2**20, nseq))
+    LOGGER.info("Processed {:.1f}h of audio in {:.1f}s ({:.0f}x real time)".format(
+        samples[-1][0] / 3600, elapsed, samples[-1][0] / max(elapsed, 1e-9)))
+
+    # Compare against the first sample after warm up.
+    base = samples[min(1, len(samples) - 1)][1]
+    growth = samples[-1][1] - base
+    if growth > args.max_growth * 2**20:
+        LOGGER.error("RSS grew by {:.1f}MiB".format(growth / 2**20))
+        return 1
+    return 0
@@ -1,12 +1,15 @@
 
 import logging
 import threading
+from collections import deque
 from datetime import datetime
 from tonedetect.bin import pretty
 
 class Status:
-    def __init__(self):
-        self.sequences = []
+    def __init__(self, history=100):
+        # Only recent sequences are kept, so that long running processes use bounded memory.
+        self.sequences = deque(maxlen=history)
+        self.nsequences = 0
         self.since = datetime.now()
         self.last_update = datetime.now()
         self.bytes_processed = 0
@@ -17,6 +20,7 @@ class Status:
 
     def update_sequences(self, new_sequence):
         self.sequences.append(new_sequence)
+        self.nsequences += 1
         self.last_update = datetime.now()
 
 class StatusPrinter:
@@ -28,7 +32,7 @@ class StatusPrinter:
         self.logger.info(
             "Status {} sequences, running since: {}, last updated: {}, bytes processed: {}"
             .format(
-                len(self.status.sequences), 
+                self.status.nsequences, 
                 pretty.pretty_date(self.status.since, suffix=""), 
                 pretty.pretty_date(self.status.last_update),
                 pretty.pretty_size(self.status.bytes_processed)
@@ -0,0 +1,56 @@
+import itertools
+import logging
+import numpy as np
+
+import tonedetect as td
+from tonedetect import sweep
+from tonedetect.bin.harvester import tone_detector_args, sequence_detector_args
+
+LOGGER = logging.getLogger(__name__)
+
+def main(args):
+    """Sweep tone detection parameters over labeled sample files and print the best parameter sets."""
+
+    tones = td.Tones.from_json_file(args.tones)
+    freqs = tones.all_tone_frequencies()
+    params = sweep.grid(**tone_detector_args(args), **sequence_detector_args(args))
+    nsets = len(params['min_tone_amp'])
+    LOGGER.info("Sweeping {} parameter sets over {} files".format(nsets, len(args.source)))
+
+    totals = [{'matches': 0, 'false_positives': 0, 'misses': 0, 'expected': 0, 'delays': []} for i in range(nsets)]
+    for filename in args.source:
+        expected = args.expected if args.expected is not None else sweep.expected_from_filename(filename)
+        if expected is None:
+            LOGGER.warning("No expected sequence for '{}', skipping it".format(filename))
+            continue
+
+        sr, data = td.helpers.read_audio(filename)
+        wnd = td.Window.tuned(sr, freqs, power_of_2=True, wndtype=td.Window.Type.hanning)
+        d_f = td.FrequencyDetector(freqs)
+        parts = itertools.chain(td.InMemorySource(data, sr).generate_parts(), td.SilenceSource(1, sr).generate_parts())
+        amps, starts, ends = sweep.compute_amplitudes(wnd, d_f, parts)
+
+        for t, r in zip(totals, sweep.sweep(tones, amps, starts, ends, params, expected=expected)):
+            t.update({n: r[n] for n in sweep.PARAMETERS})
+            for k in ('matches', 'false_positives', 'misses'):
+                t[k] += r[k]
+            t['expected'] += len(expected)
+            if r['delay'] is not None:
+                t['delays'].append(r['delay'])
+
+    if totals[0]['expected'] == 0:
+        LOGGER.error("No labeled input given")
+        return
+
+    for t in totals:
+        t['accuracy'] = t['matches'] / t['expected']
+        t['delay'] = np.mean(t['delays']) if t['delays'] else float('nan')
+
+    totals.sort(key=lambda t: (-t['accuracy'], t['false_positives'], t['delay']))
+    print("{:>8} {:>8} {:>8} {:>8} {:>8} {:>6} {:>6} | {:>8} {:>6} {:>6} {:>8}".format(
+        "level", "range", "on", "off", "interval", "minlen", "maxlen", "accuracy", "fp", "miss", "delay"))
+    for t in totals[:args.top]:
+        print("{:8.3f} {:8.3f} {:8.3f} {:8.3f} {:8.3f} {:6d} {:>6} | {:8.3f} {:6d} {:6d} {:8.3f}".format(
+            t['min_tone_amp'], t['max_inter_tone_amp'], t['min_presence'], t['min_pause'],
+            t['max_tone_interval'], t['min_sequence_length'], str(t['max_sequence_length']),
+            t['accuracy'], t['false_positives'], t['misses'], t['delay']))
@@ -0,0 +1,65 @@
+import functools
+import itertools
+import logging
+
+import tonedetect as td
+from tonedetect.bin.harvester import tone_detector_args, sequence_detector_args
+from tonedetect.spool import Spool, Worker
+from tonedetect.pipeline import detect, flush_samples
+
+LOGGER = logging.getLogger(__name__)
+
+def scan_file(filename, tones, detector_args, sequence_args, sample_rate=44100, channels=1, ffmpeg="ffmpeg", batch=False):
+    """Detect sequences of a single file. WAV files are read directly, other formats are decoded by FFMPEG.
+
+    With batch, the file is scanned by BatchScanner, which runs compiled kernels when Numba is
+    available, see BatchScanner.
+
+    Returns:
+        list: Detected sequences as dicts of channel, sequence and timespan.
+    """
+    if filename.lower().endswith(".wav"):
+        source = td.WAVSource(filename)
+    else:
+        source = td.FFMPEGSource(filename, ffmpeg_binary=ffmpeg, sample_rate=sample_rate, channels=channels)
+
+    freqs = tones.all_tone_frequencies()
+    wnd = td.Window.tuned(source.sample_rate, freqs, power_of_2=True, nchannels=source.channels, wndtype=td.Window.Type.hanning)
+    d_f = td.FrequencyDetector(freqs)
+    d_t = td.ToneDetector(tones, nchannels=source.channels, **detector_args)
+    d_s = td.ToneSequenceDetector(nchannels=source.channels, **sequence_args)
+    if batch:
+        scanner = td.BatchScanner(wnd, d_f, d_t, d_s)
+        parts = itertools.chain(source.generate_parts(), [flush_samples(wnd, d_s)])
+        detections = itertools.chain.from_iterable(map(scanner.scan_channels, parts))
+    else:
+        detections = detect(source.generate_parts(), wnd, d_f, d_t, d_s)
+    return [
+        {'channel': channel, 'sequence': "".join(str(e) for e in seq), 'start': round(tspan.start, 6), 'end': round(tspan.end, 6)}
+        for channel, seq, tspan in detections
+    ]
+
+def main(args):
+    """Process jobs of a spool directory until interrupted or, with --exit-when-empty, until no work is left."""
+    tones = td.Tones.from_json_file(args.tones)
+    analyze = functools.partial(
+        scan_file, tones=tones,
+        detector_args=tone_detector_args(args),
+        sequence_args=sequence_detector_args(args),
+        sample_rate=args.sample_rate, channels=args.channels, ffmpeg=args.ffmpeg, batch=args.batch
+    )
+    spool = Spool(args.spool, lease=args.lease, max_attempts=args.max_attempts)
+    worker = Worker(spool, analyze, name=args.name, poll_interval=args.poll)
+    LOGGER.info("Worker {} taking jobs from '{}'".format(worker.name, args.spool))
+    try:
+        worker.run(exit_when_empty=args.exit_when_empty)
+    except KeyboardInterrupt:
+        pass
+    LOGGER.info("Worker {} completed {} and failed {} jobs".format(worker.name, worker.ncompleted, worker.nfailed))
+
+def enqueue(args):
+    """Add files to a spool directory."""
+    spool = Spool(args.spool)
+    added = [job_id for job_id in map(spool.enqueue, args.files) if job_id is not None]
+    LOGGER.info("Enqueued {} of {} files, spool holds {}".format(
+        len(added), len(args.files), ", ".join("{} {}".format(n, state) for state, n in spool.counts().items())))
@@ -0,0 +1,166 @@
+import os
+import math
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import numpy as np
+from tonedetect.window import Frame
+
+logger = logging.getLogger(__name__)
+
+class AmplitudeCache:
+    """On-disk cache of the per-window output of FrequencyDetector.update.
+
+    Only tone and sequence detection depend on detection thresholds. Caching the amplitudes
+    of all target frequencies per window allows re-running these stages with different
+    settings without decoding and transforming the source again.
+
+    The cache is stored next to the source file as raw float64 records, which can be memory
+    mapped, plus a JSON header. The file name contains a key derived from the source content,
+    the window layout and the target frequencies. The header is written last, so a cache is
+    only considered complete once its header exists.
+
+    Hashing the content of large sources on every run would cost about as much as decoding
+    them. The digest is hence stored in a small index file along with size and modification
+    time of the source, and reused as long as both are unchanged.
+
+    Args:
+        source (str): Path of the source file
+        wnd (Window): Window used for analysis
+        freqs (list): Target frequencies of FrequencyDetector
+
+    Kwargs:
+        directory (str): Directory to store cache files in. Defaults to the directory of source.
+    """
+
+    def __init__(self, source, wnd, freqs, directory=None):
+        directory = directory if directory is not None else os.path.dirname(os.path.abspath(source))
+        self.index_path = os.path.join(directory, "{}.sha1.json".format(os.path.basename(source)))
+        self.key = AmplitudeCache.compute_key(source, wnd, freqs, index=self.index_path)
+        base = os.path.join(directory, "{}.{}".format(os.path.basename(source), self.key[:16]))
+        self.data_path = base + ".amps"
+        self.header_path = base + ".json"
+        self.nsamples = wnd.nsamples
+        self.nhop = wnd.nhop
+        self.sample_rate = wnd.sample_rate
+
+    @staticmethod
+    def source_hash(source, index=None, blocksize=1 << 20):
+        """Returns the SHA1 hex digest of the source file content.
+
+        Kwargs:
+            index (str): JSON file to reuse the digest from while size and modification time of source are unchanged
+        """
+        st = os.stat(source)
+        stamp = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        if index is not None:
+            try:
+                with open(index) as f:
+                    entry = json.load(f)
+                if entry['size'] == stamp['size'] and entry['mtime_ns'] == stamp['mtime_ns']:
+                    return entry['sha1']
+            except (OSError, ValueError, KeyError):
+                pass
+
+        h = hashlib.sha1()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(blocksize), b""):
+                h.update(block)
+        digest = h.hexdigest()
+
+        # Modifications within the timestamp resolution of the filesystem keep the modification
+        # time, so digests of files modified just before hashing are not reused.
+        if index is not None and time.time() - st.st_mtime > 2.:
+            try:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index)), prefix=".amps-")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(dict(stamp, sha1=digest), f)
+                os.replace(tmp, index)
+            except OSError as e:
+                logger.warning("Failed to store digest of '{}' in '{}': {}".format(source, index, e))
+        return digest
+
+    @staticmethod
+    def compute_key(source, wnd, freqs, index=None):
+        """Returns the cache key for source, window layout and target frequencies. See source_hash for index."""
+        f, wndnorm = wnd.window_function
+        h = hashlib.sha1()
+        h.update(AmplitudeCache.source_hash(source, index=index).encode())
+        h.update(repr((wnd.sample_rate, wnd.nsamples, wnd.npads, wnd.nhop, wnd.nchannels, wndnorm)).encode())
+        h.update(np.ascontiguousarray(f, dtype=np.float64).tobytes())
+        h.update(np.asarray(freqs, dtype=np.float64).tobytes())
+        return h.hexdigest()
+
+    @property
+    def complete(self):
+        """Whether or not a complete cache exists."""
+        return os.path.isfile(self.header_path)
+
+    def load(self):
+        """Returns the memory mapped amplitudes laid out as windows x [channels x] frequencies."""
+        with open(self.header_path) as f:
+            header = json.load(f)
+        assert header['key'] == self.key, "Cache header does not match key"
+        shape = tuple([header['nframes']] + header['shape'])
+        if header['nframes'] == 0:
+            return np.zeros(shape)
+        return np.memmap(self.data_path, dtype=np.float64, mode="r", shape=shape)
+
+    def replay(self, flush=0.):
+        """Yields a Frame standing in for the window and the amplitudes for every cached window.
+
+        Kwargs:
+            flush (float): Duration in seconds of pure silence windows to append, which have zero amplitudes.
+                           Allows flushing pending sequences independent of the silence recorded in the cache.
+        """
+        amps = self.load()
+        frame = Frame()
+        for i in range(len(amps)):
+            yield frame.cover(i, self.nsamples, self.nhop, self.sample_rate), amps[i]
+
+        if len(amps) > 0 and flush > 0:
+            zeros = np.zeros(amps.shape[1:])
+            for i in range(len(amps), len(amps) + int(math.ceil(flush * self.sample_rate / self.nhop))):
+                yield frame.cover(i, self.nsamples, self.nhop, self.sample_rate), zeros
+
+    def writer(self):
+        """Returns a writer recording amplitudes in window order."""
+        return AmplitudeCacheWriter(self)
+
+class AmplitudeCacheWriter:
+    """Appends amplitudes to a cache. The cache becomes visible once close is called."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.nframes = 0
+        self.shape = None
+        directory = os.path.dirname(cache.data_path)
+        fd, self._tmp = tempfile.mkstemp(dir=directory, prefix=".amps-")
+        self._file = os.fdopen(fd, "wb")
+
+    def add(self, amps):
+        """Append the amplitudes of the next window."""
+        amps = np.asarray(amps, dtype=np.float64)
+        if self.shape is None:
+            self.shape = list(amps.shape)
+        self._file.write(amps.tobytes())
+        self.nframes += 1
+
+    def close(self):
+        """Finish the cache by moving data in place and writing its header."""
+        self._file.close()
+        os.replace(self._tmp, self.cache.data_path)
+        header = {'key': self.cache.key, 'nframes': self.nframes, 'shape': self.shape or []}
+        directory = os.path.dirname(self.cache.header_path)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".amps-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(header, f)
+        os.replace(tmp, self.cache.header_path)
+        logger.info("Cached amplitudes of {} windows in '{}'".format(self.nframes, self.cache.data_path))
+
+    def discard(self):
+        """Drop everything recorded so far."""
+        self._file.close()
+        os.remove(self._tmp)
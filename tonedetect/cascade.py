@@ -0,0 +1,129 @@
+import logging
+import numpy as np
+from tonedetect.window import Frame
+
+logger = logging.getLogger(__name__)
+
+class CascadeScanner:
+    """Scanning of sample arrays that analyzes only frames possibly holding tones.
+
+    A cheap first stage bounds the amplitude FrequencyDetector could report for any frequency
+    of a frame. By the Cauchy-Schwarz inequality the amplitude of a frame x weighted by window
+    function f is at most 2 * wndnorm / ntotal * |f| * |x|, where the energy |x|^2 of all
+    frames is obtained at once from cumulative sums. Frames whose bound stays below
+    min_tone_amp cannot hold active tones. Only the remaining frames, plus margin frames
+    around them, are analyzed at full resolution. Runs of skipped frames advance tone and
+    sequence states exactly as the regular pipeline would, so detections are identical.
+
+    The first stage only rejects frames whose RMS level stays below a threshold proportional
+    to min_tone_amp, about -25 dBFS for min_tone_amp=0.1 and a Hann window. The scanner pays
+    off on mostly idle input such as squelched radio channels, silence or low level noise
+    between calls, where it analyzes a small fraction of frames. Speech and music at program
+    levels are mostly analyzed at full resolution, leaving a gain only from their pauses.
+    etc/benchmarks/cascade.py compares these kinds of content.
+
+    Like BatchScanner, the scanner operates on the state of the given window and detectors,
+    so cascade scans and regular per-window updates can be mixed freely.
+
+    Args:
+        wnd (Window): Window to take frame layout and buffered samples from
+        d_f (FrequencyDetector): Frequency detection
+        d_t (ToneDetector): Tone detection
+        d_s (ToneSequenceDetector): Sequence detection
+
+    Kwargs:
+        margin (int): Number of frames before and after every candidate frame analyzed at full resolution
+    """
+
+    def __init__(self, wnd, d_f, d_t, d_s, margin=1):
+        self.wnd = wnd
+        self.d_f = d_f
+        self.d_t = d_t
+        self.d_s = d_s
+        self.margin = margin
+        self.nanalyzed = 0
+        """Number of frames analyzed at full resolution."""
+        self.nskipped = 0
+        """Number of frames skipped by the first stage."""
+
+        f, wndnorm = wnd.window_function
+        self._bound = 2 * wndnorm / wnd.ntotal * np.linalg.norm(f[:wnd.nsamples])
+        self._frame = Frame()
+        self._no_tones = [[] for c in range(wnd.nchannels)]
+
+    def candidates(self, buf, nframes):
+        """Returns whether each of the nframes frames of buf possibly holds active tones, before margins are applied."""
+        wnd = self.wnd
+        energy = np.zeros(buf.shape[:-1] + (buf.shape[-1] + 1,))
+        np.cumsum(np.square(buf), axis=-1, out=energy[..., 1:])
+        first = np.arange(nframes) * wnd.nhop
+        frame_energy = energy[..., first + wnd.nsamples] - energy[..., first]
+        if wnd.nchannels > 1:
+            frame_energy = np.max(frame_energy, axis=0)
+        # Enlarged slightly to stay conservative despite rounding of cumulative sums.
+        bound = self._bound * np.sqrt(np.maximum(frame_energy, 0.)) * (1 + 1e-6)
+        return bound >= self.d_t.min_tone_amp
+
+    def scan(self, samples):
+        """Process samples and return detected sequences.
+
+        Returns:
+            list: (sequence, Timespan) tuples for single channel pipelines, (channel, sequence, Timespan)
+                  tuples for multichannel pipelines. See scan_channels for a result independent of the
+                  number of channels.
+        """
+        results = self.scan_channels(samples)
+        return [(seq, tspan) for c, seq, tspan in results] if self.wnd.nchannels == 1 else results
+
+    def scan_channels(self, samples):
+        """Process samples and return (channel, sequence, Timespan) tuples of detected sequences."""
+        wnd = self.wnd
+        state = wnd.get_state()
+        buf = np.concatenate((state['values'], np.asarray(samples, dtype=np.float_)), axis=-1)
+        n = buf.shape[-1]
+        nframes = 0 if n < wnd.nsamples else (n - wnd.nsamples) // wnd.nhop + 1
+        shift = state['shifts']
+
+        analyze = self.candidates(buf, nframes)
+        if self.margin > 0 and analyze.any():
+            # Dilate candidates by margin frames on both sides.
+            idx = np.flatnonzero(analyze)
+            lo = np.maximum(idx - self.margin, 0)
+            hi = np.minimum(idx + self.margin + 1, nframes)
+            marks = np.zeros(nframes + 1, dtype=np.intp)
+            np.add.at(marks, lo, 1)
+            np.add.at(marks, hi, -1)
+            analyze = np.cumsum(marks[:-1]) > 0
+
+        results = []
+        k = 0
+        while k < nframes:
+            # Find the run of frames sharing the current decision.
+            change = np.flatnonzero(analyze[k:] != analyze[k])
+            end = nframes if len(change) == 0 else k + change[0]
+            if analyze[k]:
+                for i in range(k, end):
+                    a = (i * wnd.nhop)
+                    w = wnd.load(buf[..., a:a + wnd.nsamples], shift + i)
+                    results.extend(self.d_s.update_channels(w, self.d_t.update_channels(w, self.d_f.update(w))))
+                self.nanalyzed += end - k
+            else:
+                self._skip(results, shift + k, shift + end)
+                self.nskipped += end - k
+            k = end
+
+        # Leave the window in the same state a per-window update would have.
+        rest = buf[..., nframes * wnd.nhop:]
+        wnd.set_state({'values': rest, 'idx': rest.shape[-1], 'shifts': shift + nframes})
+        return results
+
+    def _skip(self, results, first, last):
+        """Advance detectors over the frames with shift counts in [first, last) that hold no active tones."""
+        wnd = self.wnd
+        starts = (np.arange(first, last) * wnd.nhop) / wnd.sample_rate
+        ends = starts + wnd.nsamples / wnd.sample_rate
+        self.d_t.skip(starts, ends)
+
+        # See ToneSequenceDetector.update on skipping windows without tones.
+        self._frame.cover(last - 1, wnd.nsamples, wnd.nhop, wnd.sample_rate)
+        results.extend(self.d_s.update_channels(self._frame, self._no_tones))
@@ -0,0 +1,99 @@
+import os
+import pickle
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Checkpoint:
+    """Periodically persists the state of a detection pipeline to disk.
+
+    A checkpoint holds the state of named pipeline components. Each component needs to
+    provide `get_state` and `set_state` methods. Checkpoints are written atomically, so
+    a crash while writing leaves the previous checkpoint intact.
+
+    Checkpoints should only be saved once a chunk of source data has been fully pushed
+    through the window and all detectors. At this point the source position and the
+    samples buffered in the window are consistent.
+
+    Args:
+        filename (str): Path of checkpoint file
+
+    Kwargs:
+        interval (float): Minimum stream time in seconds between two checkpoints
+        components (dict): Pipeline components by name, e.g source, window and detectors
+
+    """
+
+    VERSION = 3
+    """Version of the state layout, increased whenever component states change incompatibly.
+
+    1: Initial layout
+    2: ToneDetector state as per-tone arrays instead of a list of dicts
+    3: Per-channel states of ToneDetector and ToneSequenceDetector
+    """
+
+    def __init__(self, filename, interval=60., components=None):
+        self.filename = filename
+        self.interval = interval
+        self.components = components if components is not None else {}
+        self._last_saved = None
+
+    def update(self, t):
+        """Save a checkpoint when at least interval seconds of stream time t have passed since the last one.
+
+        Returns:
+            bool: True when a checkpoint was written.
+        """
+        if self._last_saved is None:
+            self._last_saved = t
+        if t - self._last_saved < self.interval:
+            return False
+        self.save()
+        self._last_saved = t
+        return True
+
+    def save(self):
+        """Atomically write the state of all components."""
+        state = {
+            'version': Checkpoint.VERSION,
+            'components': {k: c.get_state() for k, c in self.components.items()}
+        }
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".checkpoint-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.filename)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def restore(self):
+        """Restore the state of all components from the last checkpoint.
+
+        Returns:
+            bool: False when no checkpoint exists yet.
+        """
+        if not os.path.isfile(self.filename):
+            return False
+
+        with open(self.filename, "rb") as f:
+            state = pickle.load(f)
+
+        if state['version'] != Checkpoint.VERSION:
+            raise ValueError("Unsupported checkpoint version {} in '{}', expected version {}. Remove it to start from scratch".format(
+                state['version'], self.filename, Checkpoint.VERSION))
+
+        saved = state['components']
+        missing = set(self.components) - set(saved)
+        if missing:
+            raise ValueError("Checkpoint lacks state for {}".format(", ".join(sorted(missing))))
+
+        for k, c in self.components.items():
+            c.set_state(saved[k])
+        logger.info("Restored checkpoint from '{}'".format(self.filename))
+        return True
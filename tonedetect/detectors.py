@@ -1,123 +1,484 @@
-
+import math
 import numpy as np
 from sys import float_info
 from tonedetect.timespan import Timespan
+from tonedetect.kernels import update_channel_tone_states
 
 class FrequencyDetector(object):
-    """Compute the discrete Fourier transform of a discrete time signal and return the amplitudes of specific frequencies."""
+    """Compute the discrete Fourier transform of a discrete time signal and return the amplitudes of specific frequencies.
+
+    Amplitudes can be computed by one of the following engines, which yield the same values up to rounding.
+
+        rfft: Full real FFT of the window, from which the target bins are picked. Cost grows with N log N
+              for a window of N elements, independent of the number of target frequencies.
+        dft: Direct DFT of the target bins only, evaluated as one matrix product like a bank of Goertzel
+             filters. Cost grows with N times the number of target frequencies.
+        zoom: Chirp-z transform (scipy.signal.ZoomFFT) of the band between the lowest and highest target
+              bin. Requires three FFTs of at least N elements, so it rarely beats rfft in practice.
+
+    The full spectrum of the last update is available as fft_values for the rfft engine only. Other
+    engines do not compute it and leave fft_values None.
+
+    Kwargs:
+        method (str): One of 'rfft', 'dft', 'zoom' or 'auto'. Automatic selection picks the engine of least
+                      estimated cost (see FrequencyDetector.costs) once the window layout is known. Defaults
+                      to 'rfft'.
+    """
 
-    def __init__(self, freqs):
+    METHODS = ('rfft', 'dft', 'zoom')
+
+    def __init__(self, freqs, method='rfft'):
+        assert method == 'auto' or method in FrequencyDetector.METHODS, "Unknown method {}".format(method)
         self.frequencies = np.atleast_1d(freqs)
+        self.method = method
+        self.engine = None
         self.fft_values = None
+        self._fres = None
+        self._bins = None
+        self._layout = None
+        self._transform = None
+        self._weighted = None
+        self._amps = np.zeros(len(self.frequencies))
+
+    @staticmethod
+    def costs(ntotal, bins):
+        """Returns the estimated relative cost of each engine for a window of ntotal elements and the given target bins.
+
+        Weights were fitted to timings of numpy and scipy FFT and BLAS, see etc/benchmarks/frequency_engines.py.
+        """
+        nbins = len(bins)
+        span = int(np.max(bins) - np.min(bins)) + 1 if nbins > 0 else 1
+        # Chirp-z convolves by FFTs of a length covering input and output.
+        nczt = 2**(ntotal + span - 2).bit_length()
+        return {
+            'rfft': ntotal * math.log2(ntotal),
+            'dft': 1.25 * ntotal * nbins,
+            'zoom': 3 * nczt * math.log2(nczt) + 30000,
+        }
 
     def fft(self, wnd):
         data = wnd.values
         f, wndnorm = wnd.window_function
 
-        norm = (2 / len(data)) * wndnorm
+        norm = (2 / data.shape[-1]) * wndnorm
 
-        # Using real variant of the DFT as our input signal is purely real. 
+        if self._weighted is None or self._weighted.shape != data.shape:
+            self._weighted = np.empty(data.shape)
+        if self.fft_values is None or self.fft_values.shape[:-1] != data.shape[:-1]:
+            self.fft_values = np.empty(data.shape[:-1] + (data.shape[-1] // 2 + 1,))
+
+        # Using real variant of the DFT as our input signal is purely real.
         # The rfft method only computes the first half of the frequency spectrum (up to Nyquist frequency)
         # as by definition the second half will be a mirrored version of the first half for real valued signals,
-        # expecting a runtime improvement by a factor of 2.
-        
-        self.fft_values = norm * np.abs(np.fft.rfft(f * data))
+        # expecting a runtime improvement by a factor of 2. Multichannel data is transformed along the last axis.
+        np.multiply(f, data, out=self._weighted)
+        np.abs(np.fft.rfft(self._weighted, axis=-1), out=self.fft_values)
+        np.multiply(self.fft_values, norm, out=self.fft_values)
         return self.fft_values
 
     def f2b(self, fres, f):
         """Return floating point bin number for frequency."""
         return f / fres
 
+    def bins(self, fres):
+        """Return the integral bin numbers of all target frequencies."""
+        if fres != self._fres:
+            self._fres = fres
+            self._bins = np.rint(self.f2b(fres, self.frequencies)).astype(np.intp)
+        return self._bins
+
+    def _setup(self, wnd):
+        """Select engine and precompute its transform for the layout of the given window."""
+        data = wnd.values
+        bins = self.bins(wnd.fft_resolution)
+        self._layout = (data.shape, wnd.nsamples, wnd.sample_rate)
+        self._weighted = np.empty(data.shape)
+        self._amps = np.zeros(data.shape[:-1] + self.frequencies.shape)
+
+        engine = self.method
+        if engine == 'auto':
+            costs = FrequencyDetector.costs(wnd.ntotal, bins)
+            engine = min(costs, key=costs.get)
+        self.engine = engine
+        if engine != 'rfft':
+            # Not computed by other engines, so drop values of a previous layout.
+            self.fft_values = None
+
+        if engine == 'dft':
+            # Padding is zero, so only data samples contribute.
+            n = np.arange(wnd.nsamples)
+            self._transform = np.exp(-2j * np.pi * np.outer(n, bins) / wnd.ntotal)
+            self._spectrum = np.zeros(self._amps.shape, dtype=np.complex128)
+        elif engine == 'zoom':
+            import scipy.signal
+            lo, hi = int(np.min(bins)), int(np.max(bins))
+            fres = wnd.fft_resolution
+            self._transform = scipy.signal.ZoomFFT(wnd.nsamples, [lo * fres, (hi + 1) * fres], m=hi - lo + 1, fs=wnd.sample_rate, endpoint=False)
+            self._zoom_bins = bins - lo
+        else:
+            self._transform = None
+
     def update(self, wnd):
-        """Update frequencies from values given in window."""
-        y = self.fft(wnd)
-        amp = lambda f: y[int(round(self.f2b(wnd.fft_resolution, f)))]
-        amps = [amp(fb) for fb in self.frequencies]
-        return amps
-    
-class ToneDetector:  
+        """Update frequencies from values given in window.
+
+        Returns amplitudes laid out as channels x frequencies for multichannel windows.
+
+        Note:
+            The returned array is reused by subsequent calls.
+        """
+        if self._layout != (wnd.values.shape, wnd.nsamples, wnd.sample_rate):
+            self._setup(wnd)
+
+        if self.engine == 'rfft':
+            y = self.fft(wnd)
+            return np.take(y, self.bins(wnd.fft_resolution), axis=-1, out=self._amps)
+
+        f, wndnorm = wnd.window_function
+        norm = (2 / wnd.ntotal) * wndnorm
+        x = np.multiply(f[:wnd.nsamples], wnd.samples, out=self._weighted[..., :wnd.nsamples])
+        if self.engine == 'dft':
+            np.abs(np.matmul(x, self._transform, out=self._spectrum), out=self._amps)
+        else:
+            np.take(np.abs(self._transform(x, axis=-1)), self._zoom_bins, axis=-1, out=self._amps)
+        return np.multiply(self._amps, norm, out=self._amps)
+
+
+class ToneDetector:
+    """Detects tones from the amplitudes of their frequencies.
+
+    Multichannel detectors keep independent tone states per channel, which are evaluated
+    vectorized across all channels.
+
+    Per-window state updates run the plain Python kernel by default. Compiled kernels save a
+    few microseconds per window, but importing Numba and loading them delays the first update
+    by a few hundred milliseconds, which only pays off for long running streams. BatchScanner uses
+    compiled kernels regardless.
+
+    Kwargs:
+        use_kernels (bool): Whether or not per-window updates use compiled kernels, if Numba is available
+    """
 
     class ToneData:
-        pass     
+        """View of the state of a single tone of one channel, see ToneDetector.tone_data.
+
+        Attributes on, off and reported read from and assign to the state arrays of the detector.
+        Timespans returned are copies, so they need to be assigned to change the state.
+        """
+
+        def __init__(self, detector, channel, index):
+            self._d = detector
+            self._c = channel
+            self._i = index
+            self.sym = detector.syms[index]
+            self.ids = sorted(set(detector.ids[index].tolist()), key=detector.ids[index].tolist().index)
+
+        @property
+        def on(self):
+            return Timespan(float(self._d.on_start[self._c, self._i]), float(self._d.on_end[self._c, self._i]))
+
+        @on.setter
+        def on(self, tspan):
+            self._d.on_start[self._c, self._i] = tspan.start
+            self._d.on_end[self._c, self._i] = tspan.end
+
+        @property
+        def off(self):
+            return Timespan(float(self._d.off_start[self._c, self._i]), float(self._d.off_end[self._c, self._i]))
+
+        @off.setter
+        def off(self, tspan):
+            self._d.off_start[self._c, self._i] = tspan.start
+            self._d.off_end[self._c, self._i] = tspan.end
 
-    def __init__(self, tones, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.070, min_pause=0.070):
+        @property
+        def reported(self):
+            return bool(self._d.reported[self._c, self._i])
+
+        @reported.setter
+        def reported(self, value):
+            self._d.reported[self._c, self._i] = value
+
+    def __init__(self, tones, min_tone_amp=0.1, max_inter_tone_amp=0.1, min_presence=0.070, min_pause=0.070, nchannels=1, use_kernels=False):
         self.freqs = tones.all_tone_frequencies()
         self.min_presence = min_presence
         self.min_pause = min_pause
         self.min_tone_amp = min_tone_amp
         self.max_inter_tone_amp = max_inter_tone_amp
-        self.tone_data = []
-        for e in tones.items:
-            t = ToneDetector.ToneData()
-            # The ids of frequencies that need to be present in window
-            t.ids = [self.freqs.index(f) for f in e['f']]
-            # Accumulator for active tone state
-            t.on = Timespan()
-            # Accumulator for muted tone state
-            t.off = Timespan()
-            # Whether or not the tone still present has already been reported before.
-            t.reported = False
-            # Symbol to be reported
-            t.sym = e['sym']
-            self.tone_data.append(t)
+        self.nchannels = nchannels
+        self.use_kernels = use_kernels
+
+        # Symbols to be reported
+        self.syms = [e['sym'] for e in tones.items]
+        ntones = len(self.syms)
+
+        # The ids of frequencies that need to be present in window. Tones with fewer frequencies
+        # are padded by repeating their first frequency, which neither affects minimum nor maximum.
+        nmax = max([len(e['f']) for e in tones.items] + [1])
+        self.ids = np.zeros((ntones, nmax), dtype=np.intp)
+        for i, e in enumerate(tones.items):
+            ids = [self.freqs.index(f) for f in e['f']]
+            self.ids[i] = ids + [ids[0]] * (nmax - len(ids))
+
+        # Accumulators for active and muted tone states per channel and tone
+        shape = (nchannels, ntones)
+        self.on_start = np.zeros(shape)
+        self.on_end = np.zeros(shape)
+        self.off_start = np.zeros(shape)
+        self.off_end = np.zeros(shape)
+        # Whether or not the tone still present has already been reported before.
+        self.reported = np.zeros(shape, dtype=bool)
+
+        # Buffers reused across windows
+        self._tone_amps = np.zeros((nchannels, ntones, nmax))
+        self._min = np.zeros(shape)
+        self._range = np.zeros(shape)
+        self._active = np.zeros(shape, dtype=bool)
+        self._in_range = np.zeros(shape, dtype=bool)
+        self._new_ids = np.zeros(shape, dtype=np.intp)
+        self._counts = np.zeros(nchannels, dtype=np.intp)
+        self._new_tones = [[] for c in range(nchannels)]
+        self._onsets = [[] for c in range(nchannels)]
+        self._amplitudes = [[] for c in range(nchannels)]
+
+        self.onsets = self._onsets[0] if nchannels == 1 else self._onsets
+        """Start times of the tones returned by the last update."""
+        self.amplitudes = self._amplitudes[0] if nchannels == 1 else self._amplitudes
+        """Amplitudes of the tones returned by the last update, i.e. the minimum across their frequencies."""
+        self.channel_onsets = self._onsets
+        """Start times of the tones returned by the last update per channel, independent of the number of channels."""
+        self.channel_amplitudes = self._amplitudes
+        """Amplitudes of the tones returned by the last update per channel, independent of the number of channels."""
+
+    @property
+    def tone_data(self):
+        """Per-tone state of the first channel as list of ToneData views, kept for compatibility.
+
+        The state itself is held in arrays laid out as channels x tones, such as on_start and reported.
+        """
+        return [ToneDetector.ToneData(self, 0, i) for i in range(len(self.syms))]
 
     def update(self, wnd, amps):
-        """ Returns the list of active tones given the state of frequencies currently present in signal."""        
+        """ Returns the list of active tones given the state of frequencies currently present in signal.
+
+        For multichannel detectors amps are laid out as channels x frequencies and a list of tones
+        per channel is returned, see update_channels for a result independent of the number of channels.
+
+        Note:
+            The returned list is reused by subsequent calls.
+        """
+        tones = self.update_channels(wnd, amps)
+        return tones[0] if self.nchannels == 1 else tones
+
+    def update_channels(self, wnd, amps):
+        """ Like update, but always returns a list of tones per channel, also for single channel detectors.
+
+        Note:
+            The returned lists are reused by subsequent calls.
+        """
         tspan = wnd.timespan
-        new_tones = []
-        for d in self.tone_data:
-            
-            tone_amps = [amps[id] for id in d.ids]
-            tone_amp_active = [a >= self.min_tone_amp for a in tone_amps]
-            tone_amp_range = abs(np.max(tone_amps) - np.min(tone_amps))
-
-            if np.all(tone_amp_active) and tone_amp_range <= self.max_inter_tone_amp:
-                #print("{} - {}".format([amps[id] for id in data['ids']], self.tones[i]['sym']))
-                # All required frequencies for this tone are present
-                d.on.union(tspan)
-                if d.on.duration >= self.min_presence and not d.reported:
-                    # Even if tone stays active, won't be reported again before at least min_pause time has passed.
-                    new_tones.append(d.sym)
-                    d.reported = True
-                    d.off.reset()
+
+        amps = np.asarray(amps)
+        np.take(amps.reshape(self.nchannels, -1), self.ids, axis=1, out=self._tone_amps)
+        np.min(self._tone_amps, axis=2, out=self._min)
+        np.max(self._tone_amps, axis=2, out=self._range)
+        np.subtract(self._range, self._min, out=self._range)
+        np.greater_equal(self._min, self.min_tone_amp, out=self._active)
+        np.less_equal(self._range, self.max_inter_tone_amp, out=self._in_range)
+        np.logical_and(self._active, self._in_range, out=self._active)
+
+        update_states = update_channel_tone_states.compiled if self.use_kernels else update_channel_tone_states.python
+        update_states(
+            self._active, tspan.start, tspan.end,
+            self.on_start, self.on_end, self.off_start, self.off_end, self.reported,
+            self.min_presence, self.min_pause, self._new_ids, self._counts)
+
+        for c in range(self.nchannels):
+            new_tones = self._new_tones[c]
+            onsets = self._onsets[c]
+            amplitudes = self._amplitudes[c]
+            new_tones.clear()
+            onsets.clear()
+            amplitudes.clear()
+            for i in range(self._counts[c]):
+                tid = self._new_ids[c, i]
+                new_tones.append(self.syms[tid])
+                onsets.append(float(self.on_start[c, tid]))
+                amplitudes.append(float(self._min[c, tid]))
+
+        return self._new_tones
+
+    def skip(self, starts, ends):
+        """Advance tone states over consecutive windows in which no tone is active.
+
+        Produces the same state as calling update for each window with amplitudes below
+        min_tone_amp, without evaluating the windows one by one. No tones are reported by
+        such windows.
+
+        Args:
+            starts (array): Increasing start times of the skipped windows
+            ends (array): Increasing end times of the skipped windows
+        """
+        for new_tones, onsets, amplitudes in zip(self._new_tones, self._onsets, self._amplitudes):
+            new_tones.clear()
+            onsets.clear()
+            amplitudes.clear()
+        if len(starts) == 0:
+            return
+
+        # Only reported tones change state when inactive: their off accumulator grows until it
+        # exceeds min_pause, at which point they are cleared and stay unchanged afterwards.
+        for c, i in zip(*np.nonzero(self.reported)):
+            empty = self.off_start[c, i] == 0. and self.off_end[c, i] == 0.
+            off_start = starts[0] if empty else min(self.off_start[c, i], starts[0])
+            off_ends = ends if empty else np.maximum(self.off_end[c, i], ends)
+            cleared = np.flatnonzero(off_ends - off_start >= self.min_pause)
+            self.off_start[c, i] = off_start
+            if len(cleared) > 0:
+                self.off_end[c, i] = off_ends[cleared[0]]
+                self.reported[c, i] = False
+                self.on_start[c, i] = 0.
+                self.on_end[c, i] = 0.
             else:
-                # At least one required frequency is not present
-                if d.reported:
-                    d.off.union(tspan)
-                    if d.off.duration >= self.min_pause:
-                        d.reported = False
-                        d.on.reset()
-                
-        return new_tones
+                self.off_end[c, i] = off_ends[-1]
+
+    def get_state(self):
+        """Returns per-tone accumulators for checkpointing."""
+        return {
+            'on_start': self.on_start.copy(), 'on_end': self.on_end.copy(),
+            'off_start': self.off_start.copy(), 'off_end': self.off_end.copy(),
+            'reported': self.reported.copy()
+        }
+
+    def set_state(self, state):
+        """Restores per-tone accumulators from a checkpoint."""
+        assert state['reported'].shape == self.reported.shape, "Checkpoint does not match tones"
+        self.on_start[:] = state['on_start']
+        self.on_end[:] = state['on_end']
+        self.off_start[:] = state['off_start']
+        self.off_end[:] = state['off_end']
+        self.reported[:] = state['reported']
 
 class ToneSequenceDetector(object):
-    def __init__(self, max_tone_interval=1., min_sequence_length=2):
+    """Accumulates tones into sequences.
+
+    Multichannel detectors keep an independent sequence per channel.
+
+    Kwargs:
+        max_tone_interval (float): Maximum time between two tones so that both belong to the same sequence in seconds
+        min_sequence_length (int): Minimum number of tones of reported sequences
+        max_sequence_length (int): When given, sequences reaching this number of tones are reported immediately.
+                                   Bounds the memory held by pending sequences, e.g. on stuck tones.
+        nchannels (int): Number of channels
+    """
+
+    def __init__(self, max_tone_interval=1., min_sequence_length=2, max_sequence_length=None, nchannels=1):
+        assert max_sequence_length is None or max_sequence_length >= max(min_sequence_length, 1), "Maximum sequence length below minimum"
         self.max_tone_interval = max_tone_interval
         self.min_sequence_length = min_sequence_length
-        self.sequence = []
-        self.acc = Timespan()
-        
+        self.max_sequence_length = max_sequence_length
+        self.nchannels = nchannels
+        self.sequences = [[] for c in range(nchannels)]
+        self.accs = [Timespan() for c in range(nchannels)]
+        self._results = []
+
+    @property
+    def sequence(self):
+        """Pending sequence of first channel."""
+        return self.sequences[0]
+
+    @sequence.setter
+    def sequence(self, value):
+        self.sequences[0] = value
+
+    @property
+    def acc(self):
+        """Accumulated time span of pending sequence of first channel."""
+        return self.accs[0]
+
+    @acc.setter
+    def acc(self, value):
+        self.accs[0] = value
+
     def update(self, wnd, current_tones):
+        """Accumulate current tones and return a completed sequence with its time span or (None, None).
+
+        For multichannel detectors current_tones holds a list of tones per channel and a list
+        of (channel, sequence, timespan) tuples for all completed sequences is returned.
+
+        Without new tones, a pending sequence can only be flushed, and its outcome does not depend
+        on which window of a run without tones triggers the flush. Runs of windows without tones
+        can hence be skipped, updating with their last window only.
+
+        Note:
+            The list returned for multichannel detectors is reused by subsequent calls.
+        """
+        if self.nchannels == 1:
+            return self._update_channel(0, wnd.timespan, current_tones)
+        return self.update_channels(wnd, current_tones)
+
+    def update_channels(self, wnd, current_tones):
+        """Like update for multichannel detectors, independent of the number of channels.
+
+        Args:
+            wnd (Window): Current window
+            current_tones (list): List of tones per channel, e.g. as returned by ToneDetector.update_channels
+
+        Returns:
+            list: (channel, sequence, timespan) tuples of all completed sequences
+
+        Note:
+            The returned list is reused by subsequent calls.
+        """
+        tspan = wnd.timespan
+        results = self._results
+        results.clear()
+        for c in range(self.nchannels):
+            seq, seq_tspan = self._update_channel(c, tspan, current_tones[c])
+            if seq:
+                results.append((c, seq, seq_tspan))
+        return results
+
+    def _update_channel(self, c, tspan, current_tones):
         result_seq = None
         result_tspan = None
 
-        tspan = wnd.timespan
-        delta = tspan.start - self.acc.end
-        
-        if delta > self.max_tone_interval:
+        sequence = self.sequences[c]
+        acc = self.accs[c]
+        delta = tspan.start - acc.end
+        full = self.max_sequence_length is not None and len(sequence) >= self.max_sequence_length
+
+        if delta > self.max_tone_interval or full:
             # No tones detected in max inter tone interval, report what we have.
-            if len(self.sequence) >= self.min_sequence_length:
+            if len(sequence) >= self.min_sequence_length:
                 result_seq = []
-                result_seq.extend(self.sequence)
-                result_tspan = self.acc.copy()                       
-                
+                result_seq.extend(sequence)
+                result_tspan = acc.copy()
+
             # In any case we need to clear sequences and reset accumulator.
-            self.sequence.clear()
-            self.acc.reset()
-        
+            sequence.clear()
+            acc.reset()
+
         if len(current_tones) > 0:
-            self.acc.union(wnd.timespan)
-            self.sequence.extend(current_tones)                       
+            acc.union(tspan)
+            sequence.extend(current_tones)
+
+            full = self.max_sequence_length is not None and len(sequence) >= self.max_sequence_length
+            if full and result_seq is None:
+                # Force flush of sequences reaching their maximum length. When a sequence was
+                # already reported by this update, the flush happens on the next one.
+                result_seq = list(sequence)
+                result_tspan = acc.copy()
+                sequence.clear()
+                acc.reset()
 
         return result_seq, result_tspan
-    
\ No newline at end of file
+
+    def get_state(self):
+        """Returns the pending sequences for checkpointing."""
+        return {'sequences': [list(s) for s in self.sequences], 'accs': [(a.start, a.end) for a in self.accs]}
+
+    def set_state(self, state):
+        """Restores the pending sequences from a checkpoint."""
+        assert len(state['sequences']) == self.nchannels, "Checkpoint does not match channels"
+        self.sequences = [list(s) for s in state['sequences']]
+        self.accs = [Timespan(*a) for a in state['accs']]
@@ -1,17 +1,22 @@
 import numpy as np
-import scipy.io.wavfile 
 from datetime import datetime
 
 def read_audio(filename):
     """ Read audio file """
+    import scipy.io.wavfile
     sr, d = scipy.io.wavfile.read(filename)
     return sr, normalize_audio_by_bit_depth(d)
 
 def write_audio(filename, sample_rate, data):
     """ Write audio file """
+    import scipy.io.wavfile
     scaled = np.int16(data/np.max(np.abs(data)) * 32767)
     scipy.io.wavfile.write(filename, sample_rate, scaled)
 
+def deinterleave(data, nchannels):
+    """Convert interleaved samples of nchannels channels to a channels x samples array."""
+    return np.asarray(data).reshape(-1, nchannels).T
+
 def normalize_audio_by_bit_depth(data, dtype=np.float_):
     """Convert integral signal to [-1., 1.] using bit depth range of input type."""
 
@@ -0,0 +1,230 @@
+"""Per-window kernels of the detection pipeline.
+
+When Numba is installed the kernels are compiled to native code, otherwise they run as
+plain Python functions. Both variants produce identical results.
+"""
+
+import math
+import types
+import logging
+import functools
+import importlib.util
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+"""Whether or not kernels are compiled by Numba."""
+
+class Kernel:
+    """A function that is compiled by Numba in nopython mode on first call.
+
+    Importing Numba and compiling (or loading cached) machine code is deferred until a kernel
+    is first used, keeping startup fast for processes that never call compiled kernels.
+    Without Numba calls go to the plain Python function.
+    """
+
+    def __init__(self, fnc):
+        functools.update_wrapper(self, fnc)
+        self._fnc = fnc
+        self._python = None
+        self._compiled = None
+
+    def _bind(self, variant):
+        """Returns a copy of the function calling the given variant of all kernels it references."""
+        g = dict(self._fnc.__globals__)
+        for name in self._fnc.__code__.co_names:
+            if isinstance(g.get(name), Kernel):
+                g[name] = getattr(g[name], variant)
+        fnc = types.FunctionType(self._fnc.__code__, g, self._fnc.__name__, self._fnc.__defaults__)
+        fnc.__module__ = self._fnc.__module__
+        fnc.__qualname__ = self._fnc.__qualname__
+        return fnc
+
+    @property
+    def python(self):
+        """The plain Python variant."""
+        if self._python is None:
+            self._python = self._bind("python")
+        return self._python
+
+    @property
+    def compiled(self):
+        """The compiled variant or the plain Python one when Numba is not available."""
+        if self._compiled is None:
+            if HAS_NUMBA:
+                import numba
+                self._compiled = numba.njit(cache=True, nogil=True)(self._bind("compiled"))
+            else:
+                self._compiled = self.python
+        return self._compiled
+
+    def __call__(self, *args):
+        return self.compiled(*args)
+
+def jit(fnc):
+    """Wrap function into a Kernel compiled on first call."""
+    return Kernel(fnc)
+
+@jit
+def update_tone_states(active, start, end, on_start, on_end, off_start, off_end, reported, min_presence, min_pause, new_ids):
+    """Advance the on/off state machine of all tones by one window.
+
+    Time spans are stored array-backed as separate start and end arrays, where a span
+    having both start and end equal to zero is considered empty (see Timespan).
+
+    Args:
+        active (array): Whether all frequencies of a tone are present in the current window.
+        start (float): Start time of current window.
+        end (float): End time of current window.
+
+    Returns:
+        int: Number of newly detected tones, whose ids are written to the front of new_ids.
+    """
+    n = 0
+    for i in range(len(active)):
+        if active[i]:
+            # All required frequencies for this tone are present
+            if on_start[i] == 0. and on_end[i] == 0.:
+                on_start[i] = start
+                on_end[i] = end
+            else:
+                on_start[i] = min(on_start[i], start)
+                on_end[i] = max(on_end[i], end)
+
+            if on_end[i] - on_start[i] >= min_presence and not reported[i]:
+                # Even if tone stays active, won't be reported again before at least min_pause time has passed.
+                new_ids[n] = i
+                n += 1
+                reported[i] = True
+                off_start[i] = 0.
+                off_end[i] = 0.
+        elif reported[i]:
+            # At least one required frequency is not present
+            if off_start[i] == 0. and off_end[i] == 0.:
+                off_start[i] = start
+                off_end[i] = end
+            else:
+                off_start[i] = min(off_start[i], start)
+                off_end[i] = max(off_end[i], end)
+
+            if off_end[i] - off_start[i] >= min_pause:
+                reported[i] = False
+                on_start[i] = 0.
+                on_end[i] = 0.
+    return n
+
+@jit
+def update_channel_tone_states(active, start, end, on_start, on_end, off_start, off_end, reported, min_presence, min_pause, new_ids, counts):
+    """Advance the tone state machines of all channels by one window.
+
+    All state arrays are laid out as channels x tones. The number of newly detected tones per
+    channel is written to counts, their ids to the front of the corresponding row of new_ids.
+    """
+    for c in range(active.shape[0]):
+        counts[c] = update_tone_states(
+            active[c], start, end, on_start[c], on_end[c], off_start[c], off_end[c], reported[c],
+            min_presence, min_pause, new_ids[c])
+
+@jit
+def goertzel(x, bins, ntotal, out):
+    """Compute DFT magnitudes of x at the given integral bins of a ntotal point transform.
+
+    Samples beyond len(x) are treated as zero padding.
+    """
+    for j in range(len(bins)):
+        c = 2. * math.cos(2. * math.pi * bins[j] / ntotal)
+        s1 = 0.
+        s2 = 0.
+        for n in range(len(x)):
+            s0 = x[n] + c * s1 - s2
+            s2 = s1
+            s1 = s0
+        out[j] = math.sqrt(max(s1 * s1 + s2 * s2 - c * s1 * s2, 0.))
+
+@jit
+def emit_sequence(seq, seq_len, acc, out_ids, out_offsets, out_spans, nout):
+    """Append pending sequence seq[:seq_len] spanning acc to the output of scan_frames. Returns the new output count."""
+    o = out_offsets[nout]
+    out_ids[o:o + seq_len] = seq[:seq_len]
+    out_offsets[nout + 1] = o + seq_len
+    out_spans[nout, 0] = acc[0]
+    out_spans[nout, 1] = acc[1]
+    return nout + 1
+
+@jit
+def scan_frames(samples, nframes, nsamples, nhop, shift, sample_rate, wndfnc, norm, bins, ntotal,
+                ids, min_tone_amp, max_inter_tone_amp, min_presence, min_pause,
+                on_start, on_end, off_start, off_end, reported,
+                max_tone_interval, min_sequence_length, max_sequence_length, seq, seq_len, acc,
+                out_ids, out_offsets, out_spans):
+    """Run frequency, tone and sequence detection over a batch of overlapping frames.
+
+    Frame k covers samples[k*nhop : k*nhop + nsamples] and has window shift count shift + k.
+    Tone state arrays, the pending sequence seq[:seq_len] and its accumulated time span acc
+    are updated in place.
+
+    Detected sequences are written as tone ids to out_ids, where sequence i spans
+    out_ids[out_offsets[i]:out_offsets[i+1]] and out_spans[i] holds its start and end time.
+    A frame reports at most two sequences. A max_sequence_length of zero disables forced flushes.
+
+    Returns:
+        (int, int): Number of detected sequences and new length of pending sequence.
+    """
+    ntones = ids.shape[0]
+    x = np.empty(nsamples)
+    amps = np.empty(len(bins))
+    active = np.empty(ntones, dtype=np.bool_)
+    new_ids = np.empty(ntones, dtype=np.intp)
+
+    nout = 0
+    out_offsets[0] = 0
+    for k in range(nframes):
+        offset = k * nhop
+        for n in range(nsamples):
+            x[n] = samples[offset + n] * wndfnc[n]
+        goertzel(x, bins, ntotal, amps)
+
+        for i in range(ntones):
+            lo = amps[ids[i, 0]] * norm
+            hi = lo
+            for j in range(1, ids.shape[1]):
+                a = amps[ids[i, j]] * norm
+                lo = min(lo, a)
+                hi = max(hi, a)
+            active[i] = lo >= min_tone_amp and (hi - lo) <= max_inter_tone_amp
+
+        # Same arithmetic as Window.timespan to obtain bitwise identical times
+        start = ((shift + k) * nhop) / sample_rate
+        end = start + nsamples / sample_rate
+
+        nnew = update_tone_states(active, start, end, on_start, on_end, off_start, off_end, reported, min_presence, min_pause, new_ids)
+
+        flushed = False
+        if start - acc[1] > max_tone_interval or (max_sequence_length > 0 and seq_len >= max_sequence_length):
+            # No tones detected in max inter tone interval or sequence exceeded its maximum length, report what we have.
+            if seq_len >= min_sequence_length:
+                nout = emit_sequence(seq, seq_len, acc, out_ids, out_offsets, out_spans, nout)
+                flushed = True
+            seq_len = 0
+            acc[0] = 0.
+            acc[1] = 0.
+
+        if nnew > 0:
+            if acc[0] == 0. and acc[1] == 0.:
+                acc[0] = start
+                acc[1] = end
+            else:
+                acc[0] = min(acc[0], start)
+                acc[1] = max(acc[1], end)
+            seq[seq_len:seq_len + nnew] = new_ids[:nnew]
+            seq_len += nnew
+
+            if max_sequence_length > 0 and seq_len >= max_sequence_length and not flushed:
+                # Force flush of sequences reaching their maximum length, e.g. on stuck tones.
+                nout = emit_sequence(seq, seq_len, acc, out_ids, out_offsets, out_spans, nout)
+                seq_len = 0
+                acc[0] = 0.
+                acc[1] = 0.
+
+    return nout, seq_len
@@ -0,0 +1,31 @@
+import numpy as np
+
+def process_chunk(chunk, wnd, d_f, d_t, d_s):
+    """Push a chunk of samples through window, frequency, tone and sequence detection.
+
+    Returns:
+        list: (channel, sequence, Timespan) tuples of all sequences completed by the chunk.
+    """
+    events = []
+    for w in wnd.update(chunk):
+        events.extend(d_s.update_channels(w, d_t.update_channels(w, d_f.update(w))))
+    return events
+
+def flush_samples(wnd, d_s, flush=None):
+    """Returns silence that flushes pending sequences, by default twice the maximum tone interval long."""
+    flush = 2 * d_s.max_tone_interval if flush is None else flush
+    n = int(flush * wnd.sample_rate)
+    return np.zeros(n if wnd.nchannels == 1 else (wnd.nchannels, n), dtype=np.float_)
+
+def detect(parts, wnd, d_f, d_t, d_s, flush=None):
+    """Run the detection pipeline on an iterable of sample chunks and yield detected sequences.
+
+    Silence is processed after parts end to flush pending sequences, see flush_samples.
+
+    Yields:
+        (int, list, Timespan): Channel, detected sequence and its timespan.
+    """
+    for chunk in parts:
+        yield from process_chunk(chunk, wnd, d_f, d_t, d_s)
+    if flush is None or flush > 0:
+        yield from process_chunk(flush_samples(wnd, d_s, flush), wnd, d_f, d_t, d_s)
@@ -0,0 +1,291 @@
+import json
+import struct
+import asyncio
+import logging
+import itertools
+import numpy as np
+
+from tonedetect.sources import BaseSource
+from tonedetect.window import Window, Frame
+from tonedetect.detectors import FrequencyDetector, ToneDetector, ToneSequenceDetector
+
+logger = logging.getLogger(__name__)
+
+RTP_HEADER = struct.Struct("!BBHII")
+"""Layout of the 12 byte RTP header: flags, payload type, sequence number, timestamp and SSRC."""
+
+class Stream:
+    """Detection state of a single audio connection.
+
+    Samples received are queued until the server processes them in its next batch. The queue
+    is bounded by max_buffer samples, see Stream.full.
+    """
+
+    def __init__(self, stream_id, wnd, d_t, d_s, source_type, max_buffer):
+        self.id = stream_id
+        self.wnd = wnd
+        self.d_t = d_t
+        self.d_s = d_s
+        self.source = BaseSource(wnd.sample_rate)
+        self.source_type = source_type
+        self.max_buffer = max_buffer
+        self.frame = Frame()
+        self.pending = []
+        self.npending = 0
+        self.closed = False
+        self.last_seq = None
+        self.last_receive = 0.
+        self.packets_dropped = 0
+        self.packets_lost = 0
+
+    @property
+    def full(self):
+        """Whether or not the receive queue reached its bound."""
+        return self.npending >= self.max_buffer
+
+    def receive(self, data):
+        """Queue raw samples."""
+        self.push(self.source.decode(data, self.source_type))
+
+    def push(self, samples):
+        """Queue decoded samples."""
+        if len(samples) > 0:
+            self.pending.append(samples)
+            self.npending += len(samples)
+
+class DetectionServer:
+    """Tone detection for many concurrent audio connections on a single event loop.
+
+    TCP connections carry raw 16 bit little endian PCM, one stream per connection. UDP datagrams
+    carry a 12 byte RTP header followed by 16 bit PCM in network byte order (like RTP L16). They
+    are assigned to streams by their SSRC. All streams share sample rate and detector settings.
+
+    Received samples are queued per stream. Every batch interval the server cuts all queued
+    samples into frames and computes the spectra of all frames of all streams by a single FFT
+    over the stacked frames, before tone and sequence detection run per stream. Queues are
+    bounded: TCP connections stop reading, which pauses the transport and lets TCP flow control
+    throttle the sender, while UDP datagrams are dropped and counted.
+
+    Detected sequences are written as JSON lines to the output.
+
+    Args:
+        tones (Tones): Tone description
+        sample_rate (int): Sample rate of all streams in Hz
+        output: Text file to write detections to
+
+    Kwargs:
+        detector_args (dict): Keyword arguments of ToneDetector
+        sequence_args (dict): Keyword arguments of ToneSequenceDetector
+        max_buffer (float): Maximum duration of queued audio per stream in seconds
+        batch_interval (float): Time between two processing batches in seconds
+        udp_timeout (float): Time without datagrams after which a UDP stream is closed in seconds
+    """
+
+    def __init__(self, tones, sample_rate, output, detector_args=None, sequence_args=None,
+                 max_buffer=2., batch_interval=0.02, udp_timeout=5.):
+        self.tones = tones
+        self.sample_rate = sample_rate
+        self.output = output
+        self.detector_args = detector_args or {}
+        self.sequence_args = sequence_args or {}
+        self.max_buffer = int(max_buffer * sample_rate)
+        self.batch_interval = batch_interval
+        self.udp_timeout = udp_timeout
+
+        self.freqs = tones.all_tone_frequencies()
+        self.template = Window.tuned(sample_rate, self.freqs, power_of_2=True, wndtype=Window.Type.hanning)
+        self.bins = FrequencyDetector(self.freqs).bins(self.template.fft_resolution)
+        f, wndnorm = self.template.window_function
+        self.wndfnc = f
+        self.norm = (2 / self.template.ntotal) * wndnorm
+
+        self.streams = {}
+        self.nstreams = 0
+        self.nsequences = 0
+        self._ids = itertools.count(1)
+        self._wakeup = asyncio.Event()
+        self._servers = []
+        self._transports = []
+        self._handlers = set()
+        self._task = None
+        self._stopping = False
+
+    def open_stream(self, stream_id, source_type="int16"):
+        """Create detection state for a new stream."""
+        wnd = Window(self.template.nsamples, self.sample_rate, npads=self.template.npads,
+                     nhop=self.template.nhop, wndtype=Window.Type.hanning)
+        d_t = ToneDetector(self.tones, **self.detector_args)
+        d_s = ToneSequenceDetector(**self.sequence_args)
+        stream = Stream(stream_id, wnd, d_t, d_s, source_type, self.max_buffer)
+        self.streams[stream_id] = stream
+        self.nstreams += 1
+        logger.info("Stream {} opened".format(stream_id))
+        return stream
+
+    def close_stream(self, stream):
+        """Queue silence that flushes pending sequences and remove the stream with the next batch."""
+        stream.push(np.zeros(int(2 * stream.d_s.max_tone_interval * self.sample_rate)))
+        stream.closed = True
+        self._wakeup.set()
+
+    async def start(self, host="127.0.0.1", tcp_port=None, udp_port=None):
+        """Start listening. Ports of zero pick free ports, see DetectionServer.addresses."""
+        loop = asyncio.get_running_loop()
+        if tcp_port is not None:
+            self._servers.append(await asyncio.start_server(self._handle_tcp, host, tcp_port))
+        if udp_port is not None:
+            transport, protocol = await loop.create_datagram_endpoint(lambda: _RTPProtocol(self), local_addr=(host, udp_port))
+            self._transports.append(transport)
+        self._task = asyncio.ensure_future(self._run())
+
+    @property
+    def addresses(self):
+        """Returns the bound TCP and UDP addresses as dict."""
+        result = {}
+        for s in self._servers:
+            result['tcp'] = s.sockets[0].getsockname()[:2]
+        for t in self._transports:
+            result['udp'] = t.get_extra_info("sockname")[:2]
+        return result
+
+    async def stop(self):
+        """Stop listening, close all connections, flush all streams and process remaining samples."""
+        for s in self._servers:
+            s.close()
+        for t in self._transports:
+            t.close()
+        for stream in list(self.streams.values()):
+            if not stream.closed:
+                self.close_stream(stream)
+        # Handlers of idle connections wait in reading, so they are cancelled rather than left to the event loop.
+        handlers = list(self._handlers)
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        for s in self._servers:
+            await s.wait_closed()
+        if self._task:
+            # Cancelling could be swallowed by wait_for in the batch loop, so it is asked to return instead.
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+        self.process()
+
+    async def _handle_tcp(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        stream = self.open_stream("tcp:{}".format(next(self._ids)))
+        logger.info("Stream {} connected from {}".format(stream.id, peer))
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                while stream.full and not stream.closed:
+                    # Not reading lets the transport pause and TCP flow control throttle the sender.
+                    self._wakeup.set()
+                    await asyncio.sleep(self.batch_interval)
+                if stream.closed:
+                    # Closed by stopping the server
+                    break
+                # Read no more than fits into the queue, 16 bit per sample.
+                data = await reader.read(min(65536, max(2 * (stream.max_buffer - stream.npending), 2)))
+                if not data:
+                    break
+                stream.receive(data)
+                self._wakeup.set()
+        finally:
+            self._handlers.discard(task)
+            if not stream.closed:
+                self.close_stream(stream)
+            writer.close()
+
+    def receive_datagram(self, data):
+        """Queue samples of an RTP datagram, opening streams for unknown SSRCs."""
+        if len(data) < RTP_HEADER.size:
+            return
+        flags, ptype, seq, timestamp, ssrc = RTP_HEADER.unpack_from(data)
+        stream = self.streams.get("udp:{}".format(ssrc))
+        if stream is None:
+            stream = self.open_stream("udp:{}".format(ssrc), source_type=">i2")
+        stream.last_receive = asyncio.get_running_loop().time()
+
+        lost = 0
+        if stream.last_seq is not None:
+            lost = (seq - stream.last_seq - 1) % 65536
+            if lost >= 32768:
+                # Late or duplicate packet
+                return
+        # Packets dropped below are accounted for here, so they are not counted as lost later.
+        stream.last_seq = seq
+        if stream.full:
+            stream.packets_dropped += 1
+            return
+
+        if lost > 0:
+            # Keep stream time by replacing lost packets of the same size by silence, as far as the queue bound permits.
+            stream.packets_lost += lost
+            n = min(lost * ((len(data) - RTP_HEADER.size) // 2), stream.max_buffer - stream.npending)
+            stream.push(np.zeros(n))
+        stream.receive(data[RTP_HEADER.size:])
+        self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.batch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Let more samples arrive to fill the batch.
+            await asyncio.sleep(self.batch_interval)
+
+            now = loop.time()
+            for stream in list(self.streams.values()):
+                if stream.id.startswith("udp:") and not stream.closed and now - stream.last_receive > self.udp_timeout:
+                    self.close_stream(stream)
+            self.process()
+
+    def process(self):
+        """Run detection on the queued samples of all streams."""
+        frames = []
+        owners = []
+        for stream in self.streams.values():
+            if stream.npending == 0:
+                continue
+            for chunk in stream.pending:
+                for w in stream.wnd.update(chunk):
+                    frames.append(w.samples * self.wndfnc[:w.nsamples])
+                    owners.append((stream, w.timespan.copy()))
+            stream.pending = []
+            stream.npending = 0
+
+        if frames:
+            # Spectra of all frames across streams at once
+            spectra = np.abs(np.fft.rfft(np.array(frames), n=self.template.ntotal, axis=-1))
+            amps = spectra[:, self.bins] * self.norm
+            for (stream, tspan), a in zip(owners, amps):
+                stream.frame.timespan = tspan
+                seq, tspan = stream.d_s.update(stream.frame, stream.d_t.update(stream.frame, a))
+                if seq:
+                    self.emit(stream, seq, tspan)
+
+        for stream_id in [k for k, s in self.streams.items() if s.closed]:
+            stream = self.streams.pop(stream_id)
+            if stream.packets_dropped or stream.packets_lost:
+                logger.warning("Stream {} dropped {} and lost {} packets".format(stream.id, stream.packets_dropped, stream.packets_lost))
+            logger.info("Stream {} closed".format(stream.id))
+
+    def emit(self, stream, seq, tspan):
+        """Write a detected sequence to the output."""
+        self.nsequences += 1
+        self.output.write(json.dumps({
+            'stream': stream.id, 'sequence': "".join(str(e) for e in seq),
+            'start': round(tspan.start, 6), 'end': round(tspan.end, 6)}) + "\n")
+        self.output.flush()
+
+class _RTPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.receive_datagram(data)
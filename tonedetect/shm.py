@@ -0,0 +1,199 @@
+import time
+import logging
+import numpy as np
+from multiprocessing import shared_memory
+
+from tonedetect.sources import BaseSource
+
+logger = logging.getLogger(__name__)
+
+# Header fields stored as int64 in front of the ring
+_WRITE_POS, _CAPACITY, _CHANNELS, _SAMPLE_RATE, _CLOSED = range(5)
+_HEADER_SIZE = 8 * 8
+
+def _attach(name):
+    """Attach to existing shared memory without handing it to the resource tracker of this process.
+
+    Otherwise the tracker of every reader unlinks the memory when the reader exits.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+def _layout(shm, capacity, channels):
+    header = np.ndarray((8,), dtype=np.int64, buffer=shm.buf)
+    ring = np.ndarray((channels, capacity), dtype=np.float_, buffer=shm.buf, offset=_HEADER_SIZE)
+    return header, ring
+
+class SharedRingWriter:
+    """Publishes normalized samples to a ring buffer in shared memory.
+
+    A single decoder writes samples once, while any number of SharedRingSource readers in other
+    processes consume them. The writer never waits for readers: readers falling behind by more
+    than the ring capacity lose samples, which they detect and report.
+
+    The shared memory holds a header of int64 fields followed by the ring of float samples laid
+    out as channels x capacity. The header holds the total number of samples written so far,
+    which is published after the samples themselves.
+
+    Kwargs:
+        name (str): Name of the shared memory block. Generated when not given, see SharedRingWriter.name.
+        capacity (int): Number of samples per channel the ring holds
+        sample_rate (int): Sample rate in Hz
+        channels (int): Number of channels
+    """
+
+    def __init__(self, name=None, capacity=None, sample_rate=44100, channels=1):
+        capacity = int(capacity if capacity is not None else 10 * sample_rate)
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + 8 * capacity * channels)
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self._header, self._ring = _layout(self.shm, capacity, channels)
+        self._header[:] = 0
+        self._header[_CAPACITY] = capacity
+        self._header[_CHANNELS] = channels
+        self._header[_SAMPLE_RATE] = int(sample_rate)
+
+    @property
+    def samples_written(self):
+        """Total number of samples per channel written."""
+        return int(self._header[_WRITE_POS])
+
+    def write(self, samples):
+        """Append samples, overwriting the oldest ones."""
+        samples = np.asarray(samples).reshape(self.channels, -1)
+        n = samples.shape[-1]
+        pos = int(self._header[_WRITE_POS])
+        if n > self.capacity:
+            # Only the most recent samples fit.
+            samples = samples[:, n - self.capacity:]
+            pos += n - self.capacity
+        m = samples.shape[-1]
+        i = pos % self.capacity
+        first = min(m, self.capacity - i)
+        self._ring[:, i:i + first] = samples[:, :first]
+        self._ring[:, :m - first] = samples[:, first:]
+        self._header[_WRITE_POS] = pos + m
+
+    def feed(self, source):
+        """Write all parts of the given source and close the ring."""
+        for part in source.generate_parts():
+            self.write(part)
+        self.close()
+
+    def close(self):
+        """Mark the end of the stream. Readers stop once they consumed all samples."""
+        self._header[_CLOSED] = 1
+
+    def unlink(self):
+        """Release the shared memory. Attached readers keep their mapping."""
+        self._header = self._ring = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        self.unlink()
+
+class SharedRingSource(BaseSource):
+    """Reads samples published by a SharedRingWriter without copying them.
+
+    Every reader tracks its own read position. Parts are views of the shared ring, so they are
+    only valid until the writer wraps around to them. A reader whose lag exceeds the ring
+    capacity has lost samples: this is counted as overrun and the reader continues with the
+    oldest samples available. Parts that were overwritten while being processed are detected
+    once the next part is requested and counted as overrun as well.
+
+    Args:
+        name (str): Name of the shared memory block
+
+    Kwargs:
+        chunk_size (int): Maximum number of samples per part
+        from_start (bool): Start with the oldest samples available instead of the position at the time of attaching
+        poll_interval (float): Time in seconds to wait for new samples
+        raise_on_overrun (bool): Raise BufferError on overruns instead of skipping samples
+    """
+
+    def __init__(self, name, chunk_size=4096, from_start=False, poll_interval=0.005, raise_on_overrun=False):
+        self.shm = _attach(name)
+        header = np.ndarray((8,), dtype=np.int64, buffer=self.shm.buf)
+        capacity, channels = int(header[_CAPACITY]), int(header[_CHANNELS])
+        super().__init__(int(header[_SAMPLE_RATE]), channels=channels)
+        self._header, self._ring = _layout(self.shm, capacity, channels)
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+        self.raise_on_overrun = raise_on_overrun
+        self.overruns = 0
+        """Number of times samples were overwritten before or while being read."""
+        self.samples_lost = 0
+        """Number of samples per channel skipped due to overruns."""
+        self.max_lag = 0
+        """Maximum number of samples per channel the reader fell behind the writer."""
+        self._attached = int(header[_WRITE_POS])
+
+    @property
+    def lag(self):
+        """Number of samples per channel written but not yet read."""
+        return int(self._header[_WRITE_POS]) - self.samples_processed
+
+    def _overrun(self, pos, nlost):
+        if self.raise_on_overrun:
+            raise BufferError("Reader fell behind by more than the ring capacity at sample {}".format(pos))
+        self.overruns += 1
+        self.samples_lost += nlost
+        logger.warning("Reader overrun at sample {}, lost {} samples".format(pos, nlost))
+
+    def generate_parts(self):
+        header = self._header
+        written = int(header[_WRITE_POS])
+        if self.start_sample > 0:
+            pos = self.start_sample
+        elif self.from_start:
+            pos = max(0, written - self.capacity)
+        else:
+            pos = self._attached
+        self.samples_processed = pos
+
+        while True:
+            written = int(header[_WRITE_POS])
+            if written == pos:
+                if header[_CLOSED] and int(header[_WRITE_POS]) == pos:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+
+            self.max_lag = max(self.max_lag, written - pos)
+            oldest = written - self.capacity
+            if pos < oldest:
+                # Skip samples already overwritten.
+                self._overrun(pos, oldest - pos)
+                pos = oldest
+
+            i = pos % self.capacity
+            n = min(written - pos, self.capacity - i, self.chunk_size)
+            part = self._ring[:, i:i + n]
+            pos += n
+            self.samples_processed = pos
+            self.bytes_processed += part.nbytes
+            yield part[0] if self.channels == 1 else part
+
+            # The writer may have wrapped around onto the part while it was processed.
+            oldest = int(header[_WRITE_POS]) - self.capacity
+            if pos - n < oldest:
+                self._overrun(pos - n, min(oldest, pos) - (pos - n))
+
+    def close(self):
+        """Detach from shared memory."""
+        self._header = self._ring = None
+        self.shm.close()
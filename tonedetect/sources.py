@@ -1,5 +1,8 @@
 
 import subprocess as sp
+import threading
+import queue
+import time
 import numpy as np
 import logging
 from tonedetect import helpers
@@ -8,18 +11,53 @@ from urllib.parse import urlparse
 
 import shutil
 import os
+from collections import deque
 
 logger = logging.getLogger(__name__)
 
 class BaseSource(object):
-    def __init__(self, sample_rate):
+    def __init__(self, sample_rate, channels=1):
         self.sample_rate = sample_rate
+        self.channels = channels
         self.bytes_processed = 0
+        self.samples_processed = 0
+        self.start_sample = 0
+        self._pending = b""
+
+    def decode(self, data, dtype):
+        """Convert raw interleaved samples to normalized audio.
+
+        Multichannel audio is returned as channels x samples array. Incomplete trailing frames
+        are kept and prepended to the data of the next call.
+        """
+        data = self._pending + data
+        framesize = np.dtype(dtype).itemsize * self.channels
+        nbytes = len(data) - len(data) % framesize
+        self._pending = data[nbytes:]
+        audio = np.frombuffer(data[:nbytes], dtype=dtype)
+        if self.channels > 1:
+            audio = helpers.deinterleave(audio, self.channels)
+        self.samples_processed += audio.shape[-1]
+        return helpers.normalize_audio_by_bit_depth(audio)
+
+    def seek(self, sample):
+        """Start the next call to generate_parts at the given sample index."""
+        self.start_sample = int(sample)
+        self.samples_processed = int(sample)
+
+    def get_state(self):
+        """Returns the position of this source for checkpointing."""
+        return {'samples_processed': self.samples_processed, 'bytes_processed': self.bytes_processed}
+
+    def set_state(self, state):
+        """Restores the position of this source from a checkpoint."""
+        self.seek(state['samples_processed'])
+        self.bytes_processed = state['bytes_processed']
 
 class FFMPEGSource(BaseSource):  # pylint: disable=too-few-public-methods
 
-    def __init__(self, source, ffmpeg_binary="ffmpeg", sample_rate=44100, chunk_size=1024, reconnect=None):
-        super().__init__(sample_rate)
+    def __init__(self, source, ffmpeg_binary="ffmpeg", sample_rate=44100, chunk_size=1024, reconnect=None, channels=1):
+        super().__init__(sample_rate, channels=channels)
 
         self.ffmpeg = ffmpeg_binary
         if not os.path.isfile(ffmpeg_binary):
@@ -35,7 +73,7 @@ class FFMPEGSource(BaseSource):  # pylint: disable=too-few-public-methods
             "-f", "s16le",
             "-acodec", "pcm_s16le",
             "-ar", str(sample_rate),
-            "-ac", "1"
+            "-ac", str(channels)
         ]
 
         url = urlparse(source)
@@ -47,51 +85,376 @@ class FFMPEGSource(BaseSource):  # pylint: disable=too-few-public-methods
 
         self.command.append('-')
 
+    def seek_command(self):
+        """Returns the FFMPEG command line, seeking the input to start_sample if required."""
+        if self.start_sample == 0:
+            return self.command
+        # Input seeking is sample accurate for audio as FFMPEG decodes from the nearest seek point
+        # and discards everything before the requested position.
+        seconds = "{:.9f}".format(self.start_sample / self.sample_rate)
+        return [self.command[0], "-ss", seconds] + self.command[1:]
+
     def generate_parts(self):
         
-        proc = sp.Popen(self.command, stdout=sp.PIPE, shell=False)
+        proc = sp.Popen(self.seek_command(), stdout=sp.PIPE, shell=False)
+        try:
+            while True:
+                data = proc.stdout.read(self.chunk_size)
+                if not data:
+                    break
+                self.bytes_processed += getsizeof(data)
+                yield self.decode(data, "int16")
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            returncode = proc.wait()
+        if returncode != 0:
+            logger.warning("FFMPEG exited with code {}".format(returncode))
+
+class SupervisedFFMPEGSource(FFMPEGSource):
+    """Decodes audio by FFMPEG and restarts FFMPEG whenever it fails, e.g. on dropped network streams.
+
+    Parts of all FFMPEG runs are generated as one continuous stream, so that windows and
+    detectors fed by this source keep their state across restarts. Restarts are delayed by
+    exponential backoff, starting at backoff seconds and doubling up to max_backoff with every
+    consecutive failure. A run that generated samples for reset_after seconds or longer resets
+    the backoff.
+
+    Seekable sources, i.e. local files, continue at the first sample not yet generated and are
+    complete once FFMPEG exits successfully. Any exit of FFMPEG reading other sources is a
+    failure, as live streams are not expected to end.
+
+    The gap policy determines the samples generated for the time FFMPEG was down:
+        'continuous': None, the stream continues seamlessly
+        'silence': gap_duration seconds of silence
+        'downtime': Silence as long as the downtime, which keeps stream time in line with wall clock time
+    Silence longer than the maximum tone interval of sequence detection flushes pending sequences.
+
+    FFMPEG errors are drained from its stderr and logged. Recent ones are kept in stderr.
+
+    Args:
+        source (str): The audio input
+
+    Kwargs:
+        gap (str): Gap policy. Defaults to 'continuous' for seekable and 'downtime' for other sources.
+        gap_duration (float): Duration of silence of the 'silence' gap policy in seconds
+        max_restarts (int): Maximum number of consecutive failures restarted. Unlimited when None.
+        backoff (float): Delay of the first restart in seconds
+        max_backoff (float): Maximum delay of restarts in seconds
+        reset_after (float): Duration of a run generating samples in seconds that resets the backoff
+        seekable (bool): Whether or not restarts continue at the current position. Detected when None.
+        Remaining keyword arguments are passed to FFMPEGSource.
+    """
 
+    GAPS = ('continuous', 'silence', 'downtime')
+
+    def __init__(self, source, gap=None, gap_duration=1., max_restarts=None, backoff=0.5, max_backoff=30.,
+                 reset_after=10., seekable=None, **kwargs):
+        super().__init__(source, **kwargs)
+        self.seekable = os.path.isfile(source) if seekable is None else seekable
+        self.gap = gap or ('continuous' if self.seekable else 'downtime')
+        assert self.gap in self.GAPS, "Unknown gap policy '{}'".format(self.gap)
+        self.gap_duration = gap_duration
+        self.max_restarts = max_restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reset_after = reset_after
+        self.restarts = 0
+        """Number of times FFMPEG was restarted."""
+        self.downtime = 0.
+        """Total time in seconds between failures and the first samples of the restarted FFMPEG."""
+        self.gap_samples = 0
+        """Number of silent samples per channel generated in place of missing input."""
+        self.stderr = deque(maxlen=20)
+        """Recent lines FFMPEG wrote to stderr."""
+
+    def metrics(self):
+        """Returns a human readable report of supervision metrics."""
+        return "FFMPEG restarts {}, downtime {:.3f}s, silence inserted {:.3f}s".format(
+            self.restarts, self.downtime, self.gap_samples / self.sample_rate)
+
+    def _drain(self, stream):
+        for line in iter(stream.readline, b""):
+            line = line.decode("utf-8", errors="replace").rstrip()
+            self.stderr.append(line)
+            logger.warning("FFMPEG: {}".format(line))
+
+    def _silence(self, duration):
+        """Yields silence of the given duration in parts of at most one second, so that long outages need no large arrays."""
+        n = int(round(duration * self.sample_rate))
+        step = max(int(self.sample_rate), 1)
+        zeros = np.zeros(min(n, step) if self.channels == 1 else (self.channels, min(n, step)), dtype=np.float_)
+        while n > 0:
+            m = min(n, step)
+            self.gap_samples += m
+            yield zeros[..., :m]
+            n -= m
+
+    def generate_parts(self):
+        failures = 0
+        down_since = None
         while True:
-            data = proc.stdout.read(self.chunk_size)
-            if not data:
-                break
-            self.bytes_processed += getsizeof(data)
-            audio = np.fromstring(data, dtype="int16")
-            yield helpers.normalize_audio_by_bit_depth(audio)
-            
+            if self.seekable:
+                self.start_sample = self.samples_processed
+            # Every run starts at a frame boundary.
+            self._pending = b""
+            # Backoff is reset by the time samples were generated, not by the time FFMPEG ran.
+            began = None
+            proc = sp.Popen(self.seek_command(), stdout=sp.PIPE, stderr=sp.PIPE, shell=False)
+            drain = threading.Thread(target=self._drain, args=(proc.stderr,), daemon=True)
+            drain.start()
+            try:
+                while True:
+                    data = proc.stdout.read(self.chunk_size)
+                    if not data:
+                        break
+                    if began is None:
+                        began = time.monotonic()
+                    if down_since is not None:
+                        downtime = time.monotonic() - down_since
+                        self.downtime += downtime
+                        down_since = None
+                        if self.gap == 'downtime':
+                            yield from self._silence(downtime)
+                    self.bytes_processed += getsizeof(data)
+                    yield self.decode(data, "int16")
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                returncode = proc.wait()
+                drain.join()
+
+            if returncode == 0 and self.seekable:
+                return
+
+            now = time.monotonic()
+            if down_since is None:
+                down_since = now
+            if began is not None and now - began >= self.reset_after:
+                failures = 0
+            failures += 1
+            if self.max_restarts is not None and failures > self.max_restarts:
+                self.downtime += now - down_since
+                logger.error("FFMPEG failed {} times in a row with code {}, giving up".format(failures, returncode))
+                return
+            delay = min(self.backoff * 2 ** (failures - 1), self.max_backoff)
+            logger.warning("FFMPEG exited with code {} at sample {}, restarting in {:.2f}s".format(returncode, self.samples_processed, delay))
+            if self.gap == 'silence':
+                yield from self._silence(self.gap_duration)
+            time.sleep(delay)
+            self.restarts += 1
+
 class SilenceSource(BaseSource):
     """Generates silence for a desired duration. Useful to flush pending detector results once real input has ended."""
 
-    def __init__(self, duration, sample_rate):
-        super().__init__(sample_rate)
+    def __init__(self, duration, sample_rate, channels=1):
+        super().__init__(sample_rate, channels=channels)
         self.duration = duration
 
     def generate_parts(self):
-        zeros = np.zeros(int(self.duration * self.sample_rate), dtype=np.float_) 
+        n = int(self.duration * self.sample_rate)
+        zeros = np.zeros(n if self.channels == 1 else (self.channels, n), dtype=np.float_) 
         self.bytes_processed += zeros.nbytes
         yield zeros
 
 class InMemorySource(BaseSource):
+    """Provides samples from memory. Multichannel data is expected as channels x samples array."""
 
-    def __init__(self, data, sample_rate):
-        super().__init__(sample_rate)
+    def __init__(self, data, sample_rate, chunk_size=None):
+        data = np.asarray(data)
+        super().__init__(sample_rate, channels=1 if data.ndim == 1 else data.shape[0])
         self.data = data
+        self.chunk_size = chunk_size
 
     def generate_parts(self):
-        self.bytes_processed += self.data.nbytes
-        yield self.data
+        n = self.data.shape[-1]
+        step = n if self.chunk_size is None else self.chunk_size
+        for i in range(self.start_sample, n, max(step, 1)):
+            part = self.data[..., i:i+step]
+            self.bytes_processed += part.nbytes
+            self.samples_processed += part.shape[-1]
+            yield part
+
+class WAVSource(BaseSource):
+    """Provides samples of a WAV file without FFMPEG. The file is memory mapped and normalized chunk by chunk."""
+
+    def __init__(self, filename, chunk_size=65536):
+        import scipy.io.wavfile
+        sample_rate, self.data = scipy.io.wavfile.read(filename, mmap=True)
+        super().__init__(sample_rate, channels=1 if self.data.ndim == 1 else self.data.shape[1])
+        self.filename = filename
+        self.chunk_size = chunk_size
+
+    def generate_parts(self):
+        for i in range(self.start_sample, len(self.data), self.chunk_size):
+            part = self.data[i:i+self.chunk_size]
+            self.bytes_processed += part.nbytes
+            self.samples_processed += len(part)
+            part = part.T if self.channels > 1 else part
+            if part.dtype.kind == 'f':
+                yield np.asarray(part, dtype=np.float_)
+            else:
+                yield helpers.normalize_audio_by_bit_depth(part)
 
 class STDINSource(BaseSource):
 
-    def __init__(self, sample_rate=44100, chunk_size=1024, source_type="int16"):
-        super().__init__(sample_rate)
+    def __init__(self, sample_rate=44100, chunk_size=1024, source_type="int16", channels=1):
+        super().__init__(sample_rate, channels=channels)
         self.chunk_size = chunk_size
         self.source_type = source_type
 
     def generate_parts(self):
+        # Standard input cannot be seeked, so samples before start_sample are read and dropped.
+        skip = self.start_sample * np.dtype(self.source_type).itemsize * self.channels
+        while skip > 0:
+            data = stdin.buffer.read(min(skip, self.chunk_size))
+            if not data:
+                return
+            skip -= len(data)
+
         while True:
             data = stdin.buffer.read(self.chunk_size)
             if not data:
                 break
-            audio = np.fromstring(data, self.source_type)
-            yield helpers.normalize_audio_by_bit_depth(audio)
\ No newline at end of file
+            self.bytes_processed += len(data)
+            yield self.decode(data, self.source_type)
+
+class PrefetchSource(BaseSource):
+    """Reads parts of another source ahead on a background thread.
+
+    Reading from pipes and decoding release the GIL, so a reader thread keeps draining the
+    input while the consuming thread analyzes previous parts. Parts are copied into a bounded
+    pool of buffers that are reused, so at most depth parts are held in memory.
+
+    Note:
+        Yielded parts are views of pooled buffers, which are reused once the next part is requested.
+
+    Args:
+        source: Source to read from
+
+    Kwargs:
+        depth (int): Number of parts read ahead
+        drop_when_full (bool): When all buffers are in use, drop parts instead of blocking the
+                               reader. Keeps live inputs drained at the expense of lost audio.
+                               Dropped parts are replaced by silence of the same length, so that
+                               stream time and positions stay in line with the input.
+    """
+
+    def __init__(self, source, depth=8, drop_when_full=False):
+        super().__init__(source.sample_rate, channels=source.channels)
+        assert depth > 0, "Prefetch depth needs to be positive"
+        self.source = source
+        self.depth = depth
+        self.drop_when_full = drop_when_full
+        self.start_sample = source.start_sample
+        self.samples_processed = source.samples_processed
+
+        self.stall_time = 0.
+        """Time in seconds the consumer waited for parts."""
+        self.reader_stall_time = 0.
+        """Time in seconds the reader waited for free buffers."""
+        self.dropped_chunks = 0
+        """Number of parts dropped because all buffers were in use."""
+        self.dropped_samples = 0
+        """Number of samples of dropped parts."""
+        self.max_queue_depth = 0
+        """Maximum number of parts waiting for the consumer."""
+        self._filled = None
+
+    @property
+    def queue_depth(self):
+        """Number of parts currently waiting for the consumer."""
+        return self._filled.qsize() if self._filled is not None else 0
+
+    def seek(self, sample):
+        super().seek(sample)
+        self.source.seek(sample)
+
+    def set_state(self, state):
+        super().set_state(state)
+        self.source.set_state(state)
+
+    def metrics(self):
+        """Returns a human readable report of prefetch metrics."""
+        return "Prefetch queue depth {} (max {} of {}), consumer stalled {:.3f}s, reader stalled {:.3f}s, dropped {} chunks ({} samples)".format(
+            self.queue_depth, self.max_queue_depth, self.depth, self.stall_time, self.reader_stall_time,
+            self.dropped_chunks, self.dropped_samples)
+
+    def _read(self, free, filled, stop):
+        gap = 0
+        try:
+            for part in self.source.generate_parts():
+                if stop.is_set():
+                    return
+                part = np.asarray(part)
+                if self.drop_when_full:
+                    try:
+                        buf = free.get_nowait()
+                    except queue.Empty:
+                        self.dropped_chunks += 1
+                        self.dropped_samples += part.shape[-1]
+                        gap += part.shape[-1]
+                        continue
+                else:
+                    began = time.perf_counter()
+                    buf = None
+                    while buf is None:
+                        if stop.is_set():
+                            return
+                        try:
+                            buf = free.get(timeout=0.1)
+                        except queue.Empty:
+                            pass
+                    self.reader_stall_time += time.perf_counter() - began
+
+                n = part.shape[-1]
+                if buf.shape[:-1] != part.shape[:-1] or buf.shape[-1] < n:
+                    buf = np.empty(part.shape[:-1] + (max(n, buf.shape[-1]),), dtype=part.dtype)
+                np.copyto(buf[..., :n], part)
+                filled.put((buf, n, self.source.bytes_processed, gap))
+                gap = 0
+                self.max_queue_depth = max(self.max_queue_depth, filled.qsize())
+            if gap > 0:
+                filled.put((None, 0, self.source.bytes_processed, gap))
+            filled.put(None)
+        except Exception as e:
+            filled.put(e)
+
+    def _silence(self, n, buf):
+        """Yields n samples of silence in place of dropped parts, in parts no larger than buffers."""
+        step = max(buf.shape[-1] if buf is not None else 0, 4096)
+        zeros = np.zeros(min(n, step) if self.channels == 1 else (self.channels, min(n, step)))
+        while n > 0:
+            m = min(n, step)
+            self.samples_processed += m
+            yield zeros[..., :m]
+            n -= m
+
+    def generate_parts(self):
+        free = queue.Queue()
+        for i in range(self.depth):
+            free.put(np.empty((0,) if self.channels == 1 else (self.channels, 0)))
+        filled = self._filled = queue.Queue()
+        stop = threading.Event()
+        reader = threading.Thread(target=self._read, args=(free, filled, stop), name="prefetch", daemon=True)
+        reader.start()
+
+        try:
+            while True:
+                began = time.perf_counter()
+                item = filled.get()
+                self.stall_time += time.perf_counter() - began
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                buf, n, self.bytes_processed, gap = item
+                if gap > 0:
+                    yield from self._silence(gap, buf)
+                if buf is None:
+                    continue
+                self.samples_processed += n
+                yield buf[..., :n]
+                free.put(buf)
+        finally:
+            stop.set()
@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+STATES = ('queue', 'running', 'done', 'failed')
+
+def _write_json(filename, obj):
+    """Write JSON so that readers see either the previous or the complete new content."""
+    tmp = "{}.{}.tmp".format(filename, uuid.uuid4().hex)
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+def _read_json(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+class Job:
+    """A claimed unit of work, i.e. a single input file."""
+
+    def __init__(self, id, source, attempts, token):
+        self.id = id
+        self.source = source
+        self.attempts = attempts
+        self.token = token
+
+class Spool:
+    """Work queue in a directory shared by workers on any number of nodes, without a broker.
+
+    Every job is a small JSON file moving through the subdirectories queue, running, done and
+    failed. Only atomic operations of the filesystem are used for coordination: a worker claims
+    a job by renaming it from queue to running, which succeeds for exactly one of several
+    competing workers. The running file is named after a random token of the claim, and its
+    modification time is the lease, which the worker renews while processing. Ownership hence
+    never needs to be checked before acting: renewing touches the file of the claim, and
+    completing or failing a job starts by renaming it, both of which fail once it was taken
+    away from the claim.
+
+    Workers that crash or lose their node stop renewing their leases. Any worker requeues jobs
+    whose lease expired, so their work is picked up again. Jobs exceeding max_attempts claims
+    are moved to failed instead. A worker that merely stalled past its lease loses its claim,
+    and its result is discarded, so that a job ends up in either done or failed.
+
+    Lease expiry compares wall clock times of different nodes, which hence need clocks
+    synchronized well within the lease duration.
+
+    Args:
+        root (str): Spool directory. Subdirectories are created as required.
+
+    Kwargs:
+        lease (float): Time in seconds a claim stays valid without renewal
+        max_attempts (int): Maximum number of times a job is claimed before it is considered failed
+    """
+
+    def __init__(self, root, lease=60., max_attempts=3):
+        self.root = root
+        self.lease = lease
+        self.max_attempts = max_attempts
+        for state in STATES:
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    def path(self, state, job_id, ext=".json"):
+        """Returns the path of a job in the given state."""
+        return os.path.join(self.root, state, job_id + ext)
+
+    def _claimed(self, job, ext=".json"):
+        # Path of the running job while held by the given claim
+        return self.path("running", "{}.{}".format(job.id, job.token), ext)
+
+    def _running(self):
+        # Yields job id, extension and path of running jobs. Jobs being completed end in '.commit'.
+        folder = os.path.join(self.root, "running")
+        for f in sorted(os.listdir(folder)):
+            parts = f.rsplit(".", 2)
+            if len(parts) == 3 and parts[2] in ("json", "commit"):
+                yield parts[0], parts[2], os.path.join(folder, f)
+
+    def jobs(self, state):
+        """Returns the sorted ids of all jobs in the given state."""
+        if state == "running":
+            return [job_id for job_id, _, _ in self._running()]
+        return sorted(f[:-5] for f in os.listdir(os.path.join(self.root, state)) if f.endswith(".json"))
+
+    def counts(self):
+        """Returns the number of jobs per state as dict."""
+        return {state: len(self.jobs(state)) for state in STATES}
+
+    def enqueue(self, source):
+        """Add a job for the given input file.
+
+        Job ids are derived from absolute paths, so enqueuing a file twice has no effect as long
+        as the first job was not removed from the spool.
+
+        Returns:
+            str: Job id or None if the file is already known to the spool.
+        """
+        source = os.path.abspath(source)
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+        name = "".join(c if c.isalnum() or c in "-_." else "_" for c in os.path.basename(source))
+        job_id = "{}-{}".format(digest, name)
+        if any(os.path.exists(self.path(state, job_id)) for state in STATES) or job_id in self.jobs("running"):
+            return None
+        _write_json(self.path("queue", job_id), {'source': source, 'attempts': 0})
+        return job_id
+
+    def claim(self, worker):
+        """Claim the next queued job.
+
+        Returns:
+            Job: Claimed job or None if the queue is empty.
+        """
+        for job_id in self.jobs("queue"):
+            queued = self.path("queue", job_id)
+            job = Job(job_id, None, 0, uuid.uuid4().hex)
+            running = self._claimed(job)
+            try:
+                # The modification time starts the lease.
+                os.utime(queued)
+                os.rename(queued, running)
+            except FileNotFoundError:
+                # Another worker was faster
+                continue
+            desc = _read_json(running)
+            desc['attempts'] += 1
+            desc['worker'] = worker
+            _write_json(running, desc)
+            job.source = desc['source']
+            job.attempts = desc['attempts']
+            return job
+        return None
+
+    def owns(self, job):
+        """Whether or not the job is still held by the claim that returned it."""
+        return os.path.exists(self._claimed(job))
+
+    def renew(self, job):
+        """Extend the lease of a claimed job.
+
+        Returns:
+            bool: False if the job was requeued meanwhile and the lease is lost.
+        """
+        try:
+            os.utime(self._claimed(job))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _commit(self, job):
+        # Take the job from the claim for good. Returns the path it was moved to, or None if lost.
+        commit = self._claimed(job, ".commit")
+        try:
+            os.rename(self._claimed(job), commit)
+        except FileNotFoundError:
+            logger.warning("Claim of job '{}' was lost, discarding its outcome".format(job.id))
+            return None
+        # Writing the outcome gets a lease of its own.
+        os.utime(commit)
+        return commit
+
+    def complete(self, job, result):
+        """Store the result of a job and release it.
+
+        Returns:
+            bool: False if the job was requeued meanwhile and the result was discarded.
+        """
+        commit = self._commit(job)
+        if commit is None:
+            return False
+        _write_json(self.path("done", job.id), result)
+        os.remove(commit)
+        return True
+
+    def fail(self, job, error):
+        """Give up on a job, requeuing it unless it ran out of attempts."""
+        if job.attempts < self.max_attempts:
+            try:
+                os.rename(self._claimed(job), self.path("queue", job.id))
+            except FileNotFoundError:
+                pass
+            return
+        commit = self._commit(job)
+        if commit is None:
+            return
+        desc = _read_json(commit)
+        desc['error'] = str(error)
+        _write_json(self.path("failed", job.id), desc)
+        os.remove(commit)
+
+    def requeue_expired(self, now=None):
+        """Requeue jobs whose lease expired, or move them to failed when out of attempts.
+
+        Returns:
+            int: Number of jobs requeued or failed.
+        """
+        now = time.time() if now is None else now
+        n = 0
+        for job_id, ext, running in self._running():
+            try:
+                if os.path.getmtime(running) + self.lease > now:
+                    continue
+                if ext == "commit" and os.path.exists(self.path("done", job_id)):
+                    # The worker stored its result but crashed before releasing the job.
+                    os.remove(running)
+                    continue
+                desc = _read_json(running)
+                target = "failed" if desc['attempts'] >= self.max_attempts else "queue"
+                # Only one of several workers requeueing concurrently succeeds.
+                os.rename(running, self.path(target, job_id))
+            except (FileNotFoundError, ValueError):
+                continue
+            logger.warning("Lease of job '{}' expired, moved to {}".format(job_id, target))
+            n += 1
+        return n
+
+class Worker:
+    """Processes jobs of a spool until stopped.
+
+    Args:
+        spool (Spool): Spool to take jobs from
+        analyze: Callable taking the source path of a job and returning its JSON serializable result
+
+    Kwargs:
+        name (str): Name of the worker stored with leases and results. Defaults to host and process id.
+        poll_interval (float): Time in seconds to wait when the queue is empty
+    """
+
+    def __init__(self, spool, analyze, name=None, poll_interval=1.):
+        self.spool = spool
+        self.analyze = analyze
+        self.name = name or "{}:{}".format(socket.gethostname(), os.getpid())
+        self.poll_interval = poll_interval
+        self.ncompleted = 0
+        self.nfailed = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop after the current job."""
+        self._stop.set()
+
+    def run(self, exit_when_empty=False):
+        """Process jobs until stopped, or until neither queued nor running jobs remain when exit_when_empty is set."""
+        while not self._stop.is_set():
+            self.spool.requeue_expired()
+            job = self.spool.claim(self.name)
+            if job is not None:
+                self.process(job)
+            elif exit_when_empty and not self.spool.jobs("running"):
+                break
+            else:
+                self._stop.wait(self.poll_interval)
+
+    def process(self, job):
+        """Analyze the source of a claimed job while renewing its lease."""
+        logger.info("Worker {} processing '{}' (attempt {})".format(self.name, job.source, job.attempts))
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.spool.lease / 3):
+                if not self.spool.renew(job):
+                    logger.warning("Worker {} lost lease of job '{}'".format(self.name, job.id))
+                    return
+
+        t = threading.Thread(target=heartbeat, daemon=True)
+        t.start()
+        began = time.perf_counter()
+        try:
+            result = self.analyze(job.source)
+        except Exception as e:
+            logger.exception("Worker {} failed on '{}'".format(self.name, job.source))
+            self.spool.fail(job, e)
+            self.nfailed += 1
+            return
+        finally:
+            done.set()
+            t.join()
+
+        if self.spool.complete(job, {
+                'source': job.source, 'worker': self.name, 'attempts': job.attempts,
+                'elapsed': round(time.perf_counter() - began, 6), 'result': result}):
+            self.ncompleted += 1
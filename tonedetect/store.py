@@ -0,0 +1,212 @@
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from urllib.request import pathname2url
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sequences (
+    id INTEGER PRIMARY KEY,
+    stream TEXT,
+    file TEXT,
+    channel INTEGER NOT NULL,
+    sequence TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    detected REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tones (
+    id INTEGER PRIMARY KEY,
+    stream TEXT,
+    file TEXT,
+    channel INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    start REAL NOT NULL,
+    amplitude REAL NOT NULL,
+    detected REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sequences_sequence ON sequences (sequence, detected);
+CREATE INDEX IF NOT EXISTS sequences_detected ON sequences (detected);
+CREATE INDEX IF NOT EXISTS sequences_stream ON sequences (stream, start);
+CREATE INDEX IF NOT EXISTS tones_symbol ON tones (symbol, detected);
+CREATE INDEX IF NOT EXISTS tones_detected ON tones (detected);
+"""
+
+_INSERT = {
+    'sequences': "INSERT INTO sequences (stream, file, channel, sequence, start, end, detected) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    'tones': "INSERT INTO tones (stream, file, channel, symbol, start, amplitude, detected) VALUES (?, ?, ?, ?, ?, ?, ?)",
+}
+
+_STOP = object()
+
+def connect(filename, readonly=False):
+    """Open a detection database, creating its schema when required.
+
+    Databases opened read-only need to exist and are used as they are.
+    """
+    if readonly:
+        if not os.path.isfile(filename):
+            raise FileNotFoundError("No detection database at '{}'".format(filename))
+        return sqlite3.connect("file:{}?mode=ro".format(pathname2url(os.path.abspath(filename))), uri=True)
+    db = sqlite3.connect(filename)
+    # Write-ahead logging lets queries run while detections are inserted.
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+class DetectionStore:
+    """Persists detected sequences and tones in an SQLite database.
+
+    Rows are queued by the detection loop and inserted by a background thread in batched
+    transactions, so that adding a detection costs little more than appending to a queue. The
+    queue is bounded by max_pending rows: when the database cannot keep up, adding blocks
+    instead of growing memory.
+
+    Sequences are stored with stream and file they were detected in, their channel, the
+    sequence string and their start and end time in the stream. Tones are stored with their
+    symbol, onset time in the stream and amplitude. All rows carry the wall clock time of
+    detection in seconds since the epoch, which is indexed along with sequence strings and
+    tone symbols.
+
+    Args:
+        filename (str): Database file
+
+    Kwargs:
+        batch_size (int): Maximum number of rows inserted per transaction
+        flush_interval (float): Maximum time in seconds rows are queued before being inserted
+        max_pending (int): Maximum number of queued rows
+    """
+
+    def __init__(self, filename, batch_size=5000, flush_interval=1., max_pending=100000):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.nsequences = 0
+        """Number of sequences inserted."""
+        self.ntones = 0
+        """Number of tones inserted."""
+        self.error = None
+        """Exception raised by the writer thread, if any."""
+        # Create the schema before returning, so that queries can run right away.
+        connect(filename).close()
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name="DetectionStore", daemon=True)
+        self._thread.start()
+
+    def add_sequence(self, seq, tspan, channel=0, stream=None, file=None, detected=None):
+        """Queue a detected sequence for insertion."""
+        detected = time.time() if detected is None else detected
+        self._queue.put(('sequences', (stream, file, channel, "".join(str(e) for e in seq), tspan.start, tspan.end, detected)))
+
+    def add_tones(self, tones, onsets, amplitudes, channel=0, stream=None, file=None, detected=None):
+        """Queue tones, e.g. those returned by ToneDetector.update along with its onsets and amplitudes."""
+        if len(tones) == 0:
+            return
+        detected = time.time() if detected is None else detected
+        for sym, start, amp in zip(tones, onsets, amplitudes):
+            self._queue.put(('tones', (stream, file, channel, str(sym), start, amp, detected)))
+
+    def close(self):
+        """Insert all queued rows and stop the writer thread.
+
+        Raises:
+            sqlite3.Error: When the writer thread failed to insert rows.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run(self):
+        db = connect(self.filename)
+        stop = False
+        try:
+            while not stop:
+                rows = {'sequences': [], 'tones': []}
+                n = 0
+                deadline = None
+                while n < self.batch_size:
+                    try:
+                        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.)
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    rows[item[0]].append(item[1])
+                    n += 1
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+                if n > 0 and self.error is None:
+                    try:
+                        with db:
+                            for table, values in rows.items():
+                                if values:
+                                    db.executemany(_INSERT[table], values)
+                    except sqlite3.Error as e:
+                        # Keep draining the queue, so that the detection loop never blocks on it.
+                        logger.error("Failed to store detections in '{}': {}".format(self.filename, e))
+                        self.error = e
+                    else:
+                        self.nsequences += len(rows['sequences'])
+                        self.ntones += len(rows['tones'])
+        finally:
+            db.close()
+
+def query(filename, table="sequences", match=None, contains=None, stream=None, file=None, since=None, until=None, limit=None):
+    """Query stored detections, most recent first.
+
+    Args:
+        filename (str): Database file
+
+    Kwargs:
+        table (str): Either 'sequences' or 'tones'
+        match (str): Exact sequence string or tone symbol
+        contains (str): Substring of sequence strings or tone symbols. Cannot use indexes.
+        stream (str): Stream detections were made in
+        file (str): File detections were made in
+        since (float): Minimum detection time in seconds since the epoch
+        until (float): Maximum detection time in seconds since the epoch
+        limit (int): Maximum number of rows to return
+
+    Returns:
+        list: Rows as dicts
+    """
+    assert table in _INSERT, "Unknown table '{}'".format(table)
+    column = "sequence" if table == "sequences" else "symbol"
+    where = []
+    params = []
+    for cond, value in ((column + " = ?", match), ("instr(" + column + ", ?) > 0", contains),
+                        ("stream = ?", stream), ("file = ?", file),
+                        ("detected >= ?", since), ("detected <= ?", until)):
+        if value is not None:
+            where.append(cond)
+            params.append(value)
+    sql = "SELECT * FROM {}".format(table)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY detected DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    db = connect(filename, readonly=True)
+    db.row_factory = sqlite3.Row
+    try:
+        return [dict(r) for r in db.execute(sql, params)]
+    finally:
+        db.close()
@@ -0,0 +1,198 @@
+import re
+import os
+import difflib
+import inspect
+import itertools
+import logging
+import numpy as np
+from tonedetect.window import Frame
+from tonedetect.detectors import ToneDetector, ToneSequenceDetector
+
+logger = logging.getLogger(__name__)
+
+TONE_PARAMETERS = ('min_tone_amp', 'max_inter_tone_amp', 'min_presence', 'min_pause')
+"""Names of ToneDetector parameters that can be swept."""
+SEQUENCE_PARAMETERS = ('max_tone_interval', 'min_sequence_length', 'max_sequence_length')
+"""Names of ToneSequenceDetector parameters that can be swept."""
+PARAMETERS = TONE_PARAMETERS + SEQUENCE_PARAMETERS
+"""Names of all parameters that can be swept."""
+
+def defaults():
+    """Returns the default values of all parameters, as taken by the detectors themselves."""
+    values = {}
+    for cls, names in ((ToneDetector, TONE_PARAMETERS), (ToneSequenceDetector, SEQUENCE_PARAMETERS)):
+        signature = inspect.signature(cls.__init__).parameters
+        values.update({n: signature[n].default for n in names})
+    return values
+
+def expected_from_filename(filename):
+    """Returns the expected symbol string encoded in a test sample filename or None.
+
+    See etc/samples/dtmf_test/ReadMe.md for the naming scheme.
+    """
+    m = re.match(r'^([0-9A-DspPd]+).*\.wav', os.path.basename(filename))
+    if not m:
+        return None
+    expected = m.group(1)
+    expected = expected.replace('p', '#') # Hash
+    expected = expected.replace('s', '*') # Star
+    expected = expected.replace('P', '') # Long pause, ignored
+    expected = expected.replace('d', '') # Short pause, ignored
+    return expected
+
+def compute_amplitudes(wnd, d_f, parts):
+    """Run windowing and frequency detection and collect results.
+
+    Returns:
+        (array, array, array): Amplitudes laid out as windows x frequencies, window start and end times.
+    """
+    amps, starts, ends = [], [], []
+    for w in wnd.update(parts):
+        amps.append(d_f.update(w).copy())
+        tspan = w.timespan
+        starts.append(tspan.start)
+        ends.append(tspan.end)
+    return np.array(amps), np.array(starts), np.array(ends)
+
+def grid(**values):
+    """Returns the cartesian product of parameter values as dict of equally sized arrays.
+
+    A max_sequence_length of None, i.e. unbounded sequences, is represented as infinity.
+    Combinations of a maximum sequence length below the minimum one are left out.
+    """
+    names = [n for n in PARAMETERS if n in values]
+    combos = list(itertools.product(*[_floats(values[n]) for n in names]))
+    if 'max_sequence_length' in names:
+        lo = defaults()['min_sequence_length']
+        i = names.index('max_sequence_length')
+        j = names.index('min_sequence_length') if 'min_sequence_length' in names else None
+        combos = [c for c in combos if c[i] >= max(lo if j is None else c[j], 1)]
+    return {n: np.array([c[i] for c in combos], dtype=np.float_) for i, n in enumerate(names)}
+
+def _floats(value):
+    """Returns parameter values as float array, representing None as infinity."""
+    return np.array([np.inf if v is None else v for v in np.atleast_1d(np.array(value, dtype=object))], dtype=np.float_)
+
+def _sequences(events, starts, ends, max_tone_interval, min_sequence_length, max_sequence_length):
+    """Returns the sequences a ToneSequenceDetector reports for tones detected in the given windows.
+
+    Args:
+        events (list): (window index, tones) tuples of all windows with new tones in ascending order
+    """
+    d_s = ToneSequenceDetector(max_tone_interval, min_sequence_length, max_sequence_length)
+    frame = Frame()
+    results = []
+    last = -1
+    for k, tones in events + [(len(starts), None)]:
+        # See ToneSequenceDetector.update on skipping windows without tones.
+        for i, current in ((k - 1, []), (k, tones)):
+            if i <= last or current is None:
+                continue
+            frame.timespan.start = starts[i]
+            frame.timespan.end = ends[i]
+            seq, tspan = d_s.update(frame, current)
+            if seq:
+                results.append("".join(str(e) for e in seq))
+        last = k
+    return results
+
+def sweep(tones, amps, starts, ends, params, expected=None):
+    """Evaluate tone and sequence detection for many parameter sets in one pass over the windows.
+
+    The tone state machine of ToneDetector is evaluated vectorized across all parameter sets,
+    yielding the same tones a ToneDetector configured with each set would report. Sequences
+    are then formed from these tones per parameter set, visiting only windows with new tones
+    and the last window before each of them.
+
+    Args:
+        tones (Tones): Tone description
+        amps (array): Amplitudes of all frequencies of tones.all_tone_frequencies() laid out as windows x frequencies
+        starts (array): Start time of each window
+        ends (array): End time of each window
+        params (dict): Parameter values by name, see PARAMETERS and grid. Missing parameters take detector defaults.
+
+    Kwargs:
+        expected (str): When given, reported sequences are compared to this symbol string.
+
+    Returns:
+        list: A dict per parameter set holding parameters, detected tone symbols, reported sequences and,
+              when expected is given, number of matches, false positives, misses and accuracy of the
+              symbols of all reported sequences. The delay is the mean time between tone onset and its
+              detection.
+    """
+    values = defaults()
+    values.update(params)
+    nsets = max([len(np.atleast_1d(v)) for v in params.values()] + [1])
+    p = {n: np.broadcast_to(_floats(values[n]), (nsets,))[:, None] for n in PARAMETERS}
+
+    freqs = tones.all_tone_frequencies()
+    syms = [e['sym'] for e in tones.items]
+    ntones = len(syms)
+
+    # Amplitude range of each tone's frequencies per window, computed like ToneDetector.
+    tone_min = np.zeros((len(amps), ntones))
+    tone_range = np.zeros((len(amps), ntones))
+    for i, e in enumerate(tones.items):
+        ta = amps[:, [freqs.index(f) for f in e['f']]]
+        lo = np.min(ta, axis=1)
+        tone_min[:, i] = lo
+        tone_range[:, i] = np.max(ta, axis=1) - lo
+
+    shape = (nsets, ntones)
+    on_start, on_end = np.zeros(shape), np.zeros(shape)
+    off_start, off_end = np.zeros(shape), np.zeros(shape)
+    reported = np.zeros(shape, dtype=bool)
+
+    detected = [[] for i in range(nsets)]
+    delays = [[] for i in range(nsets)]
+    events = [[] for i in range(nsets)]
+
+    for k in range(len(amps)):
+        start, end = starts[k], ends[k]
+        active = (tone_min[k] >= p['min_tone_amp']) & (tone_range[k] <= p['max_inter_tone_amp'])
+
+        # All required frequencies present: extend on accumulator
+        empty = (on_start == 0.) & (on_end == 0.)
+        on_start = np.where(active, np.where(empty, start, np.minimum(on_start, start)), on_start)
+        on_end = np.where(active, np.where(empty, end, np.maximum(on_end, end)), on_end)
+        new = active & ~reported & (on_end - on_start >= p['min_presence'])
+        reported |= new
+        off_start[new] = 0.
+        off_end[new] = 0.
+
+        # Previously reported tone no longer present: extend off accumulator
+        muted = ~active & reported
+        empty = (off_start == 0.) & (off_end == 0.)
+        off_start = np.where(muted, np.where(empty, start, np.minimum(off_start, start)), off_start)
+        off_end = np.where(muted, np.where(empty, end, np.maximum(off_end, end)), off_end)
+        cleared = muted & (off_end - off_start >= p['min_pause'])
+        reported &= ~cleared
+        on_start[cleared] = 0.
+        on_end[cleared] = 0.
+
+        if new.any():
+            for s, t in zip(*np.nonzero(new)):
+                detected[s].append(syms[t])
+                delays[s].append(end - on_start[s, t])
+                if not events[s] or events[s][-1][0] != k:
+                    events[s].append((k, []))
+                events[s][-1][1].append(syms[t])
+
+    results = []
+    for s in range(nsets):
+        r = {n: float(p[n][s, 0]) for n in TONE_PARAMETERS + ('max_tone_interval',)}
+        r['min_sequence_length'] = int(p['min_sequence_length'][s, 0])
+        r['max_sequence_length'] = int(p['max_sequence_length'][s, 0]) if np.isfinite(p['max_sequence_length'][s, 0]) else None
+        r['detected'] = "".join(str(e) for e in detected[s])
+        r['sequences'] = _sequences(events[s], starts, ends, *[r[n] for n in SEQUENCE_PARAMETERS])
+        r['delay'] = float(np.mean(delays[s])) if delays[s] else None
+        if expected is not None:
+            reported = "".join(r['sequences'])
+            matcher = difflib.SequenceMatcher(None, expected, reported, autojunk=False)
+            matches = sum(b.size for b in matcher.get_matching_blocks())
+            r['matches'] = matches
+            r['false_positives'] = len(reported) - matches
+            r['misses'] = len(expected) - matches
+            r['accuracy'] = matches / len(expected) if expected else 1.
+        results.append(r)
+    return results
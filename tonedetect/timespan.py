@@ -4,6 +4,8 @@ from sys import float_info
 class Timespan:
     """ A time span represented by two time points. """
 
+    __slots__ = ('start', 'end')
+
     def __init__(self, start=0., end=0.):
         self.start = start
         self.end = end
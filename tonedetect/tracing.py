@@ -0,0 +1,87 @@
+import time
+import bisect
+import logging
+from collections import deque
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class LatencyTracer:
+    """Measures end-to-end latency from sample ingress to detection egress.
+
+    Every chunk entering the pipeline is timestamped together with the stream position of
+    its last sample. When a detection is reported, its latency is the wall time elapsed
+    since the chunk holding the onset of the detected signal arrived. This includes the
+    algorithmic delay of windowing and detection thresholds as well as processing time.
+
+    Args:
+        sample_rate (float): Sample rate of stream in Hz
+
+    Kwargs:
+        horizon (float): Stream time in seconds for which chunk timestamps are kept. Detections
+                         with onsets further in the past are not measured.
+        clock (callable): Returns the current wall time in seconds.
+        history (int): Number of most recent latencies per kind kept for percentiles.
+    """
+
+    def __init__(self, sample_rate, horizon=600., clock=time.perf_counter, history=10000):
+        self.sample_rate = sample_rate
+        self.horizon = horizon
+        self.clock = clock
+        self.history = history
+        self.latencies = {}
+        self.counts = {}
+        self._ends = []
+        self._times = []
+        self._head = 0
+        self._nsamples = 0
+        self._forgotten = 0
+
+    def ingress(self, nsamples):
+        """Record that the next nsamples samples have arrived."""
+        self._nsamples += nsamples
+        self._ends.append(self._nsamples)
+        self._times.append(self.clock())
+
+        # Forget chunks beyond the horizon, compacting the lists once half of them are stale.
+        oldest = self._nsamples - self.horizon * self.sample_rate
+        while self._head < len(self._ends) - 1 and self._ends[self._head] < oldest:
+            self._forgotten = self._ends[self._head]
+            self._head += 1
+        if self._head > len(self._ends) // 2:
+            del self._ends[:self._head]
+            del self._times[:self._head]
+            self._head = 0
+
+    def egress(self, t, kind="sequence"):
+        """Record a detection whose signal started at stream time t in seconds.
+
+        Returns:
+            float: Measured latency in seconds or None when t is beyond the horizon.
+        """
+        sample = int(t * self.sample_rate)
+        if sample < self._forgotten:
+            return None
+        i = bisect.bisect_right(self._ends, sample, lo=self._head)
+        if i == len(self._ends):
+            return None
+        latency = self.clock() - self._times[i]
+        self.latencies.setdefault(kind, deque(maxlen=self.history)).append(latency)
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        return latency
+
+    def percentiles(self, kind="sequence", q=(50, 90, 99)):
+        """Returns latency percentiles of recent detections in seconds or None when nothing was measured."""
+        values = self.latencies.get(kind)
+        if not values:
+            return None
+        return np.percentile(values, q)
+
+    def summary(self):
+        """Returns a human readable latency report."""
+        parts = []
+        for kind in sorted(self.latencies):
+            p50, p90, p99 = self.percentiles(kind)
+            parts.append("{} latency over {} detections p50 {:.3f}s, p90 {:.3f}s, p99 {:.3f}s".format(
+                kind, self.counts[kind], p50, p90, p99))
+        return "; ".join(parts) if parts else "No latencies measured"
@@ -14,18 +14,23 @@ class Window:
 
     Each window holds list of data samples and additional zero samples for padding.
     Once enough samples have been provided, the window will yield itself allowing for 
-    any postprocessing on the current values before the window will shift by an amount
-    corresponding to 50 percent overlap.
+    any postprocessing on the current values before the window will shift by the hop size,
+    which defaults to an amount corresponding to 50 percent overlap.
 
     Windows additionally hold a window function that can be used reduce the effects of
     truncated time signals when applying the FFT.
 
+    Multichannel windows buffer all channels together. Their values are laid out as a
+    channels x samples array and they are updated by arrays of the same layout.
+
     Args: 
         nsamples (int): Number of data samples. Even numbers required
         sample_rate (float): Number of samples per second (Hz)
 
     Kwargs:
         npads (int): Number of zero paddings
+        nhop (int): Number of samples to shift the window by. Defaults to nsamples / 2
+        nchannels (int): Number of channels. Single channel windows hold one dimensional values
         wndtype (Window.Type): Type of window function to provide
         dtype: Data type of sample values
 
@@ -43,9 +48,11 @@ class Window:
         hanning = 1   
         """Von Hanning window shape."""
 
-    def __init__(self, nsamples, sample_rate, npads=0, wndtype=Type.rectangle, dtype=np.float_):        
+    def __init__(self, nsamples, sample_rate, npads=0, nhop=None, nchannels=1, wndtype=Type.rectangle, dtype=np.float_):        
         
         assert nsamples % 2 == 0, "Even window size expected"
+        nhop = nsamples // 2 if nhop is None else int(nhop)
+        assert 0 < nhop <= nsamples, "Hop size needs to be within (0, nsamples]"
 
         self.nsamples = int(nsamples)
         """Number of data samples."""
@@ -56,6 +63,12 @@ class Window:
         self.ntotal = nsamples + npads
         """Total number of elements."""
 
+        self.nhop = nhop
+        """Number of samples the window shifts by."""
+
+        self.nchannels = int(nchannels)
+        """Number of channels."""
+
         self.sample_rate = sample_rate
         """Sample rate in Hz."""
 
@@ -67,12 +80,18 @@ class Window:
 
         self.fft_resolution = self.sample_rate / self.ntotal
         """Frequency resolution in Hz including data padding."""
+
+        self.hop_time = self.nhop / self.sample_rate
+        """Temporal shift between two consecutive windows in seconds."""
+
+        self.latency = (self.nsamples + self.nhop) / self.sample_rate
+        """Worst case time in seconds from a signal onset until the first window completely covering it is full."""
         
-        self._values = np.zeros(self.ntotal, dtype)
+        shape = (self.ntotal,) if self.nchannels == 1 else (self.nchannels, self.ntotal)
+        self._values = np.zeros(shape, dtype)
         self._shifts = 0
         self._idx = 0
-        self._nsamples_half = int(nsamples / 2)
-        self._half_temp_res = self.temporal_resolution / 2
+        self._tspan = Timespan()
 
         self._wndfnc = {
             Window.Type.rectangle: lambda: np.full(nsamples, 1, dtype=dtype),
@@ -101,14 +120,48 @@ class Window:
     @property
     def samples(self):
         """Returns the list of data elements excluding zero padding elements."""
-        return self._values[:self.nsamples]
+        return self._values[..., :self.nsamples]
 
     @property
     def timespan(self):
-        """Returns the timespan this window covers."""
-        center = self._half_temp_res + self._shifts * self._half_temp_res
-        return Timespan(start=center - self._half_temp_res, end=center + self._half_temp_res)
+        """Returns the timespan this window covers.
+
+        Note:
+            The returned Timespan is owned by the window and updated in place on every access.
+            Use Timespan.copy when it needs to outlive the current window.
+            Times are derived from the integer sample position of the window, so they do not
+            accumulate rounding errors on long running streams.
+        """
+        start = (self._shifts * self.nhop) / self.sample_rate
+        self._tspan.start = start
+        self._tspan.end = start + self.nsamples / self.sample_rate
+        return self._tspan
+
+    def get_state(self):
+        """Returns buffered samples and shift count for checkpointing."""
+        return {'values': self._values[..., :self._idx].copy(), 'idx': self._idx, 'shifts': self._shifts}
+
+    def set_state(self, state):
+        """Restores buffered samples and shift count from a checkpoint."""
+        idx = state['idx']
+        assert idx <= self.nsamples, "Checkpoint does not match window size"
+        self._values[:] = 0
+        self._values[..., :idx] = state['values']
+        self._idx = idx
+        self._shifts = state['shifts']
             
+    def load(self, samples, shifts):
+        """Fill the window with the frame of samples starting at shift count shifts.
+
+        Allows evaluating frames out of the regular update order. Buffered samples are replaced,
+        so use get_state and set_state to continue regular updates afterwards.
+        """
+        self._values[..., :self.nsamples] = samples
+        self._values[..., self.nsamples:] = 0
+        self._idx = self.nsamples
+        self._shifts = shifts
+        return self
+
     def update(self, data):
         """Update with samples.
 
@@ -128,12 +181,13 @@ class Window:
             self: The next full Window.
 
         """
-        nsamples_input = len(samples)
+        samples = np.asarray(samples)
+        nsamples_input = samples.shape[-1]
         idx_input = 0
         while nsamples_input > 0:
             nleft = self.nsamples - self._idx
             nconsume = min(nleft, nsamples_input)
-            self._values[self._idx : self._idx + nconsume] = samples[idx_input : idx_input + nconsume]
+            self._values[..., self._idx : self._idx + nconsume] = samples[..., idx_input : idx_input + nconsume]
             
             self._idx += nconsume
             idx_input += nconsume
@@ -142,12 +196,13 @@ class Window:
             if self._idx == self.nsamples:
                 # Invoke callback and shift window
                 yield self
-                self._values[:self._nsamples_half] = self._values[self._nsamples_half : self.nsamples]
-                self._idx = self._nsamples_half
+                nkeep = self.nsamples - self.nhop
+                self._values[..., :nkeep] = self._values[..., self.nhop : self.nsamples]
+                self._idx = nkeep
                 self._shifts += 1
         
     @staticmethod
-    def tuned(sample_rate, freqs, min_fres=None, power_of_2=False, use_padding=True, wndtype=Type.rectangle, dtype=np.float_):
+    def tuned(sample_rate, freqs, min_fres=None, power_of_2=False, use_padding=True, max_latency=None, nchannels=1, wndtype=Type.rectangle, dtype=np.float_):
         """ Tunes a window settings for the given parameters.
 
         Args:
@@ -159,6 +214,10 @@ class Window:
                               When not specified, it is automatically calculated as the minimum frequency step / 2 from target frequencies
             power_of_2 (bool): Whether or not the size of the returned window should be a power of 2. 
             use_padding (bool): Whether or not to use zero padding (true) or data samples (false) to fill up to the next power of 2.
+            max_latency (float): When given the latency budget in seconds (see Window.latency). The hop size is reduced
+                                 below 50 percent of the window until the budget is met. Raises ValueError when the
+                                 required frequency resolution cannot be achieved within the budget.
+            nchannels (int): Number of channels to buffer.
             wndtype (Window.Type): Which type of window function to use.
             dtype (Window.Type): Data type of data samples.
         """
@@ -169,7 +228,8 @@ class Window:
         
         logger.info("Tuning window size for frequencies {}".format(", ".join([str(e) for e in freqs])))
 
-        if min_fres is None:            
+        auto_fres = min_fres is None
+        if auto_fres:            
             if len(freqs) > 1:
                 # Compute minimal pairwise absolute frequency diffs. 
                 dists = [math.fabs(pair[0]-pair[1]) for pair in itertools.combinations(freqs, 2)]
@@ -183,6 +243,20 @@ class Window:
         # From f_res = 1 / T = fs / ws we can compute the required number of samples as        
         nsamples = int(math.ceil(sample_rate / min_fres))
         nsamples += nsamples % 2 
+
+        budget = None
+        if max_latency is not None:
+            # Number of samples available for window length plus hop size. Requires at least a hop of one sample.
+            budget = int(math.floor(max_latency * sample_rate))
+            if nsamples + 1 > budget:
+                nmax = (budget - 1) - (budget - 1) % 2
+                best_fres = sample_rate / nmax if nmax > 0 else math.inf
+                if auto_fres and len(freqs) > 1:
+                    pairs = [p for p in itertools.combinations(freqs, 2) if math.fabs(p[0]-p[1]) / 2 < best_fres]
+                    detail = "Unresolvable frequency pairs: {}".format(", ".join(["{}/{}Hz".format(*p) for p in pairs]))
+                else:
+                    detail = "Requested resolution {:.2f}Hz".format(min_fres)
+                raise ValueError("Latency budget of {:.4f}s allows a frequency resolution of {:.2f}Hz at best. {}".format(max_latency, best_fres, detail))
         
         ntotal = nsamples
         if power_of_2:
@@ -190,10 +264,39 @@ class Window:
             ntotal = 2**((nsamples-1).bit_length())
 
         npad = 0
-        if use_padding:
+        if use_padding or (budget is not None and ntotal + 1 > budget):
+            # Padding does not add to latency, so prefer it when data samples would exceed the budget.
             npad = (ntotal - nsamples)
         else:
             nsamples = ntotal
 
-        logger.info("Window tuned. Length {} ({} data, {} padding). Capture time of {:.5f}s".format(ntotal, nsamples, npad, nsamples / sample_rate))                   
-        return Window(nsamples, sample_rate, npads=npad, wndtype=Window.Type.rectangle, dtype=dtype)
+        nhop = nsamples // 2
+        if budget is not None:
+            nhop = min(nhop, budget - nsamples)
+
+        logger.info("Window tuned. Length {} ({} data, {} padding), hop {}. Capture time of {:.5f}s, latency of {:.5f}s".format(
+            ntotal, nsamples, npad, nhop, nsamples / sample_rate, (nsamples + nhop) / sample_rate))
+        return Window(nsamples, sample_rate, npads=npad, nhop=nhop, nchannels=nchannels, wndtype=Window.Type.rectangle, dtype=dtype)
+
+class Frame:
+    """Stands in for a Window where only its timespan is used.
+
+    Tone and sequence detection read nothing but the timespan of the windows they are
+    updated with, so a frame lets them run on amplitudes or tones that were not computed
+    from a Window, e.g. when replaying, sweeping or batching them.
+
+    Kwargs:
+        timespan (Timespan): Initial timespan. A new Timespan by default
+    """
+
+    __slots__ = ('timespan',)
+
+    def __init__(self, timespan=None):
+        self.timespan = Timespan() if timespan is None else timespan
+
+    def cover(self, shifts, nsamples, nhop, sample_rate):
+        """Set the timespan to that of a window shifted the given number of times, with the same arithmetic as Window.timespan. Returns the frame."""
+        start = (shifts * nhop) / sample_rate
+        self.timespan.start = start
+        self.timespan.end = start + nsamples / sample_rate
+        return self